@@ -0,0 +1,796 @@
+"""
+bigip_simulator.py
+
+Simulates BigIP iControl REST endpoints for load testing metric collection offline.
+
+Each simulated device listens on its own port (--base-port, --base-port + 1, ...) of one host
+and serves a synthetic LTM configuration of --virtual-servers virtual servers, --pools pools
+with --members-per-pool members each (and their nodes), --irules iRules and --ssl-certs SSL
+certificates, along with their statistics. Counters grow at a steady per-object rate, so rates
+computed from them are non-zero. Collections the simulator doesn't model return no items.
+
+Every response is delayed by --latency-ms (+/- up to --latency-jitter-ms), plus
+--latency-per-object-ms for each object in the response, to approximate a busy control plane.
+Requests need a token from /mgmt/shared/authn/login (any credentials are accepted) or basic
+auth, as on a real device.
+
+Receiver settings pointing at the simulated devices can be generated with:
+    python ./src/config_helper.py --simulator-receivers 100 --simulator-endpoint https://127.0.0.1:8443
+
+Command-Line Interface:
+- --devices: Number of simulated devices (default: 10).
+- --host: Address to listen on (default: 127.0.0.1).
+- --base-port: Port of the first device; each further device uses the next port (default: 8443).
+- --virtual-servers, --pools, --members-per-pool, --irules, --ssl-certs: Objects per device.
+- --latency-ms: Base response latency (default: 50).
+- --latency-jitter-ms: Maximum random deviation from the base latency (default: 20).
+- --latency-per-object-ms: Additional latency per object in a response (default: 0.05).
+- --certfile / --keyfile: Serve HTTPS with this certificate (default: plain HTTP).
+- --seed: Seed for the synthetic objects and latency (default: 0).
+- --report-interval: Seconds between request rate log lines (default: 60).
+
+Usage Example:
+    python ./src/bigip_simulator.py --devices 200 --virtual-servers 500 --certfile cert.pem --keyfile key.pem
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import secrets
+import ssl
+import sys
+import time
+import zlib
+from http import HTTPStatus
+from urllib.parse import unquote, urlsplit
+
+SIMULATED_VERSION = "17.1.1"
+# Header blocks larger than this are rejected, as no collector request needs one.
+MAX_HEADER_BYTES = 65536
+TOKEN_TIMEOUT = 1200
+AVAILABILITY_STATES = ["available"] * 18 + ["offline", "unknown"]
+IRULE_EVENTS = ["HTTP_REQUEST", "HTTP_RESPONSE", "CLIENT_ACCEPTED"]
+SIMULATED_COUNTS = {
+    "virtual_servers": 10,
+    "pools": 10,
+    "members_per_pool": 4,
+    "irules": 5,
+    "ssl_certs": 5,
+}
+
+
+def stat_value(value):
+    """Return an iControl REST numeric statistic."""
+    return {"value": value}
+
+
+def stat_description(text):
+    """Return an iControl REST string statistic."""
+    return {"description": text}
+
+
+def object_link(collection, full_path, suffix=""):
+    """Return the selfLink of an object in an /mgmt/tm collection."""
+    return (
+        f"https://localhost/mgmt/tm/{collection}/{full_path.replace('/', '~')}{suffix}"
+    )
+
+
+class SimulatedDevice:
+    """A synthetic BigIP with a fixed configuration and steadily growing counters.
+
+    Args:
+        index (int): The device number, used for its name, addresses and random seed.
+        counts (dict): The number of each kind of object (see SIMULATED_COUNTS).
+        seed (int): The seed for the synthetic objects.
+        clock (callable): Returns the current time in seconds (default: time.monotonic).
+    """
+
+    def __init__(self, index, counts, seed=0, clock=time.monotonic):
+        self.index = index
+        self.hostname = f"bigip-sim-{index}.example.com"
+        self.clock = clock
+        self.started = clock()
+        self.tokens = set()
+        self.requests = 0
+        rng = random.Random(f"{seed}-{index}")
+
+        def rates():
+            return {
+                "bits": rng.randint(1000, 10_000_000),
+                "pkts": rng.randint(1, 10_000),
+                "conns": rng.randint(0, 100),
+                "state": rng.choice(AVAILABILITY_STATES),
+            }
+
+        self.pools = []
+        for pool in range(counts["pools"]):
+            members = []
+            for member in range(counts["members_per_pool"]):
+                address = f"10.{index % 256}.{pool % 256}.{member + 1}"
+                members.append({"address": address, "port": 80, **rates()})
+            self.pools.append(
+                {"fullPath": f"/Common/pool_{pool}", "members": members, **rates()}
+            )
+        self.virtual_servers = [
+            {
+                "fullPath": f"/Common/vs_{vs}",
+                "destination": f"/Common/192.0.{vs // 256 % 256}.{vs % 256}:443",
+                "pool": (
+                    self.pools[vs % len(self.pools)]["fullPath"] if self.pools else None
+                ),
+                **rates(),
+            }
+            for vs in range(counts["virtual_servers"])
+        ]
+        self.nodes = [
+            {"fullPath": f"/Common/{member['address']}", **member}
+            for pool in self.pools
+            for member in pool["members"]
+        ]
+        self.irules = [
+            {
+                "fullPath": f"/Common/irule_{rule}",
+                "event": IRULE_EVENTS[rule % len(IRULE_EVENTS)],
+                "executions": rng.randint(1, 1000),
+            }
+            for rule in range(counts["irules"])
+        ]
+        now = int(time.time())
+        self.ssl_certs = [
+            {
+                "fullPath": f"/Common/cert_{cert}.crt",
+                "expiration": now + rng.randint(-30, 730) * 86400,
+            }
+            for cert in range(counts["ssl_certs"])
+        ]
+
+    def counter(self, rate):
+        """Return the current value of a counter growing at rate per second."""
+        return int(rate * (self.clock() - self.started))
+
+    def traffic_stats(self, obj, side):
+        """Return the traffic and status statistics of a virtual server, pool, member or node."""
+        return {
+            f"{side}.bitsIn": stat_value(self.counter(obj["bits"])),
+            f"{side}.bitsOut": stat_value(self.counter(obj["bits"] * 4)),
+            f"{side}.pktsIn": stat_value(self.counter(obj["pkts"])),
+            f"{side}.pktsOut": stat_value(self.counter(obj["pkts"] * 2)),
+            f"{side}.curConns": stat_value(obj["conns"]),
+            f"{side}.maxConns": stat_value(obj["conns"] * 2),
+            f"{side}.totConns": stat_value(self.counter(obj["conns"] / 10)),
+            "status.availabilityState": stat_description(obj["state"]),
+            "status.enabledState": stat_description("enabled"),
+            "status.statusReason": stat_description(""),
+        }
+
+    def collection(self, kind, items):
+        """Return an iControl REST configuration collection."""
+        return {
+            "kind": f"tm:{kind}:{kind.rsplit(':', 1)[-1]}collectionstate",
+            "selfLink": f"https://localhost/mgmt/tm/{kind.replace(':', '/')}",
+            "items": items,
+        }
+
+    def stats_collection(self, kind, entries):
+        """Return an iControl REST statistics collection from (selfLink, entries) pairs."""
+        return {
+            "kind": f"tm:{kind}:{kind.rsplit(':', 1)[-1]}collectionstats",
+            "selfLink": f"https://localhost/mgmt/tm/{kind.replace(':', '/')}/stats",
+            "entries": {
+                link: {"nestedStats": {"selfLink": link, "entries": stats}}
+                for link, stats in entries
+            },
+        }
+
+    def virtual_config(self):
+        """Return the virtual server configuration collection."""
+        return self.collection(
+            "ltm:virtual",
+            [
+                {
+                    "name": vs["fullPath"].rsplit("/", 1)[-1],
+                    "partition": "Common",
+                    "fullPath": vs["fullPath"],
+                    "destination": vs["destination"],
+                    "pool": vs["pool"],
+                    "enabled": True,
+                }
+                for vs in self.virtual_servers
+            ],
+        )
+
+    def virtual_stats(self):
+        """Return the virtual server statistics."""
+        return self.stats_collection(
+            "ltm:virtual",
+            [
+                (
+                    object_link("ltm/virtual", vs["fullPath"], "/stats"),
+                    {
+                        "tmName": stat_description(vs["fullPath"]),
+                        "destination": stat_description(vs["destination"]),
+                        **self.traffic_stats(vs, "clientside"),
+                    },
+                )
+                for vs in self.virtual_servers
+            ],
+        )
+
+    def pool_config(self):
+        """Return the pool configuration collection."""
+        return self.collection(
+            "ltm:pool",
+            [
+                {
+                    "name": pool["fullPath"].rsplit("/", 1)[-1],
+                    "partition": "Common",
+                    "fullPath": pool["fullPath"],
+                    "loadBalancingMode": "round-robin",
+                    "membersReference": {
+                        "link": object_link("ltm/pool", pool["fullPath"], "/members")
+                    },
+                }
+                for pool in self.pools
+            ],
+        )
+
+    def pool_stats(self):
+        """Return the pool statistics."""
+        return self.stats_collection(
+            "ltm:pool",
+            [
+                (
+                    object_link("ltm/pool", pool["fullPath"], "/stats"),
+                    {
+                        "tmName": stat_description(pool["fullPath"]),
+                        "activeMemberCnt": stat_value(
+                            sum(m["state"] == "available" for m in pool["members"])
+                        ),
+                        "memberCnt": stat_value(len(pool["members"])),
+                        **self.traffic_stats(pool, "serverside"),
+                    },
+                )
+                for pool in self.pools
+            ],
+        )
+
+    def find_pool(self, full_path):
+        """Return the pool with this full path, or None."""
+        for pool in self.pools:
+            if pool["fullPath"] == full_path:
+                return pool
+        return None
+
+    def member_config(self, pool):
+        """Return the member configuration collection of a pool."""
+        return self.collection(
+            "ltm:pool:members",
+            [
+                {
+                    "name": f"{member['address']}:{member['port']}",
+                    "partition": "Common",
+                    "fullPath": f"/Common/{member['address']}:{member['port']}",
+                    "address": member["address"],
+                    "state": "up" if member["state"] == "available" else "down",
+                }
+                for member in pool["members"]
+            ],
+        )
+
+    def member_stats(self, pool):
+        """Return the member statistics of a pool."""
+        return self.stats_collection(
+            "ltm:pool:members",
+            [
+                (
+                    object_link(
+                        "ltm/pool",
+                        pool["fullPath"],
+                        f"/members/~Common~{member['address']}:{member['port']}/stats",
+                    ),
+                    {
+                        "addr": stat_description(member["address"]),
+                        "port": stat_value(member["port"]),
+                        "nodeName": stat_description(f"/Common/{member['address']}"),
+                        "poolName": stat_description(pool["fullPath"]),
+                        **self.traffic_stats(member, "serverside"),
+                    },
+                )
+                for member in pool["members"]
+            ],
+        )
+
+    def node_config(self):
+        """Return the node configuration collection."""
+        return self.collection(
+            "ltm:node",
+            [
+                {
+                    "name": node["address"],
+                    "partition": "Common",
+                    "fullPath": node["fullPath"],
+                    "address": node["address"],
+                }
+                for node in self.nodes
+            ],
+        )
+
+    def node_stats(self):
+        """Return the node statistics."""
+        return self.stats_collection(
+            "ltm:node",
+            [
+                (
+                    object_link("ltm/node", node["fullPath"], "/stats"),
+                    {
+                        "tmName": stat_description(node["fullPath"]),
+                        "addr": stat_description(node["address"]),
+                        "curSessions": stat_value(node["conns"]),
+                        **self.traffic_stats(node, "serverside"),
+                    },
+                )
+                for node in self.nodes
+            ],
+        )
+
+    def rule_config(self):
+        """Return the iRule configuration collection."""
+        return self.collection(
+            "ltm:rule",
+            [
+                {
+                    "name": rule["fullPath"].rsplit("/", 1)[-1],
+                    "partition": "Common",
+                    "fullPath": rule["fullPath"],
+                    "apiAnonymous": f"when {rule['event']} {{ }}",
+                }
+                for rule in self.irules
+            ],
+        )
+
+    def rule_stats(self):
+        """Return the iRule statistics, one entry per iRule event."""
+        return self.stats_collection(
+            "ltm:rule",
+            [
+                (
+                    object_link(
+                        "ltm/rule", f"{rule['fullPath']}:{rule['event']}", "/stats"
+                    ),
+                    {
+                        "tmName": stat_description(rule["fullPath"]),
+                        "eventType": stat_description(rule["event"]),
+                        "totalExecutions": stat_value(self.counter(rule["executions"])),
+                        "failures": stat_value(0),
+                        "aborts": stat_value(0),
+                        "avgCycles": stat_value(rule["executions"] * 30),
+                        "maxCycles": stat_value(rule["executions"] * 90),
+                        "minCycles": stat_value(rule["executions"] * 10),
+                        "priority": stat_value(500),
+                    },
+                )
+                for rule in self.irules
+            ],
+        )
+
+    def ssl_cert_config(self):
+        """Return the SSL certificate configuration collection."""
+        return self.collection(
+            "sys:file:ssl-cert",
+            [
+                {
+                    "name": cert["fullPath"].rsplit("/", 1)[-1],
+                    "partition": "Common",
+                    "fullPath": cert["fullPath"],
+                    "expirationDate": cert["expiration"],
+                    "expirationString": time.strftime(
+                        "%b %d %H:%M:%S %Y GMT", time.gmtime(cert["expiration"])
+                    ),
+                    "issuer": "CN=Simulated CA,O=Example",
+                    "subject": f"CN={cert['fullPath'].rsplit('/', 1)[-1]},O=Example",
+                    "keyType": "rsa-private",
+                    "keySize": 2048,
+                    "isBundle": "false",
+                }
+                for cert in self.ssl_certs
+            ],
+        )
+
+    def version(self):
+        """Return the /mgmt/tm/sys/version statistics."""
+        link = "https://localhost/mgmt/tm/sys/version/0"
+        return {
+            "kind": "tm:sys:version:versionstats",
+            "selfLink": "https://localhost/mgmt/tm/sys/version",
+            "entries": {
+                link: {
+                    "nestedStats": {
+                        "entries": {
+                            "Build": stat_description("0.0.6"),
+                            "Edition": stat_description("Point Release 1"),
+                            "Product": stat_description("BIG-IP"),
+                            "Title": stat_description("Main Package"),
+                            "Version": stat_description(SIMULATED_VERSION),
+                        }
+                    }
+                }
+            },
+        }
+
+    def device_info(self):
+        """Return the /mgmt/shared/identified-devices/config/device-info document."""
+        return {
+            "kind": "shared:resolver:device-groups:deviceinfostate",
+            "hostname": self.hostname,
+            "machineId": f"00000000-0000-0000-0000-{self.index:012d}",
+            "version": SIMULATED_VERSION,
+            "product": "BIG-IP",
+            "platformMarketingName": "BIG-IP Virtual Edition",
+            "edition": "Point Release 1",
+            "build": "0.0.6",
+            "chassisSerialNumber": f"sim-{self.index:08d}",
+            "baseMac": "00:00:5e:00:{:02x}:{:02x}".format(
+                self.index // 256 % 256, self.index % 256
+            ),
+        }
+
+    def routes(self):
+        """Return the GET handlers by path, each returning (document, object count)."""
+        return {
+            "/mgmt/tm/ltm/virtual": lambda: (
+                self.virtual_config(),
+                len(self.virtual_servers),
+            ),
+            "/mgmt/tm/ltm/virtual/stats": lambda: (
+                self.virtual_stats(),
+                len(self.virtual_servers),
+            ),
+            "/mgmt/tm/ltm/pool": lambda: (self.pool_config(), len(self.pools)),
+            "/mgmt/tm/ltm/pool/stats": lambda: (self.pool_stats(), len(self.pools)),
+            "/mgmt/tm/ltm/node": lambda: (self.node_config(), len(self.nodes)),
+            "/mgmt/tm/ltm/node/stats": lambda: (self.node_stats(), len(self.nodes)),
+            "/mgmt/tm/ltm/rule": lambda: (self.rule_config(), len(self.irules)),
+            "/mgmt/tm/ltm/rule/stats": lambda: (self.rule_stats(), len(self.irules)),
+            "/mgmt/tm/sys/file/ssl-cert": lambda: (
+                self.ssl_cert_config(),
+                len(self.ssl_certs),
+            ),
+            "/mgmt/tm/sys/version": lambda: (self.version(), 1),
+            "/mgmt/shared/identified-devices/config/device-info": lambda: (
+                self.device_info(),
+                1,
+            ),
+        }
+
+    def handle(self, method, path, headers, body):
+        """Answer one iControl REST request.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The request path, without the query string.
+            headers (dict): The request headers, with lower case names.
+            body (bytes): The request body.
+
+        Returns:
+            tuple: (HTTP status, JSON document, number of objects in the document).
+        """
+        self.requests += 1
+        if method == "POST" and path == "/mgmt/shared/authn/login":
+            try:
+                username = json.loads(body or b"{}").get("username", "admin")
+            except (ValueError, AttributeError):
+                return HTTPStatus.BAD_REQUEST, error_document(400, "Bad login"), 0
+            token = secrets.token_hex(16).upper()
+            self.tokens.add(token)
+            return (
+                HTTPStatus.OK,
+                {
+                    "username": username,
+                    "loginProviderName": "tmos",
+                    "token": {
+                        "token": token,
+                        "userName": username,
+                        "timeout": TOKEN_TIMEOUT,
+                    },
+                },
+                0,
+            )
+        token = headers.get("x-f5-auth-token")
+        if token not in self.tokens and not headers.get("authorization", "").startswith(
+            "Basic "
+        ):
+            return (
+                HTTPStatus.UNAUTHORIZED,
+                error_document(
+                    401,
+                    "Authorization failed: no user authentication header or token detected.",
+                ),
+                0,
+            )
+
+        if path.startswith("/mgmt/shared/authz/tokens/"):
+            token = path.rsplit("/", 1)[-1]
+            if token not in self.tokens:
+                return HTTPStatus.NOT_FOUND, error_document(404, "Token not found"), 0
+            if method == "DELETE":
+                self.tokens.discard(token)
+            return HTTPStatus.OK, {"token": token, "timeout": TOKEN_TIMEOUT}, 0
+        if method != "GET":
+            return (
+                HTTPStatus.METHOD_NOT_ALLOWED,
+                error_document(405, "Method not allowed"),
+                0,
+            )
+
+        route = self.routes().get(path)
+        if route is not None:
+            document, objects = route()
+            return HTTPStatus.OK, document, objects
+        if path.startswith("/mgmt/tm/ltm/pool/"):
+            parts = path[len("/mgmt/tm/ltm/pool/") :].split("/")
+            pool = self.find_pool(parts[0].replace("~", "/"))
+            if pool is not None and parts[1:] == ["members"]:
+                return HTTPStatus.OK, self.member_config(pool), len(pool["members"])
+            if pool is not None and parts[1:] == ["members", "stats"]:
+                return HTTPStatus.OK, self.member_stats(pool), len(pool["members"])
+            if pool is None:
+                return HTTPStatus.NOT_FOUND, error_document(404, "Object not found"), 0
+        if path.startswith("/mgmt/tm/"):
+            # Modules that aren't simulated (e.g. ASM or GTM) are simply empty.
+            kind = path[len("/mgmt/tm/") :].replace("/", ":")
+            if kind.endswith(":stats"):
+                return HTTPStatus.OK, {"kind": kind, "entries": {}}, 0
+            return HTTPStatus.OK, {"kind": kind, "items": []}, 0
+        return (
+            HTTPStatus.NOT_FOUND,
+            error_document(404, f"Public URI path not registered: {path}"),
+            0,
+        )
+
+
+def error_document(code, message):
+    """Return an iControl REST error document."""
+    return {"code": code, "message": message, "errorStack": [], "apiError": 1}
+
+
+def response_delay(objects, latency, rng):
+    """Return the simulated latency in seconds of a response with this many objects.
+
+    Args:
+        objects (int): The number of objects in the response.
+        latency (dict): "base_ms", "jitter_ms" and "per_object_ms" settings.
+        rng (random.Random): The source of the jitter.
+    """
+    jitter = rng.uniform(-latency["jitter_ms"], latency["jitter_ms"])
+    delay_ms = latency["base_ms"] + jitter + objects * latency["per_object_ms"]
+    return max(delay_ms, 0) / 1000
+
+
+async def serve_connection(device, latency, rng, reader, writer):
+    """Serve the HTTP/1.1 requests of one keep-alive connection to a simulated device."""
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except asyncio.IncompleteReadError:
+                return
+            except asyncio.LimitOverrunError:
+                writer.write(
+                    b"HTTP/1.1 431 Request Header Fields Too Large\r\n"
+                    b"Content-Length: 0\r\nConnection: close\r\n\r\n"
+                )
+                return
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")
+            try:
+                method, target, version = request_line.split(" ", 2)
+            except ValueError:
+                writer.write(
+                    b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+                )
+                return
+            headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                if name:
+                    headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length") or 0))
+
+            status, document, objects = device.handle(
+                method, unquote(urlsplit(target).path).rstrip("/"), headers, body
+            )
+            await asyncio.sleep(response_delay(objects, latency, rng))
+            payload = json.dumps(document, separators=(",", ":")).encode()
+            close = (
+                headers.get("connection", "").lower() == "close"
+                or version == "HTTP/1.0"
+            )
+            writer.write(
+                f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode()
+                + payload
+            )
+            await writer.drain()
+            if close:
+                return
+    except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+        return
+    finally:
+        writer.close()
+
+
+async def start_device(device, host, port, latency, ssl_context=None, seed=0):
+    """Start serving a simulated device.
+
+    Args:
+        device (SimulatedDevice): The device to serve.
+        host (str): The address to listen on.
+        port (int): The port to listen on (0 picks a free port).
+        latency (dict): The response latency settings (see `response_delay`).
+        ssl_context (ssl.SSLContext, optional): Serve HTTPS with this context.
+        seed (int): The seed for the latency jitter.
+
+    Returns:
+        asyncio.Server: The listening server.
+    """
+    rng = random.Random(zlib.crc32(f"{seed}-{device.index}".encode()))
+
+    def on_connect(reader, writer):
+        return serve_connection(device, latency, rng, reader, writer)
+
+    return await asyncio.start_server(
+        on_connect, host, port, ssl=ssl_context, limit=MAX_HEADER_BYTES
+    )
+
+
+async def run_simulator(args):
+    """Start every simulated device and log the request rate until cancelled."""
+    counts = {key: getattr(args, key) for key in SIMULATED_COUNTS}
+    latency = {
+        "base_ms": args.latency_ms,
+        "jitter_ms": args.latency_jitter_ms,
+        "per_object_ms": args.latency_per_object_ms,
+    }
+    ssl_context = None
+    if args.certfile:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(args.certfile, args.keyfile)
+    scheme = "https" if ssl_context else "http"
+
+    devices = [
+        SimulatedDevice(index, counts, args.seed) for index in range(args.devices)
+    ]
+    servers = [
+        await start_device(
+            device,
+            args.host,
+            args.base_port + device.index,
+            latency,
+            ssl_context,
+            args.seed,
+        )
+        for device in devices
+    ]
+    logging.info(
+        "Simulating %d devices on %s://%s:%d-%d with %s per device.",
+        len(devices),
+        scheme,
+        args.host,
+        args.base_port,
+        args.base_port + len(devices) - 1,
+        ", ".join(f"{count} {key}" for key, count in counts.items()),
+    )
+    last_total = 0
+    try:
+        while True:
+            await asyncio.sleep(args.report_interval)
+            total = sum(device.requests for device in devices)
+            logging.info(
+                "Served %d requests (%.1f/s).",
+                total,
+                (total - last_total) / args.report_interval,
+            )
+            last_total = total
+    finally:
+        for server in servers:
+            server.close()
+
+
+def get_args():
+    """Set up the command-line argument parser."""
+    parser = argparse.ArgumentParser(
+        description="Simulate BigIP iControl REST endpoints for offline collector load tests."
+    )
+    parser.add_argument(
+        "--devices",
+        type=int,
+        default=10,
+        help="Number of simulated devices (default: 10).",
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Address to listen on (default: 127.0.0.1).",
+    )
+    parser.add_argument(
+        "--base-port",
+        type=int,
+        default=8443,
+        help="Port of the first device; each further device uses the next port (default: 8443).",
+    )
+    for key, count in SIMULATED_COUNTS.items():
+        flag = key.replace("_", "-")
+        parser.add_argument(
+            f"--{flag}",
+            dest=key,
+            type=int,
+            default=count,
+            help=f"Number of {key.replace('_', ' ')} per device (default: {count}).",
+        )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=50,
+        help="Base response latency in milliseconds (default: 50).",
+    )
+    parser.add_argument(
+        "--latency-jitter-ms",
+        type=float,
+        default=20,
+        help="Maximum random deviation from the base latency in milliseconds (default: 20).",
+    )
+    parser.add_argument(
+        "--latency-per-object-ms",
+        type=float,
+        default=0.05,
+        help="Additional latency per object in a response in milliseconds (default: 0.05).",
+    )
+    parser.add_argument(
+        "--certfile",
+        type=str,
+        default=None,
+        help="Certificate (PEM) to serve HTTPS with (default: plain HTTP).",
+    )
+    parser.add_argument(
+        "--keyfile",
+        type=str,
+        default=None,
+        help="Private key (PEM) of the certificate, if not included in --certfile.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed for the synthetic objects and latency (default: 0).",
+    )
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=60,
+        help="Seconds between request rate log lines (default: 60).",
+    )
+    return parser
+
+
+def main():
+    """Run the simulator until interrupted."""
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    args = get_args().parse_args()
+    try:
+        asyncio.run(run_simulator(args))
+    except KeyboardInterrupt:
+        logging.info("Stopped simulating.")
+    except OSError as e:
+        logging.error("Error starting the simulator: %s", e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import random
+import unittest
+
+from bigip_simulator import (
+    SIMULATED_COUNTS,
+    SimulatedDevice,
+    response_delay,
+    start_device,
+)
+
+NO_LATENCY = {"base_ms": 0, "jitter_ms": 0, "per_object_ms": 0}
+
+
+async def request(port, method, path, headers=None, body=None):
+    """Send one request to a simulated device and return (status, document)."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode() if body is not None else b""
+    lines = [f"{method} {path} HTTP/1.1", "Host: localhost", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    lines.append(f"Content-Length: {len(payload)}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + payload)
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), json.loads(content)
+
+
+class TestSimulatedDevice(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        counts = {**SIMULATED_COUNTS, "virtual_servers": 3, "pools": 2}
+        self.device = SimulatedDevice(1, counts, clock=lambda: self.now)
+        self.token = self.device.handle("POST", "/mgmt/shared/authn/login", {}, b"")[1][
+            "token"
+        ]["token"]
+
+    def get(self, path):
+        return self.device.handle("GET", path, {"x-f5-auth-token": self.token}, b"")
+
+    def test_counters_grow(self):
+        first = self.get("/mgmt/tm/ltm/virtual/stats")[1]["entries"]
+        self.now += 60
+        status, document, objects = self.get("/mgmt/tm/ltm/virtual/stats")
+        second = document["entries"]
+
+        self.assertEqual((status, objects), (200, 3))
+        link = "https://localhost/mgmt/tm/ltm/virtual/~Common~vs_0/stats"
+        before = first[link]["nestedStats"]["entries"]["clientside.bitsIn"]["value"]
+        after = second[link]["nestedStats"]["entries"]["clientside.bitsIn"]["value"]
+        self.assertGreater(after, before)
+
+    def test_collections(self):
+        pools = self.get("/mgmt/tm/ltm/pool")[1]["items"]
+        members = self.get("/mgmt/tm/ltm/pool/~Common~pool_1/members/stats")
+
+        self.assertEqual(
+            [pool["fullPath"] for pool in pools], ["/Common/pool_0", "/Common/pool_1"]
+        )
+        self.assertEqual(members[2], 4)
+        self.assertEqual(self.get("/mgmt/tm/ltm/node")[2], 8)
+        self.assertEqual(self.get("/mgmt/tm/asm/policies")[1]["items"], [])
+        self.assertEqual(self.get("/mgmt/tm/ltm/pool/~Common~missing/members")[0], 404)
+
+    def test_authentication(self):
+        self.assertEqual(
+            self.device.handle("GET", "/mgmt/tm/ltm/virtual", {}, b"")[0], 401
+        )
+        self.device.handle(
+            "DELETE",
+            f"/mgmt/shared/authz/tokens/{self.token}",
+            {"x-f5-auth-token": self.token},
+            b"",
+        )
+        self.assertEqual(self.get("/mgmt/tm/ltm/virtual")[0], 401)
+
+    def test_response_delay(self):
+        latency = {"base_ms": 50, "jitter_ms": 10, "per_object_ms": 0.5}
+        rng = random.Random(0)
+        delays = [response_delay(100, latency, rng) for _ in range(20)]
+
+        self.assertTrue(all(0.09 <= delay <= 0.11 for delay in delays))
+        # Jitter never makes the delay negative.
+        self.assertEqual(
+            min(
+                response_delay(0, {**latency, "base_ms": 0}, random.Random(seed))
+                for seed in range(20)
+            ),
+            0,
+        )
+
+
+class TestSimulatorServer(unittest.IsolatedAsyncioTestCase):
+
+    async def test_login_and_scrape_over_http(self):
+        device = SimulatedDevice(0, SIMULATED_COUNTS)
+        server = await start_device(device, "127.0.0.1", 0, NO_LATENCY)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            status, login = await request(
+                port,
+                "POST",
+                "/mgmt/shared/authn/login",
+                body={
+                    "username": "admin",
+                    "password": "x",
+                    "loginProviderName": "tmos",
+                },
+            )
+            token = login["token"]["token"]
+            status, stats = await request(
+                port,
+                "GET",
+                "/mgmt/tm/ltm/pool/stats?ver=17.1.1",
+                headers={"X-F5-Auth-Token": token},
+            )
+            denied, _ = await request(port, "GET", "/mgmt/tm/ltm/pool/stats")
+        finally:
+            server.close()
+            await server.wait_closed()
+
+        self.assertEqual(status, 200)
+        self.assertEqual(len(stats["entries"]), SIMULATED_COUNTS["pools"])
+        self.assertEqual(denied, 401)
+        self.assertEqual(device.requests, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,26 +5,75 @@ A command-line tool for helping simplify application study tool configurations.
 one containing defaults that should be applied to each bigip receiver configuration, and a second with
 the individual bigip targets and any non-default values to use as overrides.
 
-The output is written to ./services/otel_collector/receivers.yaml (and pipelines.yaml) where the AST
-Otel Instance merges them with the base configuration templates.
+The output is written to ./services/otel_collector/receivers.yaml (and pipelines.yaml, overlay.yaml)
+where the AST Otel Instance merges them with the base configuration templates.
 
 Key Features:
 - Convert legacy JSON configurations to a new YAML format.
 - Generate output configurations based on default settings and per-device inputs.
 - Supports dry-run mode to preview changes without writing to files.
+- Only re-renders receivers whose settings changed since the last run, and leaves output files
+  untouched when their content is unchanged.
 
 Command-Line Interface:
 The tool can be executed from the command line with the following options:
 - --convert-legacy-config: Convert the legacy configuration file to the new format.
 - --generate-configs: Generate new configurations based on the input files.
 - --dry-run: Preview changes without writing to files.
+- --no-validate: Skip checking the merged receiver configs (durations, endpoints, receiver names,
+  data types and settings) before they are written.
+- --watch: Keep running and regenerate configs whenever the input files change (polled every
+  --watch-interval seconds, debounced by --debounce seconds).
+- --on-change: Shell command to run after generation when any output file actually changed.
+- --plan-capacity: Estimate the active series, samples per second, Prometheus disk (over the
+  retention) and memory, and collector memory of the configured fleet, and warn when the
+  collector needs sharding or the data downsampling. With --tsdb-status, the per-device series
+  estimates are calibrated from a saved /api/v1/status/tsdb response of the current fleet
+  (of --snapshot-devices devices, by default its number of f5_system_state_up_ratio series).
+- --preflight: Probe every configured device concurrently (TCP connection, TLS handshake with its tls
+  settings and an authenticated iControl REST round-trip), log the failures and recommend per-device
+  timeout overrides from the measured latencies (at most --preflight-concurrency at once).
+- --tune-from SOURCE: Tune each device's timeout and collection_interval from the collector's scrape
+  telemetry (scrape durations and failures) and write them back to the receiver input files as
+  minimal overrides. SOURCE is a Prometheus server URL (e.g. http://localhost:9090), a metrics
+  exposition URL, or a saved exposition or /api/v1/query response; it may be repeated.
+- --import-inventory FILE: Import a CSV or JSONL device inventory (e.g. a CMDB export) into the
+  receiver input file, streaming rows with constant memory. Inventory columns are mapped to
+  receiver fields with --column-map (e.g. 'mgmt_ip=endpoint,user=username') and rejected rows
+  are written to --rejects-file.
+- --simulator-receivers N: Write receiver settings for N devices simulated by bigip_simulator.py to
+  --simulator-output-file (default: ./config/bigip_receivers.simulator.yaml, to use as the
+  --receiver-input-file), the first at --simulator-endpoint (default: https://127.0.0.1:8443)
+  and the rest on the following ports, for benchmarking collection offline.
+- --stream: With --convert-legacy-config, convert very large legacy files incrementally across
+  --workers processes (default: number of CPUs) in chunks of --chunk-size entries (default: 500).
 
 These additional flags can also be specified (but probably shouldn't be):
 - --legacy-config-file: Specify the path to the legacy configuration file (default: ./config/big-ips.json).
 - --default-config-file: Specify the path to the default settings file (default: ./config/ast_defaults.yaml).
 - --receiver-input-file: Specify the path to the receiver input file (default: ./config/bigip_receivers.yaml).
+- --receiver-input-dir: Specify a directory of receiver input fragments (e.g. one per team), parsed
+  in parallel and merged with the receiver input file (default: ./config/receivers.d).
 - --receiver-output-file: Specify the output path for the receiver configuration file (default: ./services/otel_collector/receivers.yaml).
 - --pipelines-output-file: Specify the output path for the pipeline configuration file (default: ./services/otel_collector/pipelines.yaml).
+- --collector-config-file: Specify the otel collector config template (default: ./services/otel_collector/defaults/bigip-scraper-config.yaml).
+- --overlay-output-file: Specify the output path for the collector config overlay file, merged over the
+  template by the collector (default: ./services/otel_collector/overlay.yaml).
+- --downsampling-rules-file, --longterm-prometheus-config-file, --longterm-datasource-file: Specify
+  the output paths of the downsampled long-term tier, generated if downsampling is enabled in the
+  default config (default: ./services/prometheus/rules/f5_downsampling.yml,
+  ./services/prometheus-longterm/prometheus.yml and
+  ./services/grafana/provisioning/datasources/prometheus-longterm.yaml).
+- --shards: Split receivers across N otel collector instances, writing receivers-<n>.yaml,
+  pipelines-<n>.yaml and collector-shard-<n>.yaml for each and a compose override running them
+  (--compose-shards-file, default: ./docker-compose.shards.yaml) (default: 1, unsharded).
+- --profile: Record per-stage wall time, CPU time and peak memory, written as JSON
+  (--profile-json-file, default: ./config_helper_profile.json) and as a Prometheus textfile
+  (--profile-textfile, default: ./services/node_exporter/textfile/config_helper.prom, which the
+  node-exporter service in docker-compose.yaml serves to Prometheus).
+- --cache-file: Specify the path of the per-receiver render cache (default: ./services/otel_collector/.receivers_cache.json).
+- --parse-cache-dir: Specify the directory caching parsed input files (default: ./config/.parse_cache).
+- --no-cache: Re-parse inputs and re-render every receiver without reading or writing any cache.
 
 Usage Example:
 To convert a legacy configuration in the default ./config/big-ips.json file:
@@ -37,26 +86,513 @@ To re-generate configurations (e.g. after adding new devices or changing default
 """
 
 import argparse
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import hashlib
+import heapq
 import json
 import logging
+import marshal
+import math
+import os
+import re
+import ssl
+import subprocess
+import sys
+import time
+import tracemalloc
+import urllib.request
+from urllib.parse import urlencode, urlsplit
 
 import yaml
-from copy import deepcopy
-
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
 
-def load_yaml(path):
+# Bump when the rendered fragment format changes so stale caches are discarded.
+RECEIVER_CACHE_VERSION = 1
+
+# Relative scrape weight of the modules every receiver always collects (system, virtual servers,
+# pools, nodes, rules, ...), in units of one optional data_type.
+BASE_SCRAPE_WEIGHT = 4
+# Shards whose estimated cost exceeds this multiple of the fair share are reported as imbalanced.
+SHARD_LOAD_FACTOR = 1.25
+
+# Read size used when streaming large legacy JSON inventories.
+JSON_STREAM_READ_SIZE = 1 << 16
+
+# Legacy-style receiver fields that inventory columns can be mapped to with --import-inventory.
+# Values are converted to match the legacy big-ips.json types before the defaults diff.
+INVENTORY_FIELDS = {
+    "name": str,
+    "endpoint": str,
+    "username": str,
+    "password_env_ref": str,
+    "collection_interval": "interval",
+    "tls_insecure_skip_verify": "bool",
+    "ca_file": str,
+    "timeout": "duration",
+    "pipeline": str,
+}
+
+BOOLEAN_STRINGS = {
+    "true": True,
+    "yes": True,
+    "1": True,
+    "false": False,
+    "no": False,
+    "0": False,
+}
+
+# Defaults for the optional scrape_schedule section of the default config file.
+SCRAPE_SCHEDULE_DEFAULTS = {
+    "expected_scrape_duration": "5s",
+    "stagger": False,
+    "spread_intervals": [],
+    # Set to false to silence the warning about timeouts not less than the collection_interval.
+    "warn_timeout_conflicts": True,
+}
+# Defaults for the optional pipeline_partitioning section of the default config file.
+PIPELINE_PARTITIONING_DEFAULTS = {
+    "max_receivers_per_pipeline": 0,
+    "partitions": {},
+}
+# Rough number of series a device exports per scrape for the always-on modules ("base") and for
+# each optional data_type. Used to size the collector for the fleet; actual counts depend on how
+# many virtual servers, pools, etc. each device has.
+DATA_TYPE_SERIES_ESTIMATES = {
+    "base": 1500,
+    "f5.apm": 40,
+    "f5.cgnat": 60,
+    "f5.dns": 120,
+    "f5.dos": 80,
+    "f5.firewall": 200,
+    "f5.gtm": 150,
+    "f5.policy.api_protection": 100,
+    "f5.policy.asm": 250,
+    "f5.policy.firewall": 200,
+    "f5.policy.ip_intelligence": 60,
+    "f5.policy.nat": 60,
+    "f5.profile.dos": 80,
+}
+# Series assumed for enabled data_types missing from DATA_TYPE_SERIES_ESTIMATES.
+DEFAULT_DATA_TYPE_SERIES = 100
+# Metric with a single series per device, used to count the devices in a TSDB status snapshot.
+DEVICE_COUNT_METRIC = "f5_system_state_up_ratio"
+
+# Defaults for the optional fleet_tuning section of the default config file.
+FLEET_TUNING_DEFAULTS = {
+    "enabled": False,
+    "exporters": ["otlphttp/metrics-local"],
+    "compression": "gzip",
+    # How often each batch processor should flush at the expected data point rate.
+    "batch_flush_interval": "1s",
+}
+# Library defaults of the batch processor and exporter sending queue; tuning never goes lower.
+MIN_SEND_BATCH_SIZE = 8192
+MAX_SEND_BATCH_SIZE = 65536
+MIN_QUEUE_SIZE = 1000
+MIN_QUEUE_CONSUMERS = 10
+MAX_QUEUE_CONSUMERS = 64
+# Data points per second one exporter queue consumer is expected to sustain.
+POINTS_PER_QUEUE_CONSUMER = 10000
+
+# Defaults for the optional capacity_planning section of the default config file.
+CAPACITY_PLANNING_DEFAULTS = {
+    # Should match --storage.tsdb.retention.time of the Prometheus service.
+    "retention": "1y",
+    "disk_gib": 500,
+    "prometheus_memory_gib": 16,
+    "collector_memory_gib": 4,
+    # Data points per second a single collector is expected to sustain.
+    "collector_samples_per_second": 100000,
+}
+# Defaults for the optional preflight section of the default config file.
+PREFLIGHT_DEFAULTS = {
+    # Receivers probed at once.
+    "concurrency": 50,
+    "connect_timeout": "10s",
+    # Authenticated requests timed per receiver.
+    "requests": 3,
+    # Recommended timeouts allow for this multiple of the measured scrape time.
+    "timeout_headroom": 2,
+    "min_timeout": "10s",
+    # Timeouts up to this multiple of the recommended one are left alone, and longer ones are
+    # only lowered to this fraction of their value.
+    "timeout_tolerance": 3,
+}
+PREFLIGHT_STAGES = ["config", "tcp", "tls", "auth", "request"]
+PREFLIGHT_LOGIN_PATH = "/mgmt/shared/authn/login"
+PREFLIGHT_TOKEN_PATH = "/mgmt/shared/authz/tokens"
+# A stats collection every receiver scrapes, so its latency is representative of a scrape request.
+PREFLIGHT_REQUEST_PATH = "/mgmt/tm/ltm/virtual/stats"
+# The collector's ${env:NAME} (or ${NAME}) references in receiver settings.
+ENV_REF_RE = re.compile(r"\$\{(?:env:)?([A-Za-z_][A-Za-z0-9_]*)\}")
+# Defaults for the optional interval_tuning section of the default config file.
+INTERVAL_TUNING_DEFAULTS = {
+    # Range of telemetry queried from a live Prometheus.
+    "window": "1d",
+    # Tuned timeouts allow for this multiple of the p95 scrape duration, rounded up to timeout_step.
+    "timeout_headroom": 1.5,
+    "timeout_step": "5s",
+    "min_timeout": "10s",
+    # Collection intervals are at least this multiple of the timeout, rounded up to interval_step,
+    # and never shorter than the receiver's inherited collection_interval.
+    "interval_headroom": 1.25,
+    "interval_step": "30s",
+}
+# Scrapes that fail while taking at least this fraction of the timeout are taken as timed out.
+TIMEOUT_SATURATION = 0.9
+# The receiver settings written by --tune-from.
+TUNED_FIELDS = ("timeout", "collection_interval")
+# Queries run by --tune-from against a live Prometheus, by kind of telemetry.
+TUNING_QUERIES = {
+    "duration": 'quantile_over_time(0.95, scrape_duration_seconds{{job=~"bigip.*"}}[{window}])',
+    "responses": "sum by (job, status_code) "
+    '(increase(endpoint_scrape_responses_total{{job=~"bigip.*"}}[{window}]))',
+    "errors": "sum by (receiver) "
+    '(increase(otelcol_scraper_errored_metric_points_total{{receiver=~"bigip.*"}}[{window}]))',
+}
+# Metric names of saved telemetry, by kind.
+TUNING_METRICS = {
+    "scrape_duration_seconds": "duration",
+    "endpoint_scrape_responses_total": "responses",
+    "otelcol_scraper_errored_metric_points": "errors",
+    "otelcol_scraper_errored_metric_points_total": "errors",
+}
+# One sample of the Prometheus text exposition format: name, optional labels, value, timestamp.
+EXPOSITION_SAMPLE_RE = re.compile(
+    r"^([A-Za-z_:][A-Za-z0-9_:]*)(?:\{(.*)\})?\s+(\S+)(?:\s+-?\d+)?$"
+)
+EXPOSITION_LABEL_RE = re.compile(r'([A-Za-z_][A-Za-z0-9_]*)="((?:[^"\\]|\\.)*)"')
+# Defaults for the optional downsampling section of the default config file.
+DOWNSAMPLING_DEFAULTS = {
+    "enabled": False,
+    "resolution": "5m",
+    # The raw sample interval, used as the step when rolling the raw samples up.
+    "raw_interval": "1m",
+}
+# Counters (and histogram parts) are rolled up to their last value, so rate() still works on them;
+# everything else is treated as a gauge and averaged.
+COUNTER_METRIC_RE = ".+_(?:total|bucket|count|sum)"
+# Label holding the original metric name of a rolled up series, until the long-term Prometheus
+# restores it.
+ROLLUP_METRIC_LABEL = "f5_metric"
+# The raw Prometheus, as seen from the long-term Prometheus.
+RAW_PROMETHEUS_TARGET = "prometheus:9090"
+LONGTERM_DATASOURCE_NAME = "Prometheus (Long-term)"
+LONGTERM_DATASOURCE_URL = "http://prometheus-longterm:9090"
+# Where docker-compose.yaml mounts ./services/otel_collector in the otel-collector container.
+COLLECTOR_CONFIG_DIR = "/etc/otel-collector-config"
+# The compose file the sharded collector services extend, relative to --compose-shards-file.
+COMPOSE_FILE = "docker-compose.yaml"
+# Collector config of each shard (collector-shard-0.yaml, ...), next to the receivers output file.
+SHARD_COLLECTOR_CONFIG = "collector-shard.yaml"
+# The --query.lookback-delta of the prometheus-longterm service in docker-compose.yaml. Queries only
+# see a sample within this range, so it must span at least two rolled up samples.
+LONGTERM_LOOKBACK_DELTA = "2h"
+
+# Rules of thumb for the capacity planner: Prometheus stores about 1-2 bytes per compressed sample
+# and needs a few KiB of memory per active (head) series; the collector holds each data point of a
+# scrape, with its attributes, in the receiver and again in the batch processor / exporter queue.
+BYTES_PER_SAMPLE = 1.5
+PROMETHEUS_BYTES_PER_SERIES = 4096
+COLLECTOR_BASE_BYTES = 128 * 2**20
+COLLECTOR_BYTES_PER_DATA_POINT = 1024
+
+# Receiver ids must be "bigip" or "bigip/<name>" to select the bigip receiver type.
+RECEIVER_NAME_RE = re.compile(r"^bigip(/\S+)?$")
+# Settings accepted by the bigip receiver (its own, the scraper controller's and the embedded HTTP
+# client's) and by the config helper, with the check applied to each; None means the value is
+# passed through unchecked.
+RECEIVER_FIELDS = {
+    "endpoint": "endpoint",
+    "username": "scalar",
+    "password": "scalar",
+    "collection_interval": "duration",
+    "initial_delay": "duration",
+    "timeout": "duration",
+    "tls": "tls",
+    "data_types": "data_types",
+    "metrics": None,
+    "resource_attributes": None,
+    "proxy_url": None,
+    "headers": None,
+    "auth": None,
+    "compression": None,
+    "cookies": None,
+    "read_buffer_size": None,
+    "write_buffer_size": None,
+    "max_idle_conns": None,
+    "max_idle_conns_per_host": None,
+    "max_conns_per_host": None,
+    "idle_conn_timeout": "duration",
+    "disable_keep_alives": None,
+    "http2_read_idle_timeout": "duration",
+    "http2_ping_timeout": "duration",
+    "metric_filters": "metric_filters",
+}
+# Receiver settings read by the config helper itself, left out of the receivers file.
+GENERATOR_RECEIVER_FIELDS = {"metric_filters"}
+# Per-device pipeline assignments, read by `generate_pipeline_configs` and never merged into the
+# receiver settings.
+PIPELINE_FIELDS = {"pipeline", "f5_pipeline"}
+# The data_types the bigip receiver can collect.
+KNOWN_DATA_TYPES = [
+    "f5.apm",
+    "f5.cgnat",
+    "f5.dns",
+    "f5.dos",
+    "f5.firewall",
+    "f5.gtm",
+    "f5.policy.api_protection",
+    "f5.policy.asm",
+    "f5.policy.firewall",
+    "f5.policy.ip_intelligence",
+    "f5.policy.nat",
+    "f5.profile.dos",
+]
+TLS_FIELDS = {
+    "insecure": bool,
+    "insecure_skip_verify": bool,
+    "include_system_ca_certs_pool": bool,
+    "ca_file": str,
+    "ca_pem": str,
+    "cert_file": str,
+    "cert_pem": str,
+    "key_file": str,
+    "key_pem": str,
+    "min_version": str,
+    "max_version": str,
+    "cipher_suites": list,
+    "reload_interval": str,
+    "server_name_override": str,
+}
+# Settings of a receiver's metric_filters section: regexes matched against whole metric names, or
+# per data point attribute.
+METRIC_FILTER_FIELDS = {
+    "include_metrics": list,
+    "exclude_metrics": list,
+    "include_attributes": dict,
+    "exclude_attributes": dict,
+}
+
+# The collector's default delay before a receiver's first scrape.
+DEFAULT_INITIAL_DELAY = 1.0
+# Longest window (seconds) simulated when modelling scrape concurrency.
+MAX_PLAN_HORIZON = 3600
+# Maximum number of receiver names listed in a single warning.
+MAX_LISTED_RECEIVERS = 10
+
+DURATION_UNITS = {
+    "ns": 1e-9,
+    "us": 1e-6,
+    "\u00b5s": 1e-6,
+    "ms": 1e-3,
+    "s": 1.0,
+    "m": 60.0,
+    "h": 3600.0,
+}
+DURATION_PART_RE = re.compile(r"(\d+(?:\.\d*)?|\.\d+)(ns|us|\u00b5s|ms|s|m|h)")
+# Prometheus / PromQL durations (e.g. retention times) also allow days, weeks and years.
+PROMQL_DURATION_UNITS = {
+    "ms": 0.001,
+    "s": 1,
+    "m": 60,
+    "h": 3600,
+    "d": 86400,
+    "w": 604800,
+    "y": 31536000,
+}
+PROMQL_DURATION_RE = re.compile(r"(\d+)(ms|s|m|h|d|w|y)")
+
+
+# Use the LibYAML bindings when PyYAML was built with them; they parse and emit the same
+# documents as the pure python classes, several times faster.
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# Returned by read_parse_cache on a miss, since None is a valid parsed document.
+PARSE_CACHE_MISS = object()
+# Fewest uncached receivers.d fragments worth starting a process pool for.
+RECEIVER_FRAGMENT_POOL_MIN = 8
+
+
+class NoAliasDumper(YAML_DUMPER):
+    """YAML Dumper that never emits anchors or aliases.
+
+    Merged receiver configs share unchanged default sub-trees (see `cow_merge`), which the
+    stock Dumper would render as `&id001` / `*id001` references instead of repeating them.
+    """
+
+    def ignore_aliases(self, data):
+        return True
+
+
+class StageProfiler:
+    """Records wall time, CPU time and tracemalloc peak memory for named stages.
+
+    Stages are recorded with `with PROFILER.stage("name"):` and may be nested; nested stages
+    are named after their parents, e.g. "generate_configs/load_default_config". Recording is
+    a no-op until `enable` is called (see --profile).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = []
+        self._stack = []
+
+    def enable(self):
+        """Start recording stages (and tracing memory allocations)."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Record the enclosed block as a stage."""
+        if not self.enabled:
+            yield
+            return
+        start_current, start_peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            # reset_peak below would lose the parent's peak so far, so keep it on the parent.
+            self._stack[-1]["peak"] = max(self._stack[-1]["peak"], start_peak)
+        tracemalloc.reset_peak()
+        frame = {"name": name, "peak": start_current}
+        self._stack.append(frame)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+            self.stages.append(
+                {
+                    "stage": "/".join([f["name"] for f in self._stack] + [name]),
+                    "wall_seconds": wall,
+                    "cpu_seconds": cpu,
+                    "peak_memory_bytes": peak - start_current,
+                }
+            )
+
+    def totals(self):
+        """Return the stages combined by name: times summed, peak memory maximised."""
+        totals = {}
+        for record in self.stages:
+            total = totals.setdefault(
+                record["stage"],
+                {"wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_memory_bytes": 0},
+            )
+            total["wall_seconds"] += record["wall_seconds"]
+            total["cpu_seconds"] += record["cpu_seconds"]
+            total["peak_memory_bytes"] = max(
+                total["peak_memory_bytes"], record["peak_memory_bytes"]
+            )
+        return totals
+
+    def to_json(self):
+        """Return the recorded stages as a JSON document."""
+        return json.dumps({"timestamp": time.time(), "stages": self.stages}, indent=2)
+
+    def to_prometheus(self):
+        """Return the recorded stages in the Prometheus text exposition format.
+
+        The output has no sample timestamps, so it can be read by the node_exporter textfile
+        collector (the node-exporter service in docker-compose.yaml) or backfilled with
+        promtool.
+        """
+        lines = []
+        for metric, field, help_text in [
+            (
+                "wall_seconds",
+                "wall_seconds",
+                "Wall time spent in a config_helper stage.",
+            ),
+            ("cpu_seconds", "cpu_seconds", "CPU time spent in a config_helper stage."),
+            (
+                "peak_memory_bytes",
+                "peak_memory_bytes",
+                "Peak traced memory allocated during a config_helper stage.",
+            ),
+        ]:
+            name = f"config_helper_stage_{metric}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for stage, values in self.totals().items():
+                lines.append(f'{name}{{stage="{stage}"}} {values[field]}')
+        lines.append(
+            "# HELP config_helper_last_run_timestamp_seconds When config_helper last ran."
+        )
+        lines.append("# TYPE config_helper_last_run_timestamp_seconds gauge")
+        lines.append(f"config_helper_last_run_timestamp_seconds {time.time()}")
+        return "\n".join(lines) + "\n"
+
+
+PROFILER = StageProfiler()
+
+
+def parse_cache_path(cache_dir, path):
+    """Return the parse cache file used for the input file at path."""
+    digest = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{digest[:24]}.marshal")
+
+
+def parse_cache_key(path, stat):
+    """Return the key a parse cache entry must match to be used for path."""
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, marshal.version)
+
+
+def read_parse_cache(cache_dir, path, stat):
+    """Return the cached parsed content of path, or PARSE_CACHE_MISS.
+
+    Entries are only used when the source file's mtime and size match those recorded
+    when it was parsed.
+    """
+    try:
+        with open(parse_cache_path(cache_dir, path), "rb") as f:
+            key, content = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return PARSE_CACHE_MISS
+    if tuple(key) != parse_cache_key(path, stat):
+        return PARSE_CACHE_MISS
+    return content
+
+
+def write_parse_cache(cache_dir, path, stat, content):
+    """Store the parsed content of path in the parse cache, ignoring any failure."""
+    cache_path = parse_cache_path(cache_dir, path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        data = marshal.dumps((parse_cache_key(path, stat), content))
+        with open(cache_path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(cache_path + ".tmp", cache_path)
+    except (OSError, ValueError) as e:
+        logging.debug("Not caching parsed '%s': %s", path, e)
+
+
+def load_yaml(path, cache_dir=None):
     """Load a YAML file from the specified path.
 
     This function reads a YAML file and parses its content into a Python dictionary.
     It logs the status of the loading operation, including success and various error cases.
+    When cache_dir is given, the parsed content is kept there and reused by later calls
+    until the file's mtime or size changes.
 
     Parameters:
         path (str): The file path to the YAML file to be loaded.
+        cache_dir (str, optional): The directory holding the parse cache.
 
     Returns:
         dict or None: The content of the YAML file as a dictionary if loading is successful;
@@ -65,8 +601,16 @@ def load_yaml(path):
     """
     try:
         with open(path, "r") as f:
-            content = yaml.safe_load(f)
+            if cache_dir:
+                stat = os.fstat(f.fileno())
+                content = read_parse_cache(cache_dir, path, stat)
+                if content is not PARSE_CACHE_MISS:
+                    logging.info("Successfully loaded '%s' (cached).", path)
+                    return content
+            content = yaml.load(f, Loader=YAML_LOADER)
             logging.info("Successfully loaded '%s'.", path)
+            if cache_dir:
+                write_parse_cache(cache_dir, path, stat, content)
             return content
     except FileNotFoundError:
         logging.error("Error: The file '%s' does not exist.", path)
@@ -109,26 +653,228 @@ def load_json(path):
         return None
 
 
-def write_yaml_to_file(data, path):
+def render_yaml(data):
+    """Render data as the block-style YAML written to the AST config files.
+
+    Parameters:
+        data (dict): The dictionary to be rendered.
+
+    Returns:
+        str: The rendered YAML document.
+    """
+    return yaml.dump(data, Dumper=NoAliasDumper, default_flow_style=False)
+
+
+def write_yaml_to_file(data, path, rendered=None):
     """Write a dictionary to a YAML file.
 
-    This function serializes a given dictionary and writes it to a specified YAML file.
-    It logs the success or failure of the write operation.
+    This function serializes a given dictionary and writes it to a specified YAML file with
+    `write_text_to_file`.
 
     Parameters:
         data (dict): The dictionary to be written to the YAML file.
         path (str): The file path where the YAML data will be saved.
+        rendered (str, optional): The already rendered YAML for data, if available.
+
+    Returns:
+        bool: True if the file was written, False if it was unchanged or the write failed.
+    """
+    if rendered is None:
+        rendered = render_yaml(data)
+    return write_text_to_file(rendered, path)
+
+
+def write_text_to_file(rendered, path):
+    """Write already rendered text (YAML, JSON, ...) to a file.
+
+    If the file already holds exactly the rendered bytes, the write is skipped so that file
+    watchers (and collector reloads) are not triggered needlessly. Otherwise the text is written
+    to a temporary file that is then renamed over path, so readers never see a partial file.
+    It logs the success or failure of the write operation.
+
+    Parameters:
+        rendered (str): The file content.
+        path (str): The file path where the content will be saved.
+
+    Returns:
+        bool: True if the file was written, False if it was unchanged or the write failed.
+    """
+    try:
+        with open(path, "r") as f:
+            if f.read() == rendered:
+                logging.info("'%s' is unchanged, skipping write.", path)
+                return False
+    except (FileNotFoundError, UnicodeDecodeError):
+        pass
+    except IOError as e:
+        logging.warning("Unable to compare with existing file '%s': %s", path, e)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(rendered)
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp_path, path)
+        logging.info("Successfully wrote data to '%s'.", path)
+        return True
+    except IOError as e:
+        logging.error("Error writing to file '%s': %s", path, e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+def summarize_output(rendered, path):
+    """Describe rendered output briefly, compared with the file currently at path.
+
+    The diff stat counts lines added and removed as a multiset, which is cheap for large
+    files and exact unless lines were only reordered.
+
+    Parameters:
+        rendered (str): The rendered output document.
+        path (str): The path the output will be written to.
+
+    Returns:
+        str: A one-line summary with the size and the change against the existing file.
+    """
+    new_lines = rendered.splitlines()
+    size = f"{len(rendered.encode('utf-8'))} bytes, {len(new_lines)} lines"
+    try:
+        with open(path, "r") as f:
+            existing = f.read()
+    except (IOError, UnicodeDecodeError):
+        return f"{size} (new file)"
+    if existing == rendered:
+        return f"{size} (unchanged)"
+    new_counts = collections.Counter(new_lines)
+    old_counts = collections.Counter(existing.splitlines())
+    added = sum((new_counts - old_counts).values())
+    removed = sum((old_counts - new_counts).values())
+    return f"{size} (+{added} -{removed} lines)"
+
+
+def emit_output(description, rendered, path, dry_run):
+    """Log a summary of a rendered output file and, in dry-run mode, display it in full.
+
+    The full document is only logged at DEBUG level, so large fleets don't flood the logs.
+
+    Parameters:
+        description (str): A short description of the content, e.g. "12 receivers".
+        rendered (str): The rendered output document.
+        path (str): The path the output will be written to.
+        dry_run (bool): Whether to write the full document to stdout.
+    """
+    logging.info(
+        "Built %s for %s: %s", description, path, summarize_output(rendered, path)
+    )
+    logging.debug("Content of %s:\n\n%s", path, rendered)
+    if dry_run:
+        sys.stdout.write(f"# {path}\n{rendered}")
+
+
+def load_receiver_cache(path):
+    """Load the per-receiver render cache written by a previous run.
+
+    Parameters:
+        path (str): The file path of the JSON cache file.
 
     Returns:
-        None: This function does not return a value. It either successfully writes the data
-              to the file or logs an error if the operation fails.
+        dict: A dictionary mapping receiver names to {"hash": ..., "yaml": ...} entries.
+              An empty dictionary is returned if the cache is missing, unreadable or was
+              written by an incompatible version.
+    """
+    try:
+        with open(path, "r") as f:
+            content = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (IOError, ValueError) as e:
+        logging.warning("Ignoring unreadable receiver cache '%s': %s", path, e)
+        return {}
+    if (
+        not isinstance(content, dict)
+        or content.get("version") != RECEIVER_CACHE_VERSION
+    ):
+        logging.info("Ignoring receiver cache '%s' from another version.", path)
+        return {}
+    return content.get("receivers", {})
+
+
+def save_receiver_cache(cache, path):
+    """Persist the per-receiver render cache.
+
+    Parameters:
+        cache (dict): The receiver cache as returned by `render_receiver_configs`.
+        path (str): The file path of the JSON cache file.
     """
     try:
         with open(path, "w") as f:
-            yaml.dump(data, f, default_flow_style=False)  # Write data to YAML file
-            logging.info("Successfully wrote data to '%s'.", path)
+            json.dump({"version": RECEIVER_CACHE_VERSION, "receivers": cache}, f)
     except IOError as e:
-        logging.error("Error writing to YAML file '%s': %s", path, e)
+        logging.warning("Error writing receiver cache '%s': %s", path, e)
+
+
+def receiver_config_hash(receiver_config):
+    """Return a stable content hash of a single merged receiver configuration."""
+    encoded = json.dumps(receiver_config, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def render_receiver_configs(receiver_output_configs, cache=None):
+    """Render the receivers file, reusing cached YAML for unchanged receivers.
+
+    The receivers file is a top-level mapping rendered with sorted keys, so it is exactly the
+    concatenation of each receiver rendered on its own, in key order. Each receiver's fragment
+    is cached under the hash of its merged settings (its bigip_receivers.yaml entry applied to
+    bigip_receiver_defaults), so a change to one device, or to a default, re-renders only the
+    receivers it actually affects.
+
+    Settings only used by the config helper (e.g. metric_filters) are left out.
+
+    Args:
+        receiver_output_configs (dict): The merged receiver configurations.
+        cache (dict, optional): The cache from a previous run (see `load_receiver_cache`).
+
+    Returns:
+        tuple: A tuple containing:
+            - rendered (str): The full receivers YAML document.
+            - new_cache (dict): The cache entries for the current receivers.
+    """
+    cache = cache or {}
+    new_cache = {}
+    fragments = []
+    reused = 0
+    for name in sorted(receiver_output_configs):
+        config = receiver_output_configs[name]
+        if not GENERATOR_RECEIVER_FIELDS.isdisjoint(config):
+            config = {
+                key: value
+                for key, value in config.items()
+                if key not in GENERATOR_RECEIVER_FIELDS
+            }
+        digest = receiver_config_hash(config)
+        cached = cache.get(name)
+        if cached and cached.get("hash") == digest:
+            fragment = cached["yaml"]
+            reused += 1
+        else:
+            fragment = render_yaml({name: config})
+        new_cache[name] = {"hash": digest, "yaml": fragment}
+        fragments.append(fragment)
+    logging.info(
+        "Rendered %d receivers (%d unchanged from cache).",
+        len(receiver_output_configs),
+        reused,
+    )
+    return "".join(fragments) or render_yaml({}), new_cache
+
+
+def parse_cache_dir(args):
+    """Return the parse cache directory to use for args, or None if caching is disabled."""
+    if args.no_cache:
+        return None
+    return args.parse_cache_dir
 
 
 def load_default_config(args):
@@ -146,7 +892,7 @@ def load_default_config(args):
                       None if an error occurs while loading the file.
     """
     logging.info("Loading AST Default Settings in %s...", args.default_config_file)
-    return load_yaml(args.default_config_file)
+    return load_yaml(args.default_config_file, parse_cache_dir(args))
 
 
 def load_receiver_config(args):
@@ -155,6 +901,10 @@ def load_receiver_config(args):
     This function retrieves the receiver settings for the application study tool
     by loading a YAML configuration file specified in the command-line arguments.
 
+    If the receivers.d directory (--receiver-input-dir) holds YAML fragments, they are loaded
+    too (see `load_receiver_fragments`) and merged with the receiver input file, which may then
+    be absent. A receiver defined in more than one file is an error.
+
     Parameters:
         args (argparse.Namespace): The command-line arguments that include the
                                    path to the default configuration file.
@@ -163,10 +913,156 @@ def load_receiver_config(args):
         dict or None: The content of the YAML file as a dictionary if loading is successful;
                       None if an error occurs while loading the file.
     """
+    fragments = list_receiver_fragments(args.receiver_input_dir)
+    if not fragments:
+        logging.info(
+            "Loading Per-Receiver (BigIP) Settings in %s...", args.receiver_input_file
+        )
+        return load_yaml(args.receiver_input_file, parse_cache_dir(args))
+
+    logging.info(
+        "Loading Per-Receiver (BigIP) Settings in %s and %s...",
+        args.receiver_input_file,
+        args.receiver_input_dir,
+    )
+    sources = []
+    if os.path.exists(args.receiver_input_file):
+        main = load_yaml(args.receiver_input_file, parse_cache_dir(args))
+        if main is None:
+            return None
+        sources.append((args.receiver_input_file, main))
+    contents, errors = load_receiver_fragments(
+        fragments, parse_cache_dir(args), args.workers
+    )
+    merged, merge_errors = merge_receiver_sources(
+        sources + list(zip(fragments, contents))
+    )
+    errors.extend(merge_errors)
+    if errors:
+        logging.error(
+            "%d errors loading the receiver settings:\n  %s",
+            len(errors),
+            "\n  ".join(errors),
+        )
+        return None
+    return merged
+
+
+def parse_receiver_fragment(path):
+    """Parse one receivers.d fragment (run in a worker process by `load_receiver_fragments`).
+
+    Returns:
+        tuple: (content, stat of the parsed file, error message or None).
+    """
+    try:
+        with open(path, "r") as f:
+            stat = os.fstat(f.fileno())
+            return yaml.load(f, Loader=YAML_LOADER), stat, None
+    except (OSError, yaml.YAMLError) as e:
+        return None, None, str(e)
+
+
+def list_receiver_fragments(directory):
+    """Return the YAML fragment paths of a receivers.d directory, sorted (empty if missing)."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [
+        os.path.join(directory, name)
+        for name in sorted(names)
+        if name.endswith((".yaml", ".yml")) and not name.startswith(".")
+    ]
+
+
+def load_receiver_fragments(paths, cache_dir=None, workers=None):
+    """Parse receivers.d fragments, in parallel for those not in the parse cache.
+
+    Fragments whose mtime and size match their parse cache entry (see `read_parse_cache`) are
+    not re-read. The rest are parsed across a pool of worker processes, when there are enough of
+    them to be worth starting one, and then cached.
+
+    Args:
+        paths (list): The fragment paths.
+        cache_dir (str, optional): The directory holding the parse cache.
+        workers (int, optional): The number of worker processes (default: number of CPUs).
+
+    Returns:
+        tuple: A tuple containing:
+            - contents (list): The parsed content of each fragment (None where it failed).
+            - errors (list): "<path>: <problem>" messages for fragments that couldn't be parsed.
+    """
+    contents = [None] * len(paths)
+    errors = []
+    misses = []
+    for idx, path in enumerate(paths):
+        if cache_dir:
+            try:
+                content = read_parse_cache(cache_dir, path, os.stat(path))
+            except OSError:
+                content = PARSE_CACHE_MISS
+            if content is not PARSE_CACHE_MISS:
+                contents[idx] = content
+                continue
+        misses.append(idx)
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(misses) >= RECEIVER_FRAGMENT_POOL_MIN:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(workers, len(misses))
+        ) as executor:
+            results = list(
+                executor.map(
+                    parse_receiver_fragment,
+                    [paths[idx] for idx in misses],
+                    chunksize=max(len(misses) // (4 * workers), 1),
+                )
+            )
+    else:
+        results = [parse_receiver_fragment(paths[idx]) for idx in misses]
+    for idx, (content, stat, error) in zip(misses, results):
+        if error is not None:
+            errors.append(f"{paths[idx]}: {error}")
+            continue
+        contents[idx] = content
+        if cache_dir:
+            write_parse_cache(cache_dir, paths[idx], stat, content)
     logging.info(
-        "Loading Per-Receiver (BigIP) Settings in %s...", args.receiver_input_file
+        "Loaded %d receiver fragments (%d unchanged from cache, %d parsed).",
+        len(paths),
+        len(paths) - len(misses),
+        len(misses),
     )
-    return load_yaml(args.receiver_input_file)
+    return contents, errors
+
+
+def merge_receiver_sources(sources):
+    """Merge receiver maps from several files into one, detecting duplicate receiver keys.
+
+    Args:
+        sources (list): (path, content) pairs, in load order.
+
+    Returns:
+        tuple: A tuple containing:
+            - merged (dict): The receivers of every source.
+            - errors (list): Messages for malformed sources and receivers defined more than once.
+    """
+    merged = {}
+    owners = {}
+    errors = []
+    for path, content in sources:
+        if content is None:
+            continue
+        if not isinstance(content, dict):
+            errors.append(f"{path}: expected a mapping of receivers")
+            continue
+        for key, value in content.items():
+            owner = owners.setdefault(key, path)
+            if owner != path:
+                errors.append(f"{key} is defined in both {owner} and {path}")
+                continue
+            merged[key] = value
+    return merged, errors
 
 
 def load_legacy_config(args):
@@ -243,235 +1139,3218 @@ def transform_receiver_configs(legacy_configs, default_configs):
     return new_receiver_configs
 
 
-def handle_collection_interval(value, default_value):
-    """Handle collection interval formatting."""
-    with_seconds = f"{value}s"
-    return with_seconds if with_seconds != default_value else None
+def iter_json_array(f, read_size=JSON_STREAM_READ_SIZE):
+    """Decode the items of a top-level JSON array one at a time.
 
+    Only the item being decoded (plus one read buffer) is held in memory, so arbitrarily large
+    inventories can be processed with bounded memory.
 
-def handle_password_env_ref(value, default_value):
-    """Handle password environment reference formatting."""
-    escaped_value = f"${{env:{value}}}"
-    return escaped_value if escaped_value != default_value else None
+    Args:
+        f (file): A text file object positioned at the start of a JSON array.
+        read_size (int): The number of characters to read at a time.
 
+    Yields:
+        object: Each decoded array item, in order.
 
-def handle_tls_settings(new_receiver_config, key, value, default_configs):
-    """Handle TLS settings for the receiver configuration."""
-    if key == "tls_insecure_skip_verify":
-        default_value = default_configs.get("tls", {}).get("insecure_skip_verify")
-        key = "insecure_skip_verify"
-    else:  # key == "ca_file"
-        default_value = default_configs.get("tls", {}).get("ca_file")
+    Raises:
+        json.JSONDecodeError: If the content is not a well formed JSON array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
 
-    if value != default_value:
-        if "tls" not in new_receiver_config:
-            new_receiver_config["tls"] = {}
-        new_receiver_config["tls"][key] = value
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(read_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
 
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
 
-def transform_single_receiver(receiver_config, default_configs):
-    """Transform a single receiver configuration.
+    skip(" \t\r\n")
+    if buffer[pos : pos + 1] != "[":
+        raise json.JSONDecodeError("Expecting '['", buffer, pos)
+    pos += 1
+    expect_item = True
+    while True:
+        skip(" \t\r\n")
+        if pos >= len(buffer):
+            raise json.JSONDecodeError("Unterminated array", buffer, pos)
+        if buffer[pos] == "]":
+            return
+        if buffer[pos] == ",":
+            if expect_item:
+                raise json.JSONDecodeError("Unexpected ','", buffer, pos)
+            pos += 1
+            expect_item = True
+            continue
+        if not expect_item:
+            raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            if not eof and (
+                end == len(buffer)
+                or (
+                    isinstance(item, (int, float))
+                    and not buffer[end:].lstrip("0123456789.eE+-")
+                )
+            ):
+                # A number at the end of the buffer may continue in the next read.
+                fill()
+                continue
+            break
+        pos = end
+        expect_item = False
+        yield item
 
-    This function takes a legacy receiver configuration and transforms it into the new format
-    based on the provided default configurations. It processes specific keys differently and
-    incorporates logic for handling collection intervals, passwords, and TLS settings.
+
+def transform_receiver_chunk(start_index, legacy_configs, default_configs):
+    """Transform and render a chunk of legacy receiver configurations.
+
+    Runs in a worker process during streaming conversion.
 
     Args:
-        receiver_config (dict): A dictionary representing the legacy receiver configuration.
-        default_configs (dict): A dictionary containing default configuration values for comparison.
+        start_index (int): The receiver index of the first entry (bigip/{start_index}).
+        legacy_configs (list): The legacy receiver configuration dictionaries.
+        default_configs (dict): The default configuration values for the receivers.
 
     Returns:
-        dict: A dictionary containing the transformed receiver configuration, including any updates
-              based on the provided defaults and specific handling for certain keys.
-
-    The following transformations are applied:
-    - **collection_interval**: Formatted with seconds using the `handle_collection_interval` function.
-    - **password_env_ref**: Processed using the `handle_password_env_ref` function.
-    - **TLS settings**: Handled through the `handle_tls_settings` function.
-    - If a key's value matches the default value, it is skipped.
+        str: The rendered bigip_receivers.yaml entries, in index order.
     """
-    new_receiver_config = {}
-    for key, value in receiver_config.items():
-        default_value = default_configs.get(key)
+    return "".join(
+        render_yaml(
+            {
+                f"bigip/{start_index + offset}": transform_single_receiver(
+                    receiver_config, default_configs
+                )
+            }
+        )
+        for offset, receiver_config in enumerate(legacy_configs)
+    )
 
-        if key == "collection_interval":
-            interval = handle_collection_interval(value, default_value)
-            if interval:
-                new_receiver_config[key] = interval
-        elif key == "password_env_ref":
-            pw = handle_password_env_ref(value, default_value)
-            if pw:
-                new_receiver_config["password"] = pw
-        elif key in ["tls_insecure_skip_verify", "ca_file"]:
-            handle_tls_settings(new_receiver_config, key, value, default_configs)
-        elif default_value and default_value == value:
-            continue  # Skip if value is the same as the default
-        else:
-            new_receiver_config[key] = value
 
-    return new_receiver_config
+def stream_legacy_conversion(legacy_file, default_configs, workers, chunk_size):
+    """Stream converted legacy receivers as rendered YAML chunks, in index order.
 
+    Legacy entries are decoded one at a time and handed to a process pool in chunks. At most
+    two chunks per worker are in flight, so memory stays bounded however many devices the
+    inventory holds.
 
-def deep_merge(dict1, dict2):
-    """Deep merge two dictionaries."""
-    for key, value in dict2.items():
-        if key in dict1:
-            # If both values are dicts, merge them
-            if isinstance(dict1[key], dict) and isinstance(value, dict):
-                deep_merge(dict1[key], value)
-            else:
-                dict1[key] = value  # Overwrite with dict2's value
-        else:
-            dict1[key] = value  # Add new key from dict2
-    return dict1
+    Args:
+        legacy_file (file): The open legacy big-ips.json file.
+        default_configs (dict): The default configuration values for the receivers.
+        workers (int): The number of worker processes; 0 or 1 converts in this process.
+        chunk_size (int): The number of entries per chunk.
 
+    Yields:
+        tuple: (number of entries, rendered YAML) for each chunk, in index order.
+    """
 
-def generate_receiver_configs(receiver_input_configs, default_config):
-    """Generate merged receiver configurations from input and defaults.
+    def chunks():
+        chunk = []
+        start = 1
+        for item in iter_json_array(legacy_file):
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                yield start, chunk
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            yield start, chunk
 
-    This function takes a dictionary of receiver input configurations and a default configuration,
-    and generates a merged configuration for each receiver. It ensures that any specific receiver
-    configurations override the default values while maintaining the overall structure defined by
-    the defaults.
+    if workers <= 1:
+        for start, chunk in chunks():
+            yield len(chunk), transform_receiver_chunk(start, chunk, default_configs)
+        return
 
-    Args:
-        receiver_input_configs (dict): A dictionary where keys are receiver identifiers and values
-                                       are their corresponding configurations.
-        default_config (dict): A dictionary containing default configuration values, particularly
-                               under the key 'bigip_receiver_defaults'.
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for start, chunk in chunks():
+            pending.append(
+                (
+                    len(chunk),
+                    executor.submit(
+                        transform_receiver_chunk, start, chunk, default_configs
+                    ),
+                )
+            )
+            if len(pending) >= 2 * workers:
+                count, future = pending.popleft()
+                yield count, future.result()
+        while pending:
+            count, future = pending.popleft()
+            yield count, future.result()
 
-    Returns:
-        dict: A dictionary containing the merged receiver configurations, where each key corresponds
-              to a receiver identifier and each value is the resulting merged configuration.
 
-    The following operations are performed for each receiver:
-    - Deep copies of the default configurations and the receiver-specific configurations are created.
-    - If the receiver configuration contains a 'pipeline' key, it is removed.
-    - The merged configuration is generated by deep merging the defaults with the specific receiver
-      configuration, ensuring that specific values take precedence over defaults.
-    """
-    merged_config = {}
-    for k, v in receiver_input_configs.items():
-        defaults = deepcopy(default_config.get("bigip_receiver_defaults"))
-        this_cfg = deepcopy(v)
-        if this_cfg.get("pipeline"):
-            del this_cfg["pipeline"]
-        merged_config[k] = deep_merge(defaults, this_cfg)
-    return merged_config
+def convert_legacy_config_streaming(args):
+    """Convert a legacy configuration file to bigip_receivers.yaml without loading it whole.
 
+    Like `convert_legacy_config`, but decodes legacy entries one at a time, converts them in
+    parallel (see `stream_legacy_conversion`) and streams the bigip/N entries to the receiver
+    input file in index order. The output is written to a temporary file and renamed into place
+    once complete. In dry-run mode entries are converted and counted but not written.
 
-def assemble_pipelines(
-    pipeline_key, default_pipeline, receiver_input_configs, pipelines, filename
-):
+    Args:
+        args (argparse.Namespace): Command-line arguments containing paths to configuration files,
+                                   the number of --workers and the --chunk-size.
+
+    Returns:
+        int or None: The number of converted receivers, or None if any error occurs.
     """
-    Assembles pipeline configurations by linking receivers to their respective pipelines.
+    logging.info(
+        "Streaming conversion of legacy configuration in %s...",
+        args.legacy_config_file,
+    )
+    default_config = load_default_config(args)
+    if not default_config:
+        return None
 
-    This function iterates over the provided receiver input configurations and associates each receiver
-    with its corresponding pipeline. If a specified pipeline is not found in the defined pipelines,
-    an error is logged, and the function returns None.
+    default_receiver_configs = default_config.get("bigip_receiver_defaults")
+    if not default_receiver_configs:
+        logging.error(
+            "Error: Default receiver configs not found in default settings file."
+        )
+        return None
+
+    workers = args.workers if args.workers is not None else os.cpu_count() or 1
+    tmp_path = f"{args.receiver_input_file}.tmp"
+    total = 0
+    try:
+        with contextlib.ExitStack() as stack:
+            legacy_file = stack.enter_context(open(args.legacy_config_file, "r"))
+            out = None
+            if not args.dry_run:
+                out = stack.enter_context(open(tmp_path, "w"))
+            for count, rendered in stream_legacy_conversion(
+                legacy_file, default_receiver_configs, workers, args.chunk_size
+            ):
+                total += count
+                if out:
+                    out.write(rendered)
+    except FileNotFoundError:
+        logging.error("Error: The file '%s' does not exist.", args.legacy_config_file)
+        return None
+    except json.JSONDecodeError as e:
+        logging.error("Error reading JSON file '%s': %s", args.legacy_config_file, e)
+        if not args.dry_run and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    except IOError as e:
+        logging.error("Error writing to YAML file '%s': %s", tmp_path, e)
+        if not args.dry_run and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+    if total == 0:
+        logging.error("No receivers found in '%s'.", args.legacy_config_file)
+        if not args.dry_run:
+            os.remove(tmp_path)
+        return None
+    if not args.dry_run:
+        os.replace(tmp_path, args.receiver_input_file)
+        logging.info(
+            "Successfully wrote %d receivers to '%s'.", total, args.receiver_input_file
+        )
+    else:
+        logging.info("Converted %d receivers (dry run, nothing written).", total)
+    return total
 
-    Parameters:
-    - pipeline_key (str): The key used to retrieve the pipeline name from the receiver's configuration.
-    - default_pipeline (str): The default pipeline to use if none is specified in the receiver's config.
-    - receiver_input_configs (dict): A dictionary mapping receiver names to their configuration settings.
-    - pipelines (dict): A dictionary of available pipelines, where each pipeline is identified by its name.
-    - filename (str): The name of the configuration file being processed, used for logging errors.
+
+def parse_column_map(spec):
+    """Parse a --column-map value of comma separated column=field pairs.
+
+    Args:
+        spec (str or None): e.g. "mgmt_ip=endpoint,user=username".
 
     Returns:
-    - None: If any specified pipeline is not found, the function logs an error and exits early.
+        dict: Inventory column name -> receiver field name.
+
+    Raises:
+        ValueError: If a pair is malformed or names an unknown receiver field.
     """
-    for receiver, config in receiver_input_configs.items():
-        pipeline = config.get(pipeline_key, default_pipeline)
-        this_pipeline = pipelines.get(pipeline)
-        if not this_pipeline:
-            logging.error(
-                "Pipeline %s on Receiver %s is not found in config pipelines section of %s...",
-                pipeline,
-                receiver,
-                filename,
+    column_map = {}
+    for pair in (spec or "").split(","):
+        if not pair.strip():
+            continue
+        column, sep, field = pair.partition("=")
+        column, field = column.strip(), field.strip()
+        if not sep or not column or field not in INVENTORY_FIELDS:
+            raise ValueError(
+                f"Invalid column mapping '{pair}', expected column=field with field one of "
+                f"{', '.join(INVENTORY_FIELDS)}"
             )
-            return None
-        if not this_pipeline.get("receivers"):
-            this_pipeline["receivers"] = []
-        this_pipeline["receivers"].append(receiver)
+        column_map[column] = field
+    return column_map
 
 
-def generate_pipeline_configs(receiver_input_configs, default_config, args):
-    """Generate pipeline configurations based on receiver inputs and default settings.
+def normalize_inventory_row(row, column_map):
+    """Convert an inventory row into a legacy-style receiver configuration.
 
-    This function constructs pipeline configurations by associating receivers with their respective
-    pipelines based on the provided receiver input configurations and default settings. It validates
-    the existence of default pipelines and the pipelines specified in the default configuration.
+    Columns are renamed with column_map (unmapped columns keep their name), columns that are not
+    receiver fields and empty values are dropped, and values are converted to the types used in
+    the legacy big-ips.json so the result can be passed to `transform_single_receiver`.
 
     Args:
-        receiver_input_configs (dict): A dictionary where keys are receiver identifiers and values
-                                       are their corresponding configurations.
-        default_config (dict): A dictionary containing default configuration values, particularly
-                               under the keys 'pipeline_default' and 'pipelines'.
-        args (argparse.Namespace): The parsed command-line arguments, used for logging context.
+        row (dict): A CSV row or JSONL object.
+        column_map (dict): Inventory column name -> receiver field name.
 
     Returns:
-        dict or None: A dictionary containing the updated pipeline configurations, or None if
-                      there are errors (e.g., missing default pipelines or pipelines for receivers).
+        dict: The legacy-style receiver configuration, including a "name" key if present.
 
-    The function performs the following steps:
-    - Retrieves the default pipeline from the default configuration.
-    - Validates the existence of pipelines in the default configuration.
-    - Iterates over each receiver in the input configurations to determine its associated pipeline.
-    - If the specified pipeline does not exist, logs an error and returns None.
-    - Appends the receiver to the appropriate pipeline's receivers list, creating the list if it does not exist.
+    Raises:
+        ValueError: If the row has no endpoint or a value can't be converted.
     """
-    pipelines = default_config.get("pipelines")
-    if not pipelines:
-        logging.error(
-            "No pipelines set in default config file:\n\n%s", yaml.dump(default_config)
-        )
+    config = {}
+    for column, value in row.items():
+        field = column_map.get(column, column)
+        kind = INVENTORY_FIELDS.get(field)
+        if kind is None or value is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if value == "":
+                continue
+        if kind == "interval":
+            text = str(value)
+            try:
+                value = int(text[:-1] if text.endswith("s") else text)
+            except ValueError:
+                raise ValueError(f"Invalid {field} '{text}'") from None
+            if value <= 0:
+                raise ValueError(f"Invalid {field} '{text}'")
+        elif kind == "duration":
+            text = str(value)
+            if re.fullmatch(r"\d+(\.\d+)?", text):
+                text = f"{text}s"
+            try:
+                parse_duration(text)
+            except ValueError:
+                raise ValueError(f"Invalid {field} '{value}'") from None
+            value = text
+        elif kind == "bool":
+            if not isinstance(value, bool):
+                if str(value).lower() not in BOOLEAN_STRINGS:
+                    raise ValueError(f"Invalid {field} '{value}'")
+                value = BOOLEAN_STRINGS[str(value).lower()]
+        else:
+            value = str(value)
+        config[field] = value
+    if "endpoint" not in config:
+        raise ValueError("Missing endpoint")
+    if "://" not in config["endpoint"]:
+        config["endpoint"] = f"https://{config['endpoint']}"
+    return config
+
+
+def iter_inventory_rows(f, inventory_format):
+    """Read the rows of a CSV or JSONL inventory one at a time.
+
+    Args:
+        f (file): The open inventory file.
+        inventory_format (str): "csv" (with a header row) or "jsonl" (one object per line).
+
+    Yields:
+        tuple: (line number, row dict or None, error message or None). Rows that can't be
+               decoded are yielded with an error so they can be reported as rejects.
+    """
+    if inventory_format == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, row, "Too many columns"
+            else:
+                yield reader.line_num, row, None
+        return
+
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, {"line": line.rstrip("\n")}, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, {"line": line.rstrip("\n")}, "Expected a JSON object"
+        else:
+            yield line_number, row, None
+
+
+def import_inventory(args):
+    """Import a CSV or JSONL device inventory into bigip_receivers.yaml.
+
+    Rows are read, converted and written one at a time, so memory use does not grow with the
+    size of the inventory. Each row is mapped to receiver fields with --column-map, then diffed
+    against bigip_receiver_defaults with `transform_single_receiver` so only real overrides are
+    written. Receivers are named bigip/<name> when the inventory has a name column, otherwise
+    bigip/<n> in row order.
+
+    Rows that can't be imported (missing endpoint, bad values, duplicate names) are written to
+    the --rejects-file as JSON lines with the line number, reason and original row. The output
+    is written to a temporary file and renamed into place once complete. In dry-run mode rows
+    are checked and counted but nothing is written.
+
+    Args:
+        args (argparse.Namespace): Command-line arguments containing the --import-inventory path,
+                                   --inventory-format, --column-map and --rejects-file.
+
+    Returns:
+        int or None: The number of imported receivers, or None if any error occurs.
+    """
+    path = args.import_inventory
+    logging.info("Importing device inventory in %s...", path)
+    inventory_format = args.inventory_format
+    if inventory_format is None:
+        inventory_format = "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+    try:
+        column_map = parse_column_map(args.column_map)
+    except ValueError as e:
+        logging.error("Error: %s", e)
         return None
 
-    default_pipeline = default_config.get("pipeline_default")
-    if not default_pipeline:
+    default_config = load_default_config(args)
+    if not default_config:
+        return None
+
+    default_receiver_configs = default_config.get("bigip_receiver_defaults")
+    if not default_receiver_configs:
         logging.error(
-            "No default pipeline set in default config file:\n\n%s",
-            yaml.dump(default_config),
+            "Error: Default receiver configs not found in default settings file."
         )
         return None
 
-    assemble_pipelines(
-        "pipeline",
-        default_pipeline,
-        receiver_input_configs,
-        pipelines,
-        args.receiver_input_file,
+    rejects_path = args.rejects_file or (
+        f"{os.path.splitext(args.receiver_input_file)[0]}.rejects.jsonl"
     )
+    tmp_path = f"{args.receiver_input_file}.tmp"
+    names = set()
+    total = 0
+    rejected = 0
+    try:
+        with contextlib.ExitStack() as stack:
+            inventory = stack.enter_context(open(path, "r", newline=""))
+            out = rejects = None
+            if not args.dry_run:
+                out = stack.enter_context(open(tmp_path, "w"))
+                rejects = stack.enter_context(open(rejects_path, "w"))
+            for line_number, row, error in iter_inventory_rows(
+                inventory, inventory_format
+            ):
+                if error is None:
+                    try:
+                        config = normalize_inventory_row(row, column_map)
+                        label = str(config.pop("name", total + 1))
+                        if label.startswith("bigip/"):
+                            label = label[len("bigip/") :]
+                        name = f"bigip/{label}"
+                        if name in names:
+                            raise ValueError(f"Duplicate receiver name '{name}'")
+                    except ValueError as e:
+                        error = str(e)
+                if error is not None:
+                    rejected += 1
+                    logging.debug("Rejected line %d: %s", line_number, error)
+                    if rejects:
+                        record = {"line": line_number, "error": error, "row": row}
+                        rejects.write(json.dumps(record, default=str) + "\n")
+                    continue
+                names.add(name)
+                total += 1
+                if out:
+                    out.write(
+                        render_yaml(
+                            {
+                                name: transform_single_receiver(
+                                    config, default_receiver_configs
+                                )
+                            }
+                        )
+                    )
+    except FileNotFoundError:
+        logging.error("Error: The file '%s' does not exist.", path)
+        return None
+    except (IOError, csv.Error, UnicodeDecodeError) as e:
+        logging.error("Error importing '%s': %s", path, e)
+        if not args.dry_run and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
 
-    f5_pipeline_default = default_config.get("f5_pipeline_default")
-    enabled = default_config.get("f5_data_export", False)
-    f5_export_enabled = f5_pipeline_default and enabled
-    if not f5_export_enabled:
+    if rejected:
         logging.warning(
-            "The f5_data_export=true and f5_pipeline_default fields are required to "
-            "export metrics periodically to F5. Contact your F5 Sales Rep to provision a "
-            "Sensor ID and Access Token.",
+            "Rejected %d rows%s.",
+            rejected,
+            "" if args.dry_run else f", see '{rejects_path}'",
+        )
+    elif not args.dry_run:
+        os.remove(rejects_path)
+    if total == 0:
+        logging.error("No receivers imported from '%s'.", path)
+        if not args.dry_run:
+            os.remove(tmp_path)
+        return None
+    if not args.dry_run:
+        os.replace(tmp_path, args.receiver_input_file)
+        logging.info(
+            "Successfully wrote %d receivers to '%s'.", total, args.receiver_input_file
         )
     else:
-        assemble_pipelines(
-            "f5_pipeline",
-            f5_pipeline_default,
-            receiver_input_configs,
-            pipelines,
-            args.receiver_input_file,
+        logging.info("Imported %d receivers (dry run, nothing written).", total)
+    return total
+
+
+def simulator_receivers(count, endpoint):
+    """Build receiver settings for devices simulated by bigip_simulator.py.
+
+    The simulator serves each device on its own port, counting up from the port of the first
+    device's endpoint. HTTPS receivers skip certificate verification, since the simulator
+    serves a self-signed certificate.
+
+    Args:
+        count (int): The number of simulated devices.
+        endpoint (str): The URL of the first simulated device, e.g. "https://127.0.0.1:8443".
+
+    Returns:
+        dict or None: bigip/sim-<n> receivers, or None if the endpoint is not a URL with a port.
+    """
+    parts = urlsplit(endpoint)
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if parts.scheme not in ("http", "https") or not parts.hostname or port is None:
+        logging.error(
+            "Error: --simulator-endpoint must be an http(s) URL with a port, got %r.",
+            endpoint,
         )
+        return None
+    host = f"[{parts.hostname}]" if ":" in parts.hostname else parts.hostname
+    receivers = {}
+    for index in range(count):
+        config = {"endpoint": f"{parts.scheme}://{host}:{port + index}"}
+        if parts.scheme == "https":
+            config["tls"] = {"insecure_skip_verify": True}
+        receivers[f"bigip/sim-{index}"] = config
+    return receivers
+
+
+def write_simulator_receivers(args):
+    """Write receiver settings for the simulated devices to the simulator output file.
+
+    The settings are kept apart from the real receiver input file, which they would otherwise
+    replace; generate configs from them with --receiver-input-file.
+
+    Args:
+        args (argparse.Namespace): Command-line arguments containing --simulator-receivers,
+                                   --simulator-endpoint and --simulator-output-file.
+
+    Returns:
+        dict or None: The written receivers, or None if any error occurs.
+    """
+    receivers = simulator_receivers(args.simulator_receivers, args.simulator_endpoint)
+    if not receivers:
+        return None
+    rendered = render_yaml(receivers)
+    emit_output(
+        f"{len(receivers)} simulated receivers",
+        rendered,
+        args.simulator_output_file,
+        args.dry_run,
+    )
+    if not args.dry_run:
+        write_yaml_to_file(receivers, args.simulator_output_file, rendered=rendered)
+    return receivers
+
+
+def handle_collection_interval(value, default_value):
+    """Handle collection interval formatting."""
+    with_seconds = f"{value}s"
+    return with_seconds if with_seconds != default_value else None
+
+
+def handle_password_env_ref(value, default_value):
+    """Handle password environment reference formatting."""
+    escaped_value = f"${{env:{value}}}"
+    return escaped_value if escaped_value != default_value else None
+
+
+def handle_tls_settings(new_receiver_config, key, value, default_configs):
+    """Handle TLS settings for the receiver configuration."""
+    if key == "tls_insecure_skip_verify":
+        default_value = default_configs.get("tls", {}).get("insecure_skip_verify")
+        key = "insecure_skip_verify"
+    else:  # key == "ca_file"
+        default_value = default_configs.get("tls", {}).get("ca_file")
+
+    if value != default_value:
+        if "tls" not in new_receiver_config:
+            new_receiver_config["tls"] = {}
+        new_receiver_config["tls"][key] = value
+
+
+def transform_single_receiver(receiver_config, default_configs):
+    """Transform a single receiver configuration.
+
+    This function takes a legacy receiver configuration and transforms it into the new format
+    based on the provided default configurations. It processes specific keys differently and
+    incorporates logic for handling collection intervals, passwords, and TLS settings.
+
+    Args:
+        receiver_config (dict): A dictionary representing the legacy receiver configuration.
+        default_configs (dict): A dictionary containing default configuration values for comparison.
+
+    Returns:
+        dict: A dictionary containing the transformed receiver configuration, including any updates
+              based on the provided defaults and specific handling for certain keys.
+
+    The following transformations are applied:
+    - **collection_interval**: Formatted with seconds using the `handle_collection_interval` function.
+    - **password_env_ref**: Processed using the `handle_password_env_ref` function.
+    - **TLS settings**: Handled through the `handle_tls_settings` function.
+    - If a key's value matches the default value, it is skipped.
+    """
+    new_receiver_config = {}
+    for key, value in receiver_config.items():
+        default_value = default_configs.get(key)
+
+        if key == "collection_interval":
+            interval = handle_collection_interval(value, default_value)
+            if interval:
+                new_receiver_config[key] = interval
+        elif key == "password_env_ref":
+            pw = handle_password_env_ref(value, default_value)
+            if pw:
+                new_receiver_config["password"] = pw
+        elif key in ["tls_insecure_skip_verify", "ca_file"]:
+            handle_tls_settings(new_receiver_config, key, value, default_configs)
+        elif default_value and default_value == value:
+            continue  # Skip if value is the same as the default
+        else:
+            new_receiver_config[key] = value
+
+    return new_receiver_config
+
+
+def deep_merge(dict1, dict2):
+    """Deep merge two dictionaries."""
+    for key, value in dict2.items():
+        if key in dict1:
+            # If both values are dicts, merge them
+            if isinstance(dict1[key], dict) and isinstance(value, dict):
+                deep_merge(dict1[key], value)
+            else:
+                dict1[key] = value  # Overwrite with dict2's value
+        else:
+            dict1[key] = value  # Add new key from dict2
+    return dict1
+
+
+def cow_merge(base, overrides):
+    """Copy-on-write merge of overrides onto base.
+
+    Neither input is modified. The result is a new top-level dict that shares every sub-tree
+    of base that overrides does not touch; only the dicts along an overridden path are copied.
+    Values taken from overrides are referenced, not copied.
+
+    Args:
+        base (dict): The dictionary providing default values.
+        overrides (dict): The dictionary whose values take precedence.
+
+    Returns:
+        dict: The merged dictionary. Nested values may be shared with base, overrides or other
+              merge results, so callers must replace rather than mutate nested values.
+    """
+    merged = dict(base)
+    for key, value in overrides.items():
+        current = merged.get(key)
+        if isinstance(current, dict) and isinstance(value, dict):
+            merged[key] = cow_merge(current, value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def parse_duration(value):
+    """Parse a Go style duration string (e.g. "60s", "1m30s", "500ms") into seconds.
+
+    Args:
+        value (str): The duration string, as accepted by the otel collector.
+
+    Returns:
+        float: The duration in seconds.
+
+    Raises:
+        ValueError: If value is not a valid duration string.
+    """
+    if not isinstance(value, str):
+        raise ValueError(f"duration must be a string like '60s', got {value!r}")
+    if value == "0":
+        return 0.0
+    pos = 0
+    total = 0.0
+    for match in DURATION_PART_RE.finditer(value):
+        if match.start() != pos:
+            break
+        total += float(match.group(1)) * DURATION_UNITS[match.group(2)]
+        pos = match.end()
+    if pos == 0 or pos != len(value):
+        raise ValueError(f"invalid duration {value!r}")
+    return total
+
+
+def format_duration(seconds):
+    """Format a number of seconds as a duration string, e.g. 17 -> "17s", 0.25 -> "250ms"."""
+    if seconds < 1 and seconds != 0:
+        return f"{round(seconds * 1000)}ms"
+    if seconds == int(seconds):
+        return f"{int(seconds)}s"
+    return f"{seconds:g}s"
+
+
+def parse_promql_duration(text):
+    """Parse a PromQL duration (e.g. "5m", "1h30m", "7d") into seconds.
+
+    Raises:
+        ValueError: If text is not a valid duration.
+    """
+    pos = 0
+    total = 0.0
+    for match in PROMQL_DURATION_RE.finditer(text):
+        if match.start() != pos:
+            break
+        total += int(match.group(1)) * PROMQL_DURATION_UNITS[match.group(2)]
+        pos = match.end()
+    if pos == 0 or pos != len(text):
+        raise ValueError(f"invalid duration {text!r}")
+    return total
+
+
+def load_tsdb_status(path):
+    """Load a saved /api/v1/status/tsdb response into series and label value counts.
+
+    Args:
+        path (str): The JSON file, either the full API response or just its "data".
+
+    Returns:
+        dict: "series" (metric -> series count), "label_values" (label -> value count) and
+              "total_series", or None if the file can't be read.
+    """
+    try:
+        with open(path, "r") as f:
+            status = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.error("Error reading TSDB status file '%s': %s", path, e)
+        return None
+    data = status.get("data", status) if isinstance(status, dict) else None
+    if not isinstance(data, dict):
+        logging.error("Error: '%s' is not a /api/v1/status/tsdb response.", path)
+        return None
+    return {
+        "series": {
+            item["name"]: item["value"]
+            for item in data.get("seriesCountByMetricName") or []
+        },
+        "label_values": {
+            item["name"]: item["value"]
+            for item in data.get("labelValueCountByLabelName") or []
+        },
+        "total_series": (data.get("headStats") or {}).get("numSeries"),
+    }
+
+
+def enabled_data_types(receiver_config):
+    """Return the names of the optional data_types enabled on a merged receiver config."""
+    data_types = receiver_config.get("data_types") or {}
+    return [
+        name
+        for name, settings in data_types.items()
+        if isinstance(settings, dict) and settings.get("enabled")
+    ]
+
+
+def estimate_scrape_cost(receiver_config):
+    """Estimate the relative collection cost of a merged receiver config.
+
+    The cost is the number of modules scraped per minute: the always-on core modules plus each
+    enabled optional data_type, scaled by how often the receiver's collection_interval fires.
+    Unparseable intervals are treated as the 60s default.
+
+    Args:
+        receiver_config (dict): The merged receiver configuration.
+
+    Returns:
+        float: The estimated cost, in module scrapes per minute.
+    """
+    try:
+        interval = parse_duration(receiver_config.get("collection_interval", "60s"))
+    except ValueError:
+        interval = 60.0
+    modules = BASE_SCRAPE_WEIGHT + len(enabled_data_types(receiver_config))
+    return modules * 60.0 / max(interval, 1.0)
+
+
+def shard_rank(receiver, shard):
+    """Return the rendezvous hashing score of a receiver on a shard."""
+    digest = hashlib.sha256(f"{receiver}#{shard}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def assign_shards(receiver_output_configs, shard_count, load_factor=SHARD_LOAD_FACTOR):
+    """Assign receivers to collector shards with rendezvous hashing.
+
+    Each receiver goes to the shard with its highest `shard_rank`, so its shard depends only on
+    its own name and the number of shards, not on the rest of the fleet. Adding a receiver moves
+    no other receiver, and adding a shard only moves the receivers that now rank the new shard
+    highest (about 1/shard_count of them). The estimated scrape cost of each shard is logged, with
+    a warning when one exceeds load_factor times the fair share.
+
+    Args:
+        receiver_output_configs (dict): The merged receiver configurations.
+        shard_count (int): The number of collector instances to split receivers across.
+        load_factor (float): The shard cost, as a multiple of the fair share, above which the
+                             imbalance is reported.
+
+    Returns:
+        dict: A dictionary mapping each receiver name to its shard index (0 to shard_count-1).
+    """
+    costs = {
+        name: estimate_scrape_cost(config)
+        for name, config in receiver_output_configs.items()
+    }
+    fair_share = sum(costs.values()) / shard_count
+    loads = [0.0] * shard_count
+    assignments = {}
+    for name, cost in costs.items():
+        shard = max(range(shard_count), key=lambda shard: shard_rank(name, shard))
+        assignments[name] = shard
+        loads[shard] += cost
+    for shard, load in enumerate(loads):
+        logging.info(
+            "Shard %d: %d receivers, estimated cost %.1f module scrapes/min.",
+            shard,
+            sum(1 for assigned in assignments.values() if assigned == shard),
+            load,
+        )
+    if fair_share and max(loads) > load_factor * fair_share:
+        logging.warning(
+            "The busiest shard has %.0f%% of the fair share of the estimated scrape cost; "
+            "more shards spread the receivers more evenly.",
+            100 * max(loads) / fair_share,
+        )
+    return assignments
+
+
+def split_pipeline_configs(pipeline_output_configs, receivers):
+    """Return a copy of the pipeline configs keeping only the given receivers.
+
+    Args:
+        pipeline_output_configs (dict): The generated pipeline configurations.
+        receivers (set): The receiver names to keep.
+
+    Returns:
+        dict: The pipeline configurations, without pipelines left with no receivers.
+    """
+    pipelines = {}
+    for pipeline, settings in pipeline_output_configs.items():
+        kept = [r for r in settings.get("receivers", []) if r in receivers]
+        if kept:
+            pipelines[pipeline] = {**settings, "receivers": kept}
+    return pipelines
+
+
+def shard_output_path(path, shard):
+    """Return the output path for a shard, e.g. receivers.yaml -> receivers-0.yaml."""
+    root, ext = os.path.splitext(path)
+    return f"{root}-{shard}{ext}"
+
+
+def shard_collector_config_path(args, shard):
+    """Return the path of a shard's collector config, e.g. collector-shard-0.yaml."""
+    return shard_output_path(
+        os.path.join(
+            os.path.dirname(args.receiver_output_file), SHARD_COLLECTOR_CONFIG
+        ),
+        shard,
+    )
+
+
+def shard_collector_config(receiver_path, pipeline_path):
+    """Return the collector config of a shard, loading its own receivers and pipelines files.
+
+    The shard's collector loads it after the collector config template, so its receivers and
+    service.pipelines references replace the template's.
+    """
+    return {
+        "receivers": f"${{file:{COLLECTOR_CONFIG_DIR}/{os.path.basename(receiver_path)}}}",
+        "service": {
+            "pipelines": f"${{file:{COLLECTOR_CONFIG_DIR}/{os.path.basename(pipeline_path)}}}"
+        },
+    }
+
+
+def shard_compose_override(args):
+    """Return a docker compose override file running one otel-collector service per shard.
+
+    Shard 0 runs in the existing otel-collector service and shard n in otel-collector-n, which
+    extends it; each loads the collector config template, the overlay and its own
+    collector-shard-n config.
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments (--shards and the output
+                                   file paths).
+
+    Returns:
+        dict: The compose file content.
+    """
+    output_dir = os.path.dirname(args.receiver_output_file)
+    configs = [
+        f"--config={COLLECTOR_CONFIG_DIR}/{os.path.relpath(path, output_dir)}"
+        for path in [args.collector_config_file, args.overlay_output_file]
+    ]
+    services = {}
+    for shard in range(args.shards):
+        path = shard_collector_config_path(args, shard)
+        service = {
+            "command": configs
+            + [f"--config={COLLECTOR_CONFIG_DIR}/{os.path.basename(path)}"]
+        }
+        if shard == 0:
+            services["otel-collector"] = service
+        else:
+            services[f"otel-collector-{shard}"] = {
+                "extends": {"file": COMPOSE_FILE, "service": "otel-collector"},
+                **service,
+            }
+    return {"services": services}
+
+
+def remove_stale_shard_outputs(args):
+    """Remove the shard outputs of a previous run with more shards.
+
+    Unsharded (--shards 1), every shard file and the compose override are removed, so they
+    can't be started by mistake.
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+
+    Returns:
+        bool: True if any file was removed.
+    """
+    stale = []
+    for path in [
+        args.receiver_output_file,
+        args.pipelines_output_file,
+        os.path.join(
+            os.path.dirname(args.receiver_output_file), SHARD_COLLECTOR_CONFIG
+        ),
+    ]:
+        root, ext = os.path.splitext(path)
+        directory = os.path.dirname(path) or "."
+        pattern = re.compile(
+            re.escape(os.path.basename(root)) + r"-(\d+)" + re.escape(ext) + "$"
+        )
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            continue
+        for name in names:
+            match = pattern.match(name)
+            if match and (args.shards == 1 or int(match.group(1)) >= args.shards):
+                stale.append(os.path.join(directory, name))
+    if args.shards == 1 and os.path.exists(args.compose_shards_file):
+        stale.append(args.compose_shards_file)
+
+    changed = False
+    for path in sorted(stale):
+        if args.dry_run:
+            logging.info("Would remove stale shard output %s.", path)
+            continue
+        try:
+            os.remove(path)
+        except OSError as e:
+            logging.error("Error removing %s: %s", path, e)
+            continue
+        logging.info("Removed stale shard output %s.", path)
+        changed = True
+    return changed
+
+
+def resolve_profile_chain(profile, profiles):
+    """Return the names of the profiles to apply for a receiver's profile setting.
+
+    A receiver (or profile) can name one profile or a list of them; profiles can themselves
+    extend other profiles with their own profile setting. The chain is ordered most general
+    first, so later profiles take precedence.
+
+    Args:
+        profile (str or list): The profile setting.
+        profiles (dict): The bigip_receiver_profiles from the default config.
+
+    Returns:
+        tuple: The profile names, in the order they should be merged.
+
+    Raises:
+        ValueError: If a profile is unknown, extends itself or the setting is malformed.
+    """
+    chain = []
+
+    def visit(names, seen):
+        if isinstance(names, str):
+            names = [names]
+        if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+            raise ValueError(f"profile must be a name or list of names, got {names!r}")
+        for name in names:
+            if name in seen:
+                raise ValueError(f"profile '{name}' extends itself")
+            settings = profiles.get(name)
+            if not isinstance(settings, dict):
+                raise ValueError(
+                    f"unknown profile '{name}' (known: {', '.join(sorted(profiles)) or 'none'})"
+                )
+            if settings.get("profile") is not None:
+                visit(settings["profile"], seen | {name})
+            chain.append(name)
+
+    visit(profile, frozenset())
+    return tuple(chain)
+
+
+def merge_profile_chain(chain, defaults, profiles, cache):
+    """Return the defaults merged with each profile of chain, memoized in cache.
+
+    Every prefix of the chain is cached too, so chains sharing a base profile share its merge.
+    """
+    if chain not in cache:
+        if not chain:
+            cache[chain] = defaults
+        else:
+            base = merge_profile_chain(chain[:-1], defaults, profiles, cache)
+            settings = {
+                key: value
+                for key, value in profiles[chain[-1]].items()
+                if key != "profile" and key not in PIPELINE_FIELDS
+            }
+            cache[chain] = cow_merge(base, settings)
+    return cache[chain]
+
+
+def generate_receiver_configs(receiver_input_configs, default_config):
+    """Generate merged receiver configurations from input and defaults.
+
+    This function takes a dictionary of receiver input configurations and a default configuration,
+    and generates a merged configuration for each receiver. It ensures that any specific receiver
+    configurations override the default values while maintaining the overall structure defined by
+    the defaults.
+
+    Args:
+        receiver_input_configs (dict): A dictionary where keys are receiver identifiers and values
+                                       are their corresponding configurations.
+        default_config (dict): A dictionary containing default configuration values, particularly
+                               under the key 'bigip_receiver_defaults', and optionally named
+                               profiles under 'bigip_receiver_profiles'.
+
+    Returns:
+        dict or None: A dictionary containing the merged receiver configurations, where each key
+                      corresponds to a receiver identifier and each value is the resulting merged
+                      configuration, or None if a receiver refers to an unknown profile.
+
+    The following operations are performed for each receiver:
+    - The 'pipeline' and 'f5_pipeline' keys (see `generate_pipeline_configs`) are left out of the
+      merge, whether set on the receiver or in its profiles.
+    - If the receiver configuration contains a 'profile' key, the named profiles (see
+      `resolve_profile_chain`) are layered between the defaults and the receiver configuration.
+      Each distinct chain of profiles is merged with the defaults only once.
+    - The merged configuration is generated by copy-on-write merging the defaults with the specific
+      receiver configuration (see `cow_merge`), ensuring that specific values take precedence over
+      defaults. Default sub-trees the receiver does not override (e.g. `data_types`, `tls`) are
+      shared between receivers rather than copied, so the results must be treated as read-only.
+    """
+    defaults = default_config.get("bigip_receiver_defaults") or {}
+    profiles = default_config.get("bigip_receiver_profiles") or {}
+    chains = {}
+    bases = {}
+    errors = []
+    merged_config = {}
+    for k, v in receiver_input_configs.items():
+        profile = v.get("profile")
+        if profile is not None or not PIPELINE_FIELDS.isdisjoint(v):
+            v = {
+                key: value
+                for key, value in v.items()
+                if key != "profile" and key not in PIPELINE_FIELDS
+            }
+        base = defaults
+        if profile is not None:
+            chain_key = tuple(profile) if isinstance(profile, list) else profile
+            try:
+                if chain_key not in chains:
+                    chains[chain_key] = resolve_profile_chain(profile, profiles)
+            except (ValueError, TypeError) as e:
+                errors.append(f"{k}: {e}")
+                continue
+            base = merge_profile_chain(chains[chain_key], defaults, profiles, bases)
+        merged_config[k] = cow_merge(base, v)
+    if errors:
+        logging.error(
+            "%d receivers have invalid profiles:\n  %s",
+            len(errors),
+            "\n  ".join(errors),
+        )
+        return None
+    return merged_config
+
+
+def assemble_pipelines(
+    pipeline_key, default_pipeline, receiver_input_configs, pipelines, filename
+):
+    """
+    Assembles pipeline configurations by linking receivers to their respective pipelines.
+
+    This function iterates over the provided receiver input configurations and associates each receiver
+    with its corresponding pipeline. If a specified pipeline is not found in the defined pipelines,
+    an error is logged, and the function returns None.
+
+    Parameters:
+    - pipeline_key (str): The key used to retrieve the pipeline name from the receiver's configuration.
+    - default_pipeline (str): The default pipeline to use if none is specified in the receiver's config.
+    - receiver_input_configs (dict): A dictionary mapping receiver names to their configuration settings.
+    - pipelines (dict): A dictionary of available pipelines, where each pipeline is identified by its name.
+    - filename (str): The name of the configuration file being processed, used for logging errors.
+
+    Returns:
+    - None: If any specified pipeline is not found, the function logs an error and exits early.
+    """
+    for receiver, config in receiver_input_configs.items():
+        pipeline = config.get(pipeline_key, default_pipeline)
+        this_pipeline = pipelines.get(pipeline)
+        if not this_pipeline:
+            logging.error(
+                "Pipeline %s on Receiver %s is not found in config pipelines section of %s...",
+                pipeline,
+                receiver,
+                filename,
+            )
+            return None
+        if not this_pipeline.get("receivers"):
+            this_pipeline["receivers"] = []
+        this_pipeline["receivers"].append(receiver)
+
+
+def generate_pipeline_configs(receiver_input_configs, default_config, args):
+    """Generate pipeline configurations based on receiver inputs and default settings.
+
+    This function constructs pipeline configurations by associating receivers with their respective
+    pipelines based on the provided receiver input configurations and default settings. It validates
+    the existence of default pipelines and the pipelines specified in the default configuration.
+
+    Args:
+        receiver_input_configs (dict): A dictionary where keys are receiver identifiers and values
+                                       are their corresponding configurations.
+        default_config (dict): A dictionary containing default configuration values, particularly
+                               under the keys 'pipeline_default' and 'pipelines'.
+        args (argparse.Namespace): The parsed command-line arguments, used for logging context.
+
+    Returns:
+        dict or None: A dictionary containing the updated pipeline configurations, or None if
+                      there are errors (e.g., missing default pipelines or pipelines for receivers).
+
+    The function performs the following steps:
+    - Retrieves the default pipeline from the default configuration.
+    - Validates the existence of pipelines in the default configuration.
+    - Iterates over each receiver in the input configurations to determine its associated pipeline.
+    - If the specified pipeline does not exist, logs an error and returns None.
+    - Appends the receiver to the appropriate pipeline's receivers list, creating the list if it does not exist.
+    """
+    pipelines = default_config.get("pipelines")
+    if not pipelines:
+        logging.error(
+            "No pipelines set in default config file %s (top-level keys: %s).",
+            args.default_config_file,
+            ", ".join(sorted(default_config)) or "none",
+        )
+        return None
+
+    default_pipeline = default_config.get("pipeline_default")
+    if not default_pipeline:
+        logging.error(
+            "No default pipeline (pipeline_default) set in default config file %s.",
+            args.default_config_file,
+        )
+        return None
+
+    assemble_pipelines(
+        "pipeline",
+        default_pipeline,
+        receiver_input_configs,
+        pipelines,
+        args.receiver_input_file,
+    )
+
+    f5_pipeline_default = default_config.get("f5_pipeline_default")
+    enabled = default_config.get("f5_data_export", False)
+    f5_export_enabled = f5_pipeline_default and enabled
+    if not f5_export_enabled:
+        logging.warning(
+            "The f5_data_export=true and f5_pipeline_default fields are required to "
+            "export metrics periodically to F5. Contact your F5 Sales Rep to provision a "
+            "Sensor ID and Access Token.",
+        )
+    else:
+        assemble_pipelines(
+            "f5_pipeline",
+            f5_pipeline_default,
+            receiver_input_configs,
+            pipelines,
+            args.receiver_input_file,
+        )
+
+    final_pipelines = {}
+    for pipeline, settings in pipelines.items():
+        receivers = settings.get("receivers", [])
+        if len(receivers) == 0:
+            continue
+        final_pipelines[pipeline] = settings
+    return final_pipelines
+
+
+def schedule_hash(receiver, purpose):
+    """Return a stable pseudo-random fraction in [0, 1) for a receiver."""
+    return shard_rank(receiver, purpose) / 2**64
+
+
+def apply_scrape_schedule(
+    receiver_input_configs, receiver_output_configs, schedule, profiles=None
+):
+    """Spread receiver scrape schedules according to the scrape_schedule settings.
+
+    Only receivers whose bigip_receivers.yaml entry and profiles do not set the corresponding
+    value are changed. With spread_intervals, each such receiver gets one of the listed intervals as its
+    collection_interval, so schedules that start together drift apart. With stagger, each such
+    receiver gets an initial_delay within its collection_interval, so the fleet's scrapes are
+    spread across the interval instead of all firing at once. Both choices are derived from a
+    hash of the receiver name, so they are stable when devices are added or removed.
+
+    Args:
+        receiver_input_configs (dict): The per-receiver input configurations.
+        receiver_output_configs (dict): The merged receiver configurations, updated in place.
+        schedule (dict): The scrape_schedule settings.
+        profiles (dict, optional): The bigip_receiver_profiles from the default config.
+
+    Returns:
+        int: The number of receivers whose schedule was changed.
+    """
+    spread_intervals = schedule.get("spread_intervals") or []
+    stagger = schedule.get("stagger")
+    profiles = profiles or {}
+    chain_settings = {}
+    changed = 0
+    for name, config in receiver_output_configs.items():
+        overrides = receiver_input_configs.get(name) or {}
+        profile = overrides.get("profile")
+        if profile is not None:
+            chain_key = tuple(profile) if isinstance(profile, list) else profile
+            if chain_key not in chain_settings:
+                chain_settings[chain_key] = {
+                    key
+                    for chain_name in resolve_profile_chain(profile, profiles)
+                    for key in profiles[chain_name]
+                }
+            overrides = chain_settings[chain_key].union(overrides)
+        updated = False
+        if spread_intervals and "collection_interval" not in overrides:
+            idx = int(schedule_hash(name, "interval") * len(spread_intervals))
+            config["collection_interval"] = spread_intervals[idx]
+            updated = True
+        if stagger and "initial_delay" not in overrides:
+            try:
+                interval = parse_duration(config.get("collection_interval"))
+            except ValueError:
+                interval = None
+            if interval:
+                config["initial_delay"] = format_duration(
+                    math.floor(schedule_hash(name, "delay") * interval)
+                )
+                updated = True
+        changed += updated
+    return changed
+
+
+def find_timeout_conflicts(receiver_output_configs):
+    """Return the receivers whose timeout is greater than or equal to their collection_interval.
+
+    Receivers with unparseable durations are skipped here; they are reported by validation.
+    """
+    conflicts = []
+    for name, config in receiver_output_configs.items():
+        try:
+            interval = parse_duration(config.get("collection_interval"))
+            timeout = parse_duration(config.get("timeout"))
+        except ValueError:
+            continue
+        if timeout >= interval:
+            conflicts.append(name)
+    return sorted(conflicts)
+
+
+def model_scrape_concurrency(receiver_output_configs, expected_duration):
+    """Model the number of concurrent in-flight scrapes across the fleet, second by second.
+
+    Each receiver starts a scrape at its initial_delay and then every collection_interval, and
+    each scrape is assumed to take expected_duration (or the receiver's timeout, if shorter).
+    Receivers sharing a schedule are modelled together, so the cost depends on the number of
+    distinct schedules rather than the fleet size.
+
+    Args:
+        receiver_output_configs (dict): The merged receiver configurations.
+        expected_duration (float): The assumed duration of a single scrape, in seconds.
+
+    Returns:
+        dict: A report with the simulated window ("horizon_seconds"), "peak_concurrency",
+              "mean_concurrency" and "peak_starts_per_second".
+    """
+    schedules = {}
+    for config in receiver_output_configs.values():
+        try:
+            interval = max(1, round(parse_duration(config.get("collection_interval"))))
+        except ValueError:
+            continue
+        try:
+            delay = parse_duration(config.get("initial_delay", "1s"))
+        except ValueError:
+            delay = DEFAULT_INITIAL_DELAY
+        try:
+            duration = min(expected_duration, parse_duration(config.get("timeout")))
+        except ValueError:
+            duration = expected_duration
+        key = (interval, int(delay) % interval, max(1, math.ceil(duration)))
+        schedules[key] = schedules.get(key, 0) + 1
+
+    horizon = 1
+    for interval, _, _ in schedules:
+        horizon = min(
+            horizon * interval // math.gcd(horizon, interval), MAX_PLAN_HORIZON
+        )
+    in_flight = [0] * horizon
+    starts = [0] * horizon
+    for (interval, phase, duration), count in schedules.items():
+        for start in range(phase % horizon, horizon, interval):
+            starts[start] += count
+            for second in range(start, start + min(duration, interval)):
+                in_flight[second % horizon] += count
+    return {
+        "horizon_seconds": horizon,
+        "peak_concurrency": max(in_flight),
+        "mean_concurrency": sum(in_flight) / horizon,
+        "peak_starts_per_second": max(starts),
+    }
+
+
+def plan_scrape_schedule(
+    receiver_input_configs, receiver_output_configs, default_config
+):
+    """Plan, report and optionally spread the fleet's scrape schedule.
+
+    Applies the optional stagger / spread_intervals settings from the scrape_schedule section of
+    the default config, logs the modelled peak scrape concurrency and logs a single warning with
+    the number of receivers whose timeout is not less than their collection_interval (unless
+    warn_timeout_conflicts is false).
+
+    Args:
+        receiver_input_configs (dict): The per-receiver input configurations.
+        receiver_output_configs (dict): The merged receiver configurations, updated in place.
+        default_config (dict): The default configuration, optionally with a 'scrape_schedule' key.
+
+    Returns:
+        dict: The concurrency report from `model_scrape_concurrency`, plus the list of
+              "timeout_conflicts" and the number of "rescheduled" receivers.
+    """
+    schedule = {
+        **SCRAPE_SCHEDULE_DEFAULTS,
+        **(default_config.get("scrape_schedule") or {}),
+    }
+    rescheduled = apply_scrape_schedule(
+        receiver_input_configs,
+        receiver_output_configs,
+        schedule,
+        default_config.get("bigip_receiver_profiles"),
+    )
+    try:
+        expected_duration = parse_duration(schedule["expected_scrape_duration"])
+    except ValueError as e:
+        logging.warning("Ignoring scrape_schedule.expected_scrape_duration: %s", e)
+        expected_duration = parse_duration(
+            SCRAPE_SCHEDULE_DEFAULTS["expected_scrape_duration"]
+        )
+
+    report = model_scrape_concurrency(receiver_output_configs, expected_duration)
+    report["timeout_conflicts"] = find_timeout_conflicts(receiver_output_configs)
+    report["rescheduled"] = rescheduled
+    logging.info(
+        "Scrape plan: %d receivers, peak %d concurrent scrapes (mean %.1f), "
+        "peak %d scrape starts/second, %d receivers rescheduled.",
+        len(receiver_output_configs),
+        report["peak_concurrency"],
+        report["mean_concurrency"],
+        report["peak_starts_per_second"],
+        rescheduled,
+    )
+    if report["timeout_conflicts"] and schedule["warn_timeout_conflicts"]:
+        logging.warning(
+            "%d receivers have a timeout greater than or equal to their "
+            "collection_interval, so a slow scrape can overlap the next one (e.g. %s). Lower "
+            "their timeout, or set scrape_schedule.warn_timeout_conflicts to false.",
+            len(report["timeout_conflicts"]),
+            ", ".join(report["timeout_conflicts"][:MAX_LISTED_RECEIVERS]),
+        )
+    return report
+
+
+def compile_receiver_validator(default_config):
+    """Build a function that checks one merged receiver config against the receiver schema.
+
+    The set of known data_types (KNOWN_DATA_TYPES plus any in the defaults) and a
+    check per setting are prepared once. Results are memoized per distinct (setting, value), and
+    per distinct object for the tls and data_types sections and entries that `cow_merge` shares
+    between receivers, so validating a large fleet costs little more than one pass over its
+    settings.
+
+    Args:
+        default_config (dict): The default configuration.
+
+    Returns:
+        callable: validate(name, config) -> list of error messages for that receiver.
+    """
+    defaults = default_config.get("bigip_receiver_defaults") or {}
+    known_data_types = set(KNOWN_DATA_TYPES) | set(defaults.get("data_types") or {})
+
+    def check_duration(key, value):
+        try:
+            seconds = parse_duration(value)
+        except ValueError as e:
+            return [f"{key}: {e}"]
+        if key == "collection_interval" and seconds <= 0:
+            return ["collection_interval must be greater than 0"]
+        return []
+
+    def check_endpoint(key, value):
+        if isinstance(value, str) and value.startswith(("https://", "http://")):
+            return []
+        return [f"endpoint must be an http(s) URL, got {value!r}"]
+
+    def check_scalar(key, value):
+        if isinstance(value, (str, int)) and not isinstance(value, bool):
+            return []
+        return [f"{key} must be a string"]
+
+    def check_tls(key, tls):
+        if not isinstance(tls, dict):
+            return ["tls must be a mapping"]
+        errors = []
+        for setting, value in tls.items():
+            expected = TLS_FIELDS.get(setting)
+            if expected is None:
+                errors.append(f"unknown tls setting '{setting}'")
+            elif not isinstance(value, expected):
+                errors.append(f"tls.{setting} must be a {expected.__name__}")
+        return errors
+
+    def check_data_types(key, data_types):
+        if not isinstance(data_types, dict):
+            return ["data_types must be a mapping"]
+        if known_data_types.issuperset(data_types) and valid_entries.issuperset(
+            map(id, data_types.values())
+        ):
+            return []
+        errors = []
+        for data_type, settings in data_types.items():
+            if id(settings) in valid_entries and data_type in known_data_types:
+                continue
+            entry_errors = check_data_type(data_type, settings)
+            if entry_errors:
+                errors.extend(entry_errors)
+            else:
+                valid_entries.add(id(settings))
+                alive.append(settings)
+        return errors
+
+    def check_data_type(data_type, settings):
+        if data_type not in known_data_types:
+            return [
+                f"unknown data type '{data_type}' "
+                f"(known: {', '.join(sorted(known_data_types))})"
+            ]
+        if not isinstance(settings, dict) or set(settings) - {"enabled"}:
+            return [f"data_types.{data_type} must be {{enabled: true/false}}"]
+        if not isinstance(settings.get("enabled", False), bool):
+            return [f"data_types.{data_type}.enabled must be true or false"]
+        return []
+
+    def check_patterns(key, patterns):
+        if not isinstance(patterns, list) or not all(
+            isinstance(p, str) for p in patterns
+        ):
+            return [f"{key} must be a list of regular expressions"]
+        errors = []
+        for pattern in patterns:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                errors.append(f"{key}: invalid regular expression {pattern!r}: {e}")
+        return errors
+
+    def check_metric_filters(key, filters):
+        if not isinstance(filters, dict):
+            return ["metric_filters must be a mapping"]
+        errors = []
+        for setting, value in filters.items():
+            expected = METRIC_FILTER_FIELDS.get(setting)
+            if expected is None:
+                errors.append(f"unknown metric_filters setting '{setting}'")
+            elif expected is list:
+                errors.extend(check_patterns(f"metric_filters.{setting}", value))
+            elif not isinstance(value, dict):
+                errors.append(f"metric_filters.{setting} must be a mapping")
+            else:
+                for attribute, patterns in value.items():
+                    errors.extend(
+                        check_patterns(
+                            f"metric_filters.{setting}.{attribute}", patterns
+                        )
+                    )
+        return errors
+
+    def check_unknown(key, value):
+        return [f"unknown setting '{key}'"]
+
+    kinds = {
+        "duration": check_duration,
+        "endpoint": check_endpoint,
+        "scalar": check_scalar,
+        "tls": check_tls,
+        "data_types": check_data_types,
+        "metric_filters": check_metric_filters,
+    }
+    checks = {key: kinds.get(kind) for key, kind in RECEIVER_FIELDS.items()}
+    # Memoized results; dicts and lists are keyed by id and kept alive alongside their
+    # result so the id can't be reused by another object while memoized.
+    memo = {}
+    valid_entries = set()
+    alive = []
+
+    def check(key, value, memo_key):
+        func = checks.get(key, check_unknown)
+        result = memo[memo_key] = (value, func(key, value) if func else [])
+        return result
+
+    def check_limits(interval, timeout):
+        memo_key = ("timeout/collection_interval", interval, timeout)
+        result = memo.get(memo_key)
+        if result is None:
+            result = (None, [])
+            try:
+                if parse_duration(timeout) > parse_duration(interval) > 0:
+                    result = (
+                        None,
+                        [
+                            f"timeout ({timeout}) is greater than collection_interval "
+                            f"({interval})"
+                        ],
+                    )
+            except ValueError:
+                pass  # Reported by the duration checks.
+            memo[memo_key] = result
+        return result[1]
+
+    def validate(name, config):
+        errors = []
+        if not isinstance(name, str) or not RECEIVER_NAME_RE.match(name):
+            errors.append("receiver name must be 'bigip/<name>'")
+        if not isinstance(config, dict):
+            return errors + ["receiver config must be a mapping"]
+        if "endpoint" not in config:
+            errors.append("missing endpoint")
+        for key, value in config.items():
+            if key == "endpoint":
+                # Endpoints are unique, so checking them directly beats memoizing.
+                errors.extend(check_endpoint(key, value))
+                continue
+            if value.__class__ is dict or value.__class__ is list:
+                memo_key = (key, id(value))
+            else:
+                memo_key = (key, value.__class__, value)
+            result = memo.get(memo_key) or check(key, value, memo_key)
+            if result[1]:
+                errors.extend(result[1])
+        interval = config.get("collection_interval")
+        timeout = config.get("timeout")
+        if isinstance(interval, str) and isinstance(timeout, str):
+            errors.extend(check_limits(interval, timeout))
+        return errors
+
+    return validate
+
+
+def validate_receiver_configs(receiver_output_configs, default_config):
+    """Check every merged receiver config and return all of the errors found.
+
+    Catches mistakes (bad durations, missing endpoints, non bigip/ receiver names, misspelled
+    data types or settings, malformed metric filters, a timeout longer than the collection_interval)
+    that would otherwise only be reported by the collector failing at startup.
+
+    Args:
+        receiver_output_configs (dict): The merged receiver configurations.
+        default_config (dict): The default configuration.
+
+    Returns:
+        list: "<receiver>: <problem>" messages, empty if every receiver is valid.
+    """
+    validate = compile_receiver_validator(default_config)
+    errors = []
+    for name, config in receiver_output_configs.items():
+        errors.extend(f"{name}: {error}" for error in validate(name, config))
+    return errors
+
+
+def is_batch_processor(name):
+    """Return whether a processor id refers to a batch processor (e.g. "batch/local")."""
+    return name == "batch" or name.startswith("batch/")
+
+
+def partition_count(pipeline, receiver_count, partitioning):
+    """Return the number of partitions to split a pipeline into.
+
+    An explicit count in partitioning["partitions"] wins; otherwise pipelines with more than
+    max_receivers_per_pipeline receivers are split into just enough partitions.
+    """
+    explicit = partitioning["partitions"].get(pipeline)
+    if explicit:
+        return min(explicit, receiver_count)
+    max_receivers = partitioning["max_receivers_per_pipeline"]
+    if max_receivers <= 0:
+        return 1
+    return math.ceil(receiver_count / max_receivers)
+
+
+def partition_pipelines(pipeline_output_configs, receiver_output_configs, partitioning):
+    """Split high receiver count pipelines into evenly loaded partitions.
+
+    A pipeline split into K partitions is replaced by pipelines "<name>/0" to "<name>/<K-1>",
+    each with the original exporters and processors, except that every batch processor is
+    replaced by a per-partition clone (e.g. "batch/local/0"), so one batching stage no longer
+    serializes the whole fleet. The clones are defined in the collector overlay file (see
+    `build_collector_overlay`). Receivers are assigned heaviest first to the least loaded
+    partition, by `estimate_scrape_cost`.
+
+    Args:
+        pipeline_output_configs (dict): The generated pipeline configurations.
+        receiver_output_configs (dict): The merged receiver configurations.
+        partitioning (dict): The pipeline_partitioning settings, or None.
+
+    Returns:
+        dict: The pipeline configurations, with partitioned pipelines replaced.
+
+    Raises:
+        ValueError: If the partitioning settings are malformed.
+    """
+    if not isinstance(partitioning or {}, dict):
+        raise ValueError(f"expected a mapping, not {partitioning!r}")
+    partitioning = {**PIPELINE_PARTITIONING_DEFAULTS, **(partitioning or {})}
+    partitions = partitioning["partitions"] or {}
+    max_receivers = partitioning["max_receivers_per_pipeline"] or 0
+    if not isinstance(partitions, dict):
+        raise ValueError(
+            f"partitions must map pipeline names to partition counts, not {partitions!r}"
+        )
+    for pipeline, count in partitions.items():
+        if isinstance(count, bool) or not isinstance(count, int) or count < 1:
+            raise ValueError(
+                f"partitions of {pipeline} must be a positive integer, not {count!r}"
+            )
+    if isinstance(max_receivers, bool) or not isinstance(max_receivers, int):
+        raise ValueError(
+            f"max_receivers_per_pipeline must be an integer, not {max_receivers!r}"
+        )
+    partitioning = {
+        "partitions": partitions,
+        "max_receivers_per_pipeline": max_receivers,
+    }
+    result = {}
+    for pipeline, settings in pipeline_output_configs.items():
+        receivers = settings.get("receivers", [])
+        count = partition_count(pipeline, len(receivers), partitioning)
+        if count <= 1:
+            result[pipeline] = settings
+            continue
+
+        costs = {
+            name: estimate_scrape_cost(receiver_output_configs.get(name, {}))
+            for name in receivers
+        }
+        assignments = {}
+        heap = [(0.0, 0, idx) for idx in range(count)]
+        for name in sorted(receivers, key=lambda name: (-costs[name], name)):
+            load, size, idx = heapq.heappop(heap)
+            assignments[name] = idx
+            heapq.heappush(heap, (load + costs[name], size + 1, idx))
+
+        for idx in range(count):
+            result[f"{pipeline}/{idx}"] = {
+                **settings,
+                "processors": [
+                    f"{name}/{idx}" if is_batch_processor(name) else name
+                    for name in settings.get("processors", [])
+                ],
+                "receivers": [name for name in receivers if assignments[name] == idx],
+            }
+        logging.info(
+            "Split pipeline %s into %d partitions of about %d receivers.",
+            pipeline,
+            count,
+            math.ceil(len(receivers) / count),
+        )
+    return result
+
+
+def ottl_string(value):
+    """Quote a value as an OTTL string literal."""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def ottl_match(target, patterns):
+    """Return an OTTL condition matching target against any of the (whole-value) patterns."""
+    return f"IsMatch({target}, {ottl_string('^(?:' + '|'.join(patterns) + ')$')})"
+
+
+def metric_filter_conditions(filters):
+    """Translate a receiver's metric_filters into filter processor drop conditions.
+
+    Metrics not matching include_metrics or matching exclude_metrics are dropped whole. Data
+    points whose attribute matches exclude_attributes, or is set but doesn't match
+    include_attributes, are dropped individually.
+
+    Args:
+        filters (dict): The metric_filters setting.
+
+    Returns:
+        dict: The "metric" and "datapoint" OTTL conditions, without empty lists.
+    """
+    conditions = {"metric": [], "datapoint": []}
+    if filters.get("include_metrics"):
+        conditions["metric"].append(
+            f"not {ottl_match('name', filters['include_metrics'])}"
+        )
+    if filters.get("exclude_metrics"):
+        conditions["metric"].append(ottl_match("name", filters["exclude_metrics"]))
+    for attribute, patterns in sorted(
+        (filters.get("include_attributes") or {}).items()
+    ):
+        if patterns:
+            target = f"attributes[{ottl_string(attribute)}]"
+            conditions["datapoint"].append(
+                f"{target} != nil and not {ottl_match(target, patterns)}"
+            )
+    for attribute, patterns in sorted(
+        (filters.get("exclude_attributes") or {}).items()
+    ):
+        if patterns:
+            target = f"attributes[{ottl_string(attribute)}]"
+            conditions["datapoint"].append(ottl_match(target, patterns))
+    return {kind: items for kind, items in conditions.items() if items}
+
+
+def metric_filter_processors(receiver_output_configs):
+    """Return the filter processor for each receiver with metric_filters.
+
+    Receivers with the same filters share a processor, named after a hash of its conditions
+    (e.g. "filter/metrics-1a2b3c4d"). Filters are usually set in the defaults or a profile and so
+    shared between receivers by `cow_merge`; each distinct object is translated only once.
+
+    Args:
+        receiver_output_configs (dict): The merged receiver configurations.
+
+    Returns:
+        tuple: A tuple containing:
+            - assignments (dict): The filter processor name per filtered receiver.
+            - processors (dict): The filter processor configs, by name.
+    """
+    assignments = {}
+    processors = {}
+    translated = {}
+    for name, config in receiver_output_configs.items():
+        filters = config.get("metric_filters")
+        if not isinstance(filters, dict) or not filters:
+            continue
+        if id(filters) not in translated:
+            conditions = metric_filter_conditions(filters)
+            processor = None
+            if conditions:
+                digest = hashlib.sha256(
+                    json.dumps(conditions, sort_keys=True).encode("utf-8")
+                ).hexdigest()[:8]
+                processor = f"filter/metrics-{digest}"
+                processors[processor] = {"error_mode": "ignore", "metrics": conditions}
+            translated[id(filters)] = (filters, processor)
+        processor = translated[id(filters)][1]
+        if processor:
+            assignments[name] = processor
+    return assignments, processors
+
+
+def split_filtered_pipelines(pipeline_output_configs, receiver_output_configs):
+    """Move receivers with metric_filters into pipelines that apply their filters.
+
+    Filter processors apply to a whole pipeline, so the receivers of each pipeline are grouped by
+    their filter processor (see `metric_filter_processors`), and each group gets its own copy of
+    the pipeline, "<name>/<filter>" (e.g. "metrics/local/metrics-1a2b3c4d"), with the filter
+    processor ahead of the pipeline's own processors. Unwanted series are then dropped in the
+    collector before they are batched and exported. The filter processors are defined in the
+    collector overlay file (see `build_collector_overlay`).
+
+    Args:
+        pipeline_output_configs (dict): The generated pipeline configurations.
+        receiver_output_configs (dict): The merged receiver configurations.
+
+    Returns:
+        dict: The pipeline configurations, without pipelines left with no receivers.
+    """
+    assignments, _ = metric_filter_processors(receiver_output_configs)
+    if not assignments:
+        return pipeline_output_configs
+    result = {}
+    for pipeline, settings in pipeline_output_configs.items():
+        groups = {}
+        for name in settings.get("receivers", []):
+            groups.setdefault(assignments.get(name), []).append(name)
+        if None in groups:
+            result[pipeline] = {**settings, "receivers": groups.pop(None)}
+        for processor in sorted(groups):
+            result[f"{pipeline}/{processor.partition('/')[2]}"] = {
+                **settings,
+                "processors": [processor] + list(settings.get("processors", [])),
+                "receivers": groups[processor],
+            }
+    logging.info(
+        "Applying metric filters to %d receivers.",
+        len(assignments),
+    )
+    return result
+
+
+def estimate_receiver_series(receiver_config, estimates=None):
+    """Estimate the number of series a merged receiver config exports per scrape.
+
+    The per-module estimates default to DATA_TYPE_SERIES_ESTIMATES (see also
+    `calibrate_series_estimates`).
+    """
+    estimates = estimates or DATA_TYPE_SERIES_ESTIMATES
+    return estimates["base"] + sum(
+        estimates.get(name, DEFAULT_DATA_TYPE_SERIES)
+        for name in enabled_data_types(receiver_config)
+    )
+
+
+def receiver_interval_seconds(receiver_config):
+    """Return a merged receiver's collection_interval in seconds (60 if unparseable)."""
+    try:
+        return max(parse_duration(receiver_config.get("collection_interval")), 1.0)
+    except ValueError:
+        return 60.0
+
+
+def tune_fleet_components(
+    pipeline_output_configs, receiver_output_configs, tuning, collectors=1
+):
+    """Size the batch processors and exporter queues for the expected fleet load.
+
+    For every pipeline that exports through one of the tuned exporters, the expected data point
+    rate is estimated from its receivers' enabled data_types and collection intervals (see
+    `estimate_receiver_series`). Each of the pipeline's batch processors gets a send_batch_size
+    that flushes about once per batch_flush_interval at that rate, send_batch_max_size of twice
+    that, and a timeout matching the expected fill time. Each tuned exporter gets the configured
+    compression and a sending queue able to hold two full scrape rounds of batches, with
+    consumers scaled to the data point rate. Values never go below the library defaults.
+
+    Args:
+        pipeline_output_configs (dict): The generated pipeline configurations.
+        receiver_output_configs (dict): The merged receiver configurations.
+        tuning (dict): The fleet_tuning settings.
+        collectors (int): The number of collector instances sharing the fleet (see --shards).
+
+    Returns:
+        tuple: A tuple containing:
+            - processors (dict): Tuned settings per batch processor id.
+            - exporters (dict): Tuned settings per exporter id.
+    """
+    tuned_exporters = set(tuning.get("exporters") or [])
+    try:
+        flush = parse_duration(tuning.get("batch_flush_interval"))
+    except ValueError:
+        flush = 1.0
+    processors = {}
+    exporter_load = {}
+    for settings in pipeline_output_configs.values():
+        exporters = tuned_exporters.intersection(settings.get("exporters", []))
+        if not exporters:
+            continue
+        receivers = [
+            receiver_output_configs[name]
+            for name in settings.get("receivers", [])
+            if name in receiver_output_configs
+        ]
+        scrape_points = sum(estimate_receiver_series(r) for r in receivers) / collectors
+        rate = (
+            sum(
+                estimate_receiver_series(r) / receiver_interval_seconds(r)
+                for r in receivers
+            )
+            / collectors
+        )
+        batch_size = MIN_SEND_BATCH_SIZE
+        while batch_size < rate * flush and batch_size < MAX_SEND_BATCH_SIZE:
+            batch_size *= 2
+        for name in settings.get("processors", []):
+            if is_batch_processor(name):
+                processors[name] = {
+                    "send_batch_size": batch_size,
+                    "send_batch_max_size": 2 * batch_size,
+                    "timeout": format_duration(
+                        min(max(round(batch_size / max(rate, 1.0), 1), 0.2), 5.0)
+                    ),
+                }
+        for name in exporters:
+            load = exporter_load.setdefault(name, {"rate": 0.0, "batches": 0})
+            load["rate"] += rate
+            load["batches"] += math.ceil(scrape_points / batch_size)
+
+    exporters = {}
+    for name, load in exporter_load.items():
+        exporters[name] = {
+            "compression": tuning.get("compression", "gzip"),
+            "sending_queue": {
+                "enabled": True,
+                "num_consumers": min(
+                    max(
+                        math.ceil(load["rate"] / POINTS_PER_QUEUE_CONSUMER),
+                        MIN_QUEUE_CONSUMERS,
+                    ),
+                    MAX_QUEUE_CONSUMERS,
+                ),
+                "queue_size": max(MIN_QUEUE_SIZE, 2 * load["batches"]),
+            },
+        }
+        logging.info(
+            "Tuned %s for an estimated %.0f data points/s per collector.",
+            name,
+            load["rate"],
+        )
+    return processors, exporters
+
+
+def build_collector_overlay(
+    pipeline_output_configs,
+    collector_template,
+    receiver_output_configs=None,
+    tuning=None,
+    collectors=1,
+):
+    """Build the collector config overlay merged on top of the collector config template.
+
+    Defines the per-partition batch processor clones referenced by partitioned pipelines
+    (see `partition_pipelines`), each with the settings of the template processor it was
+    cloned from, and the metric filter processors of filtered pipelines (see
+    `split_filtered_pipelines`). If fleet tuning is enabled, also adds the batch processor and
+    exporter settings sized for the fleet (see `tune_fleet_components`).
+
+    Args:
+        pipeline_output_configs (dict): The generated pipeline configurations.
+        collector_template (dict): The parsed collector config template
+                                   (bigip-scraper-config.yaml).
+        receiver_output_configs (dict, optional): The merged receiver configurations.
+        tuning (dict, optional): The fleet_tuning settings of the default config.
+        collectors (int): The number of collector instances sharing the fleet.
+
+    Returns:
+        dict: The overlay config, empty if nothing needs to be added to the template.
+    """
+    template_processors = collector_template.get("processors") or {}
+    filter_processors = {}
+    if receiver_output_configs is not None:
+        _, filter_processors = metric_filter_processors(receiver_output_configs)
+    processors = {}
+    for pipeline, settings in pipeline_output_configs.items():
+        for name in settings.get("processors", []):
+            if name in template_processors or name in processors:
+                continue
+            base, _, suffix = name.rpartition("/")
+            if name in filter_processors:
+                processors[name] = filter_processors[name]
+            elif suffix.isdigit() and base in template_processors:
+                processors[name] = template_processors[base]
+            else:
+                logging.warning(
+                    "Processor %s used by pipeline %s is not defined in the collector config.",
+                    name,
+                    pipeline,
+                )
+    tuning = {**FLEET_TUNING_DEFAULTS, **(tuning or {})}
+    exporters = {}
+    if tuning["enabled"] and receiver_output_configs is not None:
+        tuned_processors, exporters = tune_fleet_components(
+            pipeline_output_configs, receiver_output_configs, tuning, collectors
+        )
+        for name, settings in tuned_processors.items():
+            base = processors.get(name, template_processors.get(name)) or {}
+            processors[name] = {**base, **settings}
+
+    overlay = {}
+    if processors:
+        overlay["processors"] = processors
+    if exporters:
+        overlay["exporters"] = exporters
+    return overlay
+
+
+def data_type_metric_prefix(data_type):
+    """Return the Prometheus metric name prefix of a data_type (e.g. "f5_policy_asm_")."""
+    return data_type.replace(".", "_") + "_"
+
+
+def calibrate_series_estimates(tsdb_status, receiver_output_configs, devices=None):
+    """Calibrate the per-device series estimates from a TSDB status snapshot of the current fleet.
+
+    The series of each f5_* metric in the snapshot are attributed to the data_type whose prefix
+    the metric carries (e.g. f5_policy_asm_* to f5.policy.asm), or else to the always-on modules.
+    Each total is divided by the number of snapshot devices assumed to export it: all of them for
+    the always-on modules, and for a data_type the same share of them that enables it in the
+    receiver configs. Modules missing from the snapshot keep their default estimate.
+
+    Args:
+        tsdb_status (dict): The snapshot, as returned by `load_tsdb_status`.
+        receiver_output_configs (dict): The merged receiver configurations.
+        devices (int, optional): The number of devices in the snapshot (default: the number of
+                                 DEVICE_COUNT_METRIC series in it).
+
+    Returns:
+        dict: Series per device for "base" and each data_type, as in DATA_TYPE_SERIES_ESTIMATES.
+    """
+    estimates = dict(DATA_TYPE_SERIES_ESTIMATES)
+    devices = devices or (tsdb_status.get("series") or {}).get(DEVICE_COUNT_METRIC)
+    if not devices:
+        logging.warning(
+            "No %s series in the TSDB status snapshot to count its devices, not calibrating "
+            "(set --snapshot-devices).",
+            DEVICE_COUNT_METRIC,
+        )
+        return estimates
+    enabled = collections.Counter()
+    for config in receiver_output_configs.values():
+        enabled.update(enabled_data_types(config))
+    prefixes = sorted(
+        (
+            (data_type_metric_prefix(name), name)
+            for name in set(DATA_TYPE_SERIES_ESTIMATES) | set(enabled)
+            if name != "base"
+        ),
+        key=lambda item: -len(item[0]),
+    )
+    totals = collections.Counter()
+    for metric, count in (tsdb_status.get("series") or {}).items():
+        if not metric.startswith("f5_"):
+            continue
+        module = next(
+            (name for prefix, name in prefixes if metric.startswith(prefix)), "base"
+        )
+        totals[module] += count
+
+    for module, total in totals.items():
+        if module == "base":
+            exporting = devices
+        else:
+            exporting = round(
+                devices * enabled[module] / max(len(receiver_output_configs), 1)
+            )
+        if exporting > 0:
+            estimates[module] = max(round(total / exporting), 1)
+    logging.info(
+        "Calibrated series estimates from %d devices: %s",
+        devices,
+        ", ".join(f"{name}={value}" for name, value in sorted(estimates.items())),
+    )
+    return estimates
+
+
+def format_bytes(count):
+    """Format a byte count for display, e.g. 1536 -> "1.5 KiB"."""
+    for unit in ["B", "KiB", "MiB", "GiB", "TiB"]:
+        if count < 1024 or unit == "TiB":
+            return f"{count:.1f} {unit}" if unit != "B" else f"{count:.0f} B"
+        count /= 1024
+
+
+def plan_capacity(receiver_output_configs, planning, collectors=1, estimates=None):
+    """Estimate the Prometheus and collector resources needed for the fleet.
+
+    Active series and samples per second follow from each receiver's enabled data_types (see
+    `estimate_receiver_series`) and collection_interval. Disk, Prometheus memory and collector
+    memory are derived with the BYTES_PER_SAMPLE, PROMETHEUS_BYTES_PER_SERIES and
+    COLLECTOR_BYTES_PER_DATA_POINT rules of thumb, and compared with the limits of the
+    capacity_planning settings to recommend sharding the collector (when one collector can't keep
+    up) or downsampling (when the retention doesn't fit on disk).
+
+    Args:
+        receiver_output_configs (dict): The merged receiver configurations.
+        planning (dict): The capacity_planning settings of the default config, or None.
+        collectors (int): The number of collector instances sharing the fleet.
+        estimates (dict, optional): Series per device and data_type, as in
+                                    DATA_TYPE_SERIES_ESTIMATES.
+
+    Returns:
+        dict: The estimates, with "warnings" and the recommended number of "shards" (collectors).
+    """
+    planning = {**CAPACITY_PLANNING_DEFAULTS, **(planning or {})}
+    retention = parse_promql_duration(str(planning["retention"]))
+    series = 0
+    samples_per_second = 0.0
+    for config in receiver_output_configs.values():
+        count = estimate_receiver_series(config, estimates)
+        series += count
+        samples_per_second += count / receiver_interval_seconds(config)
+
+    collectors = max(collectors, 1)
+    collector_rate = samples_per_second / collectors
+    collector_memory = (
+        COLLECTOR_BASE_BYTES + 2 * COLLECTOR_BYTES_PER_DATA_POINT * series / collectors
+    )
+    report = {
+        "devices": len(receiver_output_configs),
+        "active_series": series,
+        "samples_per_second": samples_per_second,
+        "disk_bytes": samples_per_second * retention * BYTES_PER_SAMPLE,
+        "prometheus_memory_bytes": series * PROMETHEUS_BYTES_PER_SERIES,
+        "collectors": collectors,
+        "collector_samples_per_second": collector_rate,
+        "collector_memory_bytes": collector_memory,
+        "warnings": [],
+    }
+
+    shards = collectors * max(
+        collector_rate / planning["collector_samples_per_second"],
+        (collector_memory - COLLECTOR_BASE_BYTES)
+        / max(planning["collector_memory_gib"] * 2**30 - COLLECTOR_BASE_BYTES, 1),
+        1.0,
+    )
+    report["shards"] = math.ceil(shards)
+    if report["shards"] > collectors:
+        report["warnings"].append(
+            f"{collectors} collector(s) can't keep up with {samples_per_second:.0f} "
+            f"samples/s: shard the fleet with --shards {report['shards']}"
+        )
+    disk_limit = planning["disk_gib"] * 2**30
+    if report["disk_bytes"] > disk_limit:
+        fits = disk_limit / max(samples_per_second * BYTES_PER_SAMPLE, 1e-9)
+        report["warnings"].append(
+            f"{format_bytes(report['disk_bytes'])} of samples over {planning['retention']} "
+            f"exceeds the {planning['disk_gib']} GiB disk (which holds about "
+            f"{fits / 86400:.0f} days): downsample older data or shorten the retention"
+        )
+    if report["prometheus_memory_bytes"] > planning["prometheus_memory_gib"] * 2**30:
+        report["warnings"].append(
+            f"{series} active series need about "
+            f"{format_bytes(report['prometheus_memory_bytes'])} of Prometheus memory, over "
+            f"{planning['prometheus_memory_gib']} GiB: drop unused series with metric_filters "
+            f"or split Prometheus"
+        )
+    return report
+
+
+def run_capacity_plan(args):
+    """Plan capacity for the receivers generate_configs would produce and log the report.
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+
+    Returns:
+        dict or None: The report (see `plan_capacity`), or None if the inputs can't be loaded.
+    """
+    default_config = load_default_config(args)
+    receiver_input_configs = load_receiver_config(args)
+    if default_config is None or receiver_input_configs is None:
+        return None
+    receiver_output_configs = generate_receiver_configs(
+        receiver_input_configs, default_config
+    )
+    if receiver_output_configs is None:
+        return None
+    estimates = None
+    if args.tsdb_status:
+        tsdb_status = load_tsdb_status(args.tsdb_status)
+        if tsdb_status is None:
+            return None
+        estimates = calibrate_series_estimates(
+            tsdb_status, receiver_output_configs, args.snapshot_devices
+        )
+    try:
+        report = plan_capacity(
+            receiver_output_configs,
+            default_config.get("capacity_planning"),
+            args.shards,
+            estimates,
+        )
+    except (ValueError, TypeError) as e:
+        logging.error("Invalid capacity_planning setting: %s", e)
+        return None
+    logging.info(
+        "Capacity plan for %d devices:\n"
+        "  Active series: %d\n"
+        "  Samples per second: %.0f\n"
+        "  Prometheus disk for %s retention: %s\n"
+        "  Prometheus memory: %s\n"
+        "  Per collector (of %d): %.0f samples/s, %s memory",
+        report["devices"],
+        report["active_series"],
+        report["samples_per_second"],
+        (default_config.get("capacity_planning") or {}).get(
+            "retention", CAPACITY_PLANNING_DEFAULTS["retention"]
+        ),
+        format_bytes(report["disk_bytes"]),
+        format_bytes(report["prometheus_memory_bytes"]),
+        report["collectors"],
+        report["collector_samples_per_second"],
+        format_bytes(report["collector_memory_bytes"]),
+    )
+    for warning in report["warnings"]:
+        logging.warning(warning)
+    if not report["warnings"]:
+        logging.info("The deployment fits within the capacity_planning limits.")
+    return report
+
+
+def receiver_address(endpoint):
+    """Split a receiver endpoint into its scheme, host and port.
+
+    Raises:
+        ValueError: If the endpoint is not an http(s) URL.
+    """
+    parts = urlsplit(endpoint or "")
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"endpoint must be an http(s) URL, got {endpoint!r}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return parts.scheme, parts.hostname, port
+
+
+def resolve_env_refs(value):
+    """Expand the collector's ${env:NAME} (or ${NAME}) references in a setting.
+
+    Raises:
+        ValueError: If a referenced environment variable is not set.
+    """
+
+    def expand(match):
+        name = match.group(1)
+        if name not in os.environ:
+            raise ValueError(f"environment variable {name} is not set")
+        return os.environ[name]
+
+    return ENV_REF_RE.sub(expand, value or "")
+
+
+def receiver_ssl_context(receiver_config):
+    """Build the TLS context the collector would use for a receiver's tls settings."""
+    tls = receiver_config.get("tls") or {}
+    context = ssl.create_default_context(cafile=tls.get("ca_file") or None)
+    if tls.get("insecure_skip_verify"):
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+async def http_request(reader, writer, host, method, path, headers=None, body=None):
+    """Send an HTTP/1.1 request on an open connection and read the response.
+
+    Args:
+        reader (asyncio.StreamReader): The connection's reader.
+        writer (asyncio.StreamWriter): The connection's writer.
+        host (str): The Host header.
+        method (str): The HTTP method.
+        path (str): The request path.
+        headers (dict, optional): Additional request headers.
+        body (bytes, optional): The request body.
+
+    Returns:
+        tuple: The response status code and body.
+
+    Raises:
+        ValueError: If the response is not valid HTTP, or its body has no length (the
+            connection is kept open, so a body ending when it closes would never end).
+        asyncio.IncompleteReadError: If the connection closes mid-response.
+    """
+    lines = [f"{method} {path} HTTP/1.1", f"Host: {host}", "Accept: application/json"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    lines.append(f"Content-Length: {len(body or b'')}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + (body or b""))
+    await writer.drain()
+
+    status_line, *header_lines = (
+        (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    )
+    try:
+        status = int(status_line.split(" ", 2)[1])
+    except (IndexError, ValueError):
+        raise ValueError(f"invalid HTTP response {status_line!r}")
+    response_headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+    if response_headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            chunk = await reader.readexactly(size + 2)
+            if not size:
+                return status, b"".join(chunks)
+            chunks.append(chunk[:-2])
+    if "content-length" in response_headers:
+        return status, await reader.readexactly(int(response_headers["content-length"]))
+    if status in (204, 304):
+        return status, b""
+    raise ValueError(f"HTTP {status} response has no Content-Length")
+
+
+async def probe_receiver(name, receiver_config, settings):
+    """Check that the collector will be able to scrape a receiver, and how fast it responds.
+
+    The probe opens a TCP connection, performs the TLS handshake with the receiver's tls
+    settings, logs in to iControl REST with the receiver's credentials and then times
+    settings["requests"] authenticated requests. Each step is bounded by the receiver's own
+    timeout (the TCP connection by the connect_timeout setting). An unusable endpoint or timeout
+    setting fails the "config" stage before anything is sent.
+
+    Args:
+        name (str): The receiver name.
+        receiver_config (dict): The merged receiver configuration.
+        settings (dict): The preflight settings (see PREFLIGHT_DEFAULTS).
+
+    Returns:
+        dict: The "receiver" name, the failed "stage" (config, tcp, tls, auth or request) and
+              "error" (both None on success), and the "connect", "tls" and "login" times and
+              the scrape request "latencies" in seconds.
+    """
+    result = {
+        "receiver": name,
+        "stage": None,
+        "error": None,
+        "connect": None,
+        "tls": None,
+        "login": None,
+        "latencies": [],
+    }
+    writer = None
+    stage = "config"
+    try:
+        scheme, host, port = receiver_address(receiver_config.get("endpoint"))
+        timeout = parse_duration(receiver_config.get("timeout", "60s"))
+        stage = "tcp"
+        started = time.perf_counter()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port),
+            parse_duration(settings["connect_timeout"]),
+        )
+        result["connect"] = time.perf_counter() - started
+
+        if scheme == "https":
+            stage = "tls"
+            context = receiver_ssl_context(receiver_config)
+            started = time.perf_counter()
+            await asyncio.wait_for(
+                writer.start_tls(context, server_hostname=host), timeout
+            )
+            result["tls"] = time.perf_counter() - started
+
+        stage = "auth"
+        login = json.dumps(
+            {
+                "username": resolve_env_refs(receiver_config.get("username")),
+                "password": resolve_env_refs(receiver_config.get("password")),
+                "loginProviderName": "tmos",
+            }
+        ).encode()
+        started = time.perf_counter()
+        status, body = await asyncio.wait_for(
+            http_request(
+                reader,
+                writer,
+                host,
+                "POST",
+                PREFLIGHT_LOGIN_PATH,
+                {"Content-Type": "application/json"},
+                login,
+            ),
+            timeout,
+        )
+        if status != 200:
+            raise ValueError(f"login returned HTTP {status}")
+        try:
+            token = json.loads(body)["token"]["token"]
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("login response has no token")
+        result["login"] = time.perf_counter() - started
+
+        stage = "request"
+        auth = {"X-F5-Auth-Token": token}
+        for _ in range(settings["requests"]):
+            started = time.perf_counter()
+            status, _ = await asyncio.wait_for(
+                http_request(reader, writer, host, "GET", PREFLIGHT_REQUEST_PATH, auth),
+                timeout,
+            )
+            if status != 200:
+                raise ValueError(f"{PREFLIGHT_REQUEST_PATH} returned HTTP {status}")
+            result["latencies"].append(time.perf_counter() - started)
+        # Don't leave the session behind on the device's token table.
+        await asyncio.wait_for(
+            http_request(
+                reader, writer, host, "DELETE", f"{PREFLIGHT_TOKEN_PATH}/{token}", auth
+            ),
+            timeout,
+        )
+    except asyncio.TimeoutError:
+        result.update(stage=stage, error="timed out")
+    except asyncio.IncompleteReadError:
+        result.update(stage=stage, error="connection closed by the device")
+    except (OSError, ValueError, ssl.SSLError) as e:
+        result.update(stage=stage, error=str(e) or type(e).__name__)
+    finally:
+        if writer is not None:
+            writer.close()
+    return result
+
+
+async def probe_receivers(receiver_output_configs, settings):
+    """Probe every receiver (see `probe_receiver`), at most settings["concurrency"] at once."""
+    semaphore = asyncio.Semaphore(settings["concurrency"])
+
+    async def bounded(name, config):
+        async with semaphore:
+            return await probe_receiver(name, config, settings)
+
+    return await asyncio.gather(
+        *(bounded(name, config) for name, config in receiver_output_configs.items())
+    )
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile (fraction between 0 and 1) of a list of numbers."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def recommend_timeouts(results, receiver_output_configs, settings):
+    """Recommend a timeout for every receiver that was probed successfully.
+
+    A scrape makes a request per module (the core modules plus each enabled data_type), so the
+    needed timeout is the receiver's p95 scrape request latency (the login is not a scrape
+    request) times its number of modules times the timeout_headroom setting, rounded up to whole
+    seconds, at least min_timeout and at most the receiver's collection_interval.
+
+    A few requests are weak evidence that a timeout can be shortened, so only timeouts shorter
+    than needed are raised to it; timeouts more than timeout_tolerance times longer than needed
+    are lowered, but only to 1/timeout_tolerance of their value (or the needed one, if longer).
+
+    Args:
+        results (list): The probe results (see `probe_receiver`).
+        receiver_output_configs (dict): The merged receiver configurations.
+        settings (dict): The preflight settings (see PREFLIGHT_DEFAULTS).
+
+    Returns:
+        tuple: A tuple containing:
+            - overrides (dict): {receiver: {"timeout": ...}} for receivers whose recommended
+              timeout differs from their current one.
+            - capped (list): Receivers whose recommended timeout exceeds their collection_interval.
+    """
+    overrides = {}
+    capped = []
+    min_timeout = parse_duration(settings["min_timeout"])
+    for result in results:
+        if result["error"] or not result["latencies"]:
+            continue
+        name = result["receiver"]
+        config = receiver_output_configs[name]
+        modules = BASE_SCRAPE_WEIGHT + len(enabled_data_types(config))
+        needed = percentile(result["latencies"], 0.95) * modules
+        seconds = max(math.ceil(needed * settings["timeout_headroom"]), min_timeout)
+        try:
+            interval = parse_duration(config.get("collection_interval", "60s"))
+        except ValueError:
+            interval = seconds
+        if seconds > interval:
+            capped.append(name)
+            seconds = interval
+        try:
+            current = parse_duration(config.get("timeout", "60s"))
+        except ValueError:
+            current = None
+        tolerance = settings["timeout_tolerance"]
+        if current is not None and seconds <= current:
+            if current <= seconds * tolerance:
+                continue
+            seconds = max(seconds, math.ceil(current / tolerance))
+        overrides[name] = {"timeout": format_duration(seconds)}
+    return overrides, sorted(capped)
+
+
+def run_preflight(args):
+    """Probe every configured receiver concurrently and log failures and timeout recommendations.
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+
+    Returns:
+        list or None: The probe results (see `probe_receiver`), or None if the inputs can't be
+                      loaded.
+    """
+    default_config = load_default_config(args)
+    receiver_input_configs = load_receiver_config(args)
+    if default_config is None or receiver_input_configs is None:
+        return None
+    receiver_output_configs = generate_receiver_configs(
+        receiver_input_configs, default_config
+    )
+    if receiver_output_configs is None:
+        return None
+    settings = {**PREFLIGHT_DEFAULTS, **(default_config.get("preflight") or {})}
+    if args.preflight_concurrency:
+        settings["concurrency"] = args.preflight_concurrency
+    try:
+        parse_duration(settings["connect_timeout"])
+        parse_duration(settings["min_timeout"])
+    except ValueError as e:
+        logging.error("Invalid preflight setting: %s", e)
+        return None
+
+    logging.info(
+        "Probing %d receivers (%d at a time)...",
+        len(receiver_output_configs),
+        settings["concurrency"],
+    )
+    results = asyncio.run(probe_receivers(receiver_output_configs, settings))
+
+    failures = collections.defaultdict(list)
+    for result in results:
+        if result["error"]:
+            failures[result["stage"]].append(result)
+    for stage in PREFLIGHT_STAGES:
+        for result in failures[stage][:MAX_LISTED_RECEIVERS]:
+            logging.error(
+                "%s: %s check failed: %s",
+                result["receiver"],
+                stage.upper() if stage in ("tcp", "tls") else stage,
+                result["error"],
+            )
+        if len(failures[stage]) > MAX_LISTED_RECEIVERS:
+            logging.error(
+                "... and %d more %s failures.",
+                len(failures[stage]) - MAX_LISTED_RECEIVERS,
+                stage,
+            )
+
+    latencies = [
+        percentile(result["latencies"], 0.95)
+        for result in results
+        if not result["error"] and result["latencies"]
+    ]
+    logging.info(
+        "%d of %d receivers passed the preflight checks.",
+        len(latencies),
+        len(results),
+    )
+    if latencies:
+        logging.info(
+            "Per-device p95 request latency: p50 %s, p95 %s, max %s",
+            format_duration(round(percentile(latencies, 0.5), 3)),
+            format_duration(round(percentile(latencies, 0.95), 3)),
+            format_duration(round(max(latencies), 3)),
+        )
+    overrides, capped = recommend_timeouts(results, receiver_output_configs, settings)
+    if overrides:
+        logging.info(
+            "Recommended timeout overrides for %s:\n%s",
+            args.receiver_input_file,
+            render_yaml(overrides),
+        )
+    if capped:
+        logging.warning(
+            "%d receivers need a timeout longer than their collection_interval; consider "
+            "raising their collection_interval: %s",
+            len(capped),
+            ", ".join(capped[:MAX_LISTED_RECEIVERS]),
+        )
+    return results
+
+
+def parse_exposition(text):
+    """Parse the samples of a Prometheus text exposition (e.g. a saved /federate response).
+
+    Returns:
+        list: (labels, values) pairs, the labels including the metric name as __name__.
+    """
+    series = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        match = EXPOSITION_SAMPLE_RE.match(line)
+        if not match:
+            raise ValueError(f"invalid exposition line {line!r}")
+        labels = {
+            name: re.sub(
+                r"\\(.)", lambda m: "\n" if m.group(1) == "n" else m.group(1), value
+            )
+            for name, value in EXPOSITION_LABEL_RE.findall(match.group(2) or "")
+        }
+        labels["__name__"] = match.group(1)
+        series.append((labels, [float(match.group(3))]))
+    return series
+
+
+def parse_query_result(document):
+    """Parse the series of a Prometheus /api/v1/query response (an instant vector or range matrix).
+
+    Returns:
+        list: (labels, values) pairs, the values in time order.
+
+    Raises:
+        ValueError: If document is not a successful vector or matrix query response.
+    """
+    data = document.get("data") if isinstance(document, dict) else None
+    if not isinstance(data, dict) or data.get("resultType") not in ("vector", "matrix"):
+        raise ValueError("not a successful vector or matrix query response")
+    series = []
+    for result in data.get("result") or []:
+        samples = result["values"] if "values" in result else [result["value"]]
+        series.append((result["metric"], [float(value) for _, value in samples]))
+    return series
+
+
+def telemetry_kind(labels):
+    """Classify a series of scrape telemetry as "duration", "responses" or "errors" (or None).
+
+    Series without a metric name (the results of the TUNING_QUERIES) are told apart by their
+    labels.
+    """
+    name = labels.get("__name__")
+    if name:
+        return TUNING_METRICS.get(name)
+    if "status_code" in labels:
+        return "responses"
+    if "receiver" in labels:
+        return "errors"
+    if "job" in labels:
+        return "duration"
+    return None
+
+
+def counter_increase(values):
+    """Return the increase of a counter over its samples, allowing for counter resets.
+
+    A single sample is taken as an increase already computed over the window (e.g. the result
+    of increase()).
+    """
+    if len(values) == 1:
+        return values[0]
+    return sum(
+        current - previous if current >= previous else current
+        for previous, current in zip(values, values[1:])
+    )
+
+
+def collect_scrape_telemetry(series):
+    """Group scrape telemetry series by receiver.
+
+    A single sample of a named counter (e.g. from an exposition or an instant query of the raw
+    counter) only holds its total since the collector started, so it is skipped: failures are
+    counted from increase() results or from raw samples across the window.
+
+    Args:
+        series (list): (labels, values) pairs (see `parse_exposition` and `parse_query_result`).
+
+    Returns:
+        dict: {receiver: {"durations": [seconds, ...], "responses": {status_code: count},
+              "errors": count}} for every receiver with any telemetry.
+    """
+    telemetry = {}
+    cumulative = 0
+    for labels, values in series:
+        kind = telemetry_kind(labels)
+        name = labels.get("receiver" if kind == "errors" else "job")
+        values = [value for value in values if not math.isnan(value)]
+        if kind is None or not name or not values:
+            continue
+        if kind != "duration" and "__name__" in labels and len(values) < 2:
+            cumulative += 1
+            continue
+        receiver = telemetry.setdefault(
+            name,
+            {"durations": [], "responses": collections.Counter(), "errors": 0},
+        )
+        if kind == "duration":
+            receiver["durations"].extend(values)
+        elif kind == "responses":
+            receiver["responses"][labels.get("status_code", "")] += counter_increase(
+                values
+            )
+        else:
+            receiver["errors"] += counter_increase(values)
+    if cumulative:
+        logging.warning(
+            "Skipped %d counter series with a single sample, which count failures since the "
+            "collector started rather than over a window; use increase() results or range "
+            "queries to tune from failures.",
+            cumulative,
+        )
+    return telemetry
+
+
+def read_telemetry_source(source, window):
+    """Read scrape telemetry from a file, an exposition URL or a live Prometheus server.
+
+    A URL without a path (e.g. http://localhost:9090) is taken as a Prometheus server and
+    sent the TUNING_QUERIES over the window. Other URLs and files may hold a text exposition
+    (e.g. from /federate) or a saved /api/v1/query response.
+
+    Args:
+        source (str): The file path or URL.
+        window (str): The PromQL range of the queries, e.g. "1d".
+
+    Returns:
+        list or None: (labels, values) pairs, or None if the source can't be read.
+    """
+    parts = urlsplit(source)
+    try:
+        if parts.scheme not in ("http", "https"):
+            with open(source, "r") as f:
+                documents = [f.read()]
+        elif parts.path.strip("/"):
+            with urllib.request.urlopen(source, timeout=60) as response:
+                documents = [response.read().decode()]
+        else:
+            documents = []
+            for query in TUNING_QUERIES.values():
+                url = f"{source.rstrip('/')}/api/v1/query?" + urlencode(
+                    {"query": query.format(window=window)}
+                )
+                with urllib.request.urlopen(url, timeout=60) as response:
+                    documents.append(response.read().decode())
+        series = []
+        for document in documents:
+            if document.lstrip().startswith("{"):
+                series.extend(parse_query_result(json.loads(document)))
+            else:
+                series.extend(parse_exposition(document))
+    except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+        logging.error("Error reading scrape telemetry from %s: %s", source, e)
+        return None
+    logging.info("Read %d telemetry series from %s.", len(series), source)
+    return series
+
+
+def round_up(seconds, step):
+    """Round a number of seconds up to a multiple of step (to whole seconds if step is 0)."""
+    if not step:
+        return math.ceil(seconds)
+    return math.ceil(seconds / step - 1e-9) * step
+
+
+def tune_receiver_intervals(
+    telemetry, receiver_output_configs, inherited_configs, settings
+):
+    """Compute the timeout and collection_interval of every receiver from its scrape telemetry.
+
+    The tuned timeout is the p95 scrape duration times the timeout_headroom setting, rounded up
+    to timeout_step and at least min_timeout. A receiver whose scrapes failed while its p95
+    duration reached its timeout (see TIMEOUT_SATURATION) was timing out, so its durations
+    understate the time it needs: its timeout is raised by at least timeout_headroom. The tuned
+    collection_interval is the timeout times interval_headroom, rounded up to interval_step, but
+    never shorter than the interval the receiver inherits from its profiles and the defaults.
+
+    Args:
+        telemetry (dict): The scrape telemetry by receiver (see `collect_scrape_telemetry`).
+        receiver_output_configs (dict): The merged receiver configurations.
+        inherited_configs (dict): The merged receiver configurations without the receivers' own
+                                  timeout and collection_interval.
+        settings (dict): The interval_tuning settings (see INTERVAL_TUNING_DEFAULTS).
+
+    Returns:
+        tuple: A tuple containing:
+            - tuned (dict): {receiver: {"timeout": seconds, "collection_interval": seconds,
+              "p95": seconds, "timed_out": bool}} for every receiver with scrape durations.
+            - failing (list): Receivers with failed requests that are not timeouts (e.g. HTTP
+              401), which tuning can't fix.
+    """
+    min_timeout = parse_duration(settings["min_timeout"])
+    timeout_step = parse_duration(settings["timeout_step"])
+    interval_step = parse_duration(settings["interval_step"])
+    tuned = {}
+    failing = []
+    for name, config in receiver_output_configs.items():
+        stats = telemetry.get(name)
+        if not stats or not stats["durations"]:
+            continue
+        p95 = percentile(stats["durations"], 0.95)
+        failed = stats["errors"] + sum(
+            count
+            for status, count in stats["responses"].items()
+            if not status.startswith("2")
+        )
+        current = parse_duration(config.get("timeout", "60s"))
+        timed_out = failed > 0 and p95 >= current * TIMEOUT_SATURATION
+        needed = p95 * settings["timeout_headroom"]
+        if timed_out:
+            needed = max(needed, current * settings["timeout_headroom"])
+        elif failed > 0:
+            failing.append(name)
+        timeout = max(round_up(needed, timeout_step), min_timeout)
+        inherited = parse_duration(
+            inherited_configs[name].get("collection_interval", "60s")
+        )
+        interval = max(
+            round_up(timeout * settings["interval_headroom"], interval_step), inherited
+        )
+        tuned[name] = {
+            "timeout": timeout,
+            "collection_interval": interval,
+            "p95": p95,
+            "timed_out": timed_out,
+        }
+    return tuned, sorted(failing)
+
+
+def edit_receiver_entry(text, name, config):
+    """Set the TUNED_FIELDS of one receiver in the text of a receiver input file.
+
+    Only the lines of those settings are replaced, removed or added (after the receiver's last
+    setting), so the comments and order of the hand-maintained file are kept. A receiver written
+    in flow style (e.g. "bigip/1: {}") is re-rendered in block style.
+
+    Args:
+        text (str): The content of the receiver input file.
+        name (str): The receiver name, a top-level key of the file.
+        config (dict): The receiver's updated settings.
+
+    Returns:
+        str: The edited text.
+
+    Raises:
+        ValueError: If the receiver's entry is not found.
+    """
+    lines = text.splitlines(keepends=True)
+    key_re = re.compile(
+        r"^(?:{0}|\"{0}\"|'{0}')\s*:(.*)$".format(re.escape(name)), re.DOTALL
+    )
+    start = next((i for i, line in enumerate(lines) if key_re.match(line)), None)
+    if start is None:
+        raise ValueError(f"entry of {name} not found")
+    end = start + 1
+    while end < len(lines) and (not lines[end].strip() or lines[end][0] in " \t"):
+        end += 1
+    while end > start + 1 and not lines[end - 1].strip():
+        end -= 1
+    inline = key_re.match(lines[start]).group(1).split("#", 1)[0].strip()
+    content = [line for line in lines[start + 1 : end] if line.strip()[:1] != "#"]
+    if inline or not content:
+        lines[start] = render_yaml({name: config})
+        return "".join(lines)
+
+    indent = content[0][: len(content[0]) - len(content[0].lstrip())]
+    for key in TUNED_FIELDS:
+        setting_re = re.compile(
+            rf"^({re.escape(indent)}{key}\s*:\s*)([^#\n]*?)(\s+#.*)?(\n?)$"
+        )
+        index = next(
+            (i for i in range(start + 1, end) if setting_re.match(lines[i])), None
+        )
+        if key not in config:
+            if index is not None:
+                del lines[index]
+                end -= 1
+        elif index is not None:
+            match = setting_re.match(lines[index])
+            lines[index] = (
+                f"{match.group(1)}{config[key]}{match.group(3) or ''}{match.group(4)}"
+            )
+        else:
+            if not lines[end - 1].endswith("\n"):
+                lines[end - 1] += "\n"
+            lines.insert(end, f"{indent}{key}: {config[key]}\n")
+            end += 1
+    return "".join(lines)
+
+
+def apply_tuned_overrides(receivers, tuned, inherited_configs):
+    """Write tuned settings into receiver input settings as minimal overrides.
+
+    As with `transform_single_receiver`, a setting equal to the value the receiver would
+    otherwise inherit is left out (and an existing override of it removed).
+
+    Args:
+        receivers (dict): Receiver input settings (e.g. one input file), updated in place.
+        tuned (dict): The tuned settings (see `tune_receiver_intervals`).
+        inherited_configs (dict): The merged receiver configurations without the receivers' own
+                                  timeout and collection_interval.
+
+    Returns:
+        list: The names of the receivers whose input settings changed.
+    """
+    changed = []
+    for name, config in receivers.items():
+        if name not in tuned:
+            continue
+        updated = dict(config or {})
+        for key in TUNED_FIELDS:
+            seconds = tuned[name][key]
+            if seconds == parse_duration(inherited_configs[name].get(key, "60s")):
+                updated.pop(key, None)
+            else:
+                updated[key] = format_duration(seconds)
+        if updated != (config or {}):
+            receivers[name] = updated
+            changed.append(name)
+    return changed
+
+
+def run_interval_tuning(args):
+    """Tune per-receiver timeouts and collection intervals from the collector's scrape telemetry.
+
+    The telemetry is read from every --tune-from source (see `read_telemetry_source`), and the
+    tuned settings are written back to whichever receiver input file (or receivers.d fragment)
+    defines each receiver, editing only their lines (see `edit_receiver_entry`).
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+
+    Returns:
+        dict or None: The tuned settings (see `tune_receiver_intervals`), or None if any error
+                      occurs.
+    """
+    default_config = load_default_config(args)
+    receiver_input_configs = load_receiver_config(args)
+    if default_config is None or receiver_input_configs is None:
+        return None
+    settings = {
+        **INTERVAL_TUNING_DEFAULTS,
+        **(default_config.get("interval_tuning") or {}),
+    }
+    try:
+        for key in ("timeout_step", "min_timeout", "interval_step"):
+            parse_duration(settings[key])
+        parse_promql_duration(settings["window"])
+    except ValueError as e:
+        logging.error("Invalid interval_tuning setting: %s", e)
+        return None
+
+    series = []
+    for source in args.tune_from:
+        source_series = read_telemetry_source(source, settings["window"])
+        if source_series is None:
+            return None
+        series.extend(source_series)
+    telemetry = collect_scrape_telemetry(series)
+
+    receiver_output_configs = generate_receiver_configs(
+        receiver_input_configs, default_config
+    )
+    inherited_configs = generate_receiver_configs(
+        {
+            name: {
+                key: value for key, value in config.items() if key not in TUNED_FIELDS
+            }
+            for name, config in receiver_input_configs.items()
+        },
+        default_config,
+    )
+    if receiver_output_configs is None or inherited_configs is None:
+        return None
+    try:
+        tuned, failing = tune_receiver_intervals(
+            telemetry, receiver_output_configs, inherited_configs, settings
+        )
+    except ValueError as e:
+        logging.error("Invalid receiver timeout: %s", e)
+        return None
+    logging.info(
+        "Tuning %d of %d receivers (the rest have no scrape durations in the telemetry).",
+        len(tuned),
+        len(receiver_output_configs),
+    )
+    if failing:
+        logging.warning(
+            "%d receivers have failed requests that are not timeouts (see the receiver-stats "
+            "dashboard): %s",
+            len(failing),
+            ", ".join(failing[:MAX_LISTED_RECEIVERS]),
+        )
+
+    paths = list_receiver_fragments(args.receiver_input_dir)
+    if os.path.exists(args.receiver_input_file):
+        paths.insert(0, args.receiver_input_file)
+    changed = []
+    for path in paths:
+        try:
+            with open(path, "r") as f:
+                rendered = f.read()
+            receivers = yaml.load(rendered, Loader=YAML_LOADER)
+        except (OSError, yaml.YAMLError) as e:
+            logging.error("Error reading %s: %s", path, e)
+            return None
+        if not isinstance(receivers, dict):
+            continue
+        path_changed = apply_tuned_overrides(receivers, tuned, inherited_configs)
+        if not path_changed:
+            continue
+        try:
+            for name in path_changed:
+                rendered = edit_receiver_entry(rendered, name, receivers[name])
+            if yaml.load(rendered, Loader=YAML_LOADER) != receivers:
+                raise ValueError("the edited file doesn't parse to the tuned settings")
+        except (ValueError, yaml.YAMLError) as e:
+            logging.error(
+                "Can't edit %s (%s); set these overrides by hand:\n%s",
+                path,
+                e,
+                render_yaml({name: receivers[name] for name in path_changed}),
+            )
+            continue
+        changed.extend(path_changed)
+        emit_output(
+            f"{len(path_changed)} tuned receivers", rendered, path, args.dry_run
+        )
+        if not args.dry_run:
+            write_yaml_to_file(receivers, path, rendered=rendered)
+
+    for name in changed[:MAX_LISTED_RECEIVERS]:
+        config = receiver_output_configs[name]
+        logging.info(
+            "%s: timeout %s -> %s, collection_interval %s -> %s (p95 scrape %s%s)",
+            name,
+            config.get("timeout"),
+            format_duration(tuned[name]["timeout"]),
+            config.get("collection_interval"),
+            format_duration(tuned[name]["collection_interval"]),
+            format_duration(round(tuned[name]["p95"], 3)),
+            ", timing out" if tuned[name]["timed_out"] else "",
+        )
+    if len(changed) > MAX_LISTED_RECEIVERS:
+        logging.info(
+            "... and %d more tuned receivers.", len(changed) - MAX_LISTED_RECEIVERS
+        )
+    if not changed:
+        logging.info("No receiver settings changed.")
+    return tuned
+
+
+def downsampling_rule_groups(receiver_output_configs, settings):
+    """Build the recording rules rolling f5_* metrics up to the downsampling resolution.
+
+    One gauge rule (avg_over_time) and one counter rule (last_over_time) are generated for the
+    always-on modules and for each data_type enabled on any receiver, so the rules follow the
+    enabled data_types. Each rule selects the module's metrics by name prefix (see
+    `data_type_metric_prefix`) and keeps the original metric name in the ROLLUP_METRIC_LABEL
+    label, e.g. f5_dos:avg_over_time5m{f5_metric="f5_dos_attack_vectors", ...}.
+
+    Args:
+        receiver_output_configs (dict): The merged receiver configurations.
+        settings (dict): The downsampling settings.
+
+    Returns:
+        dict: The Prometheus rule file content.
+    """
+    resolution = settings["resolution"]
+    raw_interval = settings["raw_interval"]
+    enabled = set()
+    for config in receiver_output_configs.values():
+        enabled.update(enabled_data_types(config))
+    prefixes = sorted(
+        data_type_metric_prefix(name)
+        for name in (set(DATA_TYPE_SERIES_ESTIMATES) | enabled) - {"base"}
+    )
+
+    rules = []
+    for module in ["base"] + sorted(enabled):
+        if module == "base":
+            record_prefix = "f5"
+            matchers = [
+                '__name__=~"f5_[^:]+"',
+                f'__name__!~"(?:{"|".join(re.escape(p) for p in prefixes)}).*"',
+            ]
+        else:
+            prefix = data_type_metric_prefix(module)
+            record_prefix = prefix.rstrip("_")
+            matchers = [f'__name__=~"{re.escape(prefix)}[^:]+"']
+        for func, op in [("avg_over_time", "!~"), ("last_over_time", "=~")]:
+            selector = ", ".join(matchers + [f'__name__{op}"{COUNTER_METRIC_RE}"'])
+            rules.append(
+                {
+                    "record": f"{record_prefix}:{func}{resolution}",
+                    "expr": (
+                        f"{func}(label_replace({{{selector}}}, "
+                        f'"{ROLLUP_METRIC_LABEL}", "$1", "__name__", "(.+)")'
+                        f"[{resolution}:{raw_interval}])"
+                    ),
+                }
+            )
+    return {
+        "groups": [{"name": "f5_downsampling", "interval": resolution, "rules": rules}]
+    }
+
+
+def longterm_prometheus_config(settings):
+    """Build the config of the long-term Prometheus, which federates the rolled up series.
 
-    final_pipelines = {}
-    for pipeline, settings in pipelines.items():
-        receivers = settings.get("receivers", [])
-        if len(receivers) == 0:
-            continue
-        final_pipelines[pipeline] = settings
-    return final_pipelines
+    The rolled up series (see `downsampling_rule_groups`) are pulled from the raw Prometheus
+    once per resolution and stored under their original metric names, so dashboards work
+    unchanged against the long-term datasource.
+    """
+    resolution = settings["resolution"]
+    interval = parse_promql_duration(resolution)
+    return {
+        "global": {"scrape_interval": resolution, "evaluation_interval": resolution},
+        "scrape_configs": [
+            {
+                "job_name": "federate-downsampled",
+                "scrape_interval": resolution,
+                "scrape_timeout": format_duration(min(interval, 120)),
+                "honor_labels": True,
+                "metrics_path": "/federate",
+                "params": {
+                    "match[]": [
+                        f'{{__name__=~"f5[^:]*:(?:avg|last)_over_time{resolution}"}}'
+                    ]
+                },
+                "static_configs": [{"targets": [RAW_PROMETHEUS_TARGET]}],
+                "metric_relabel_configs": [
+                    {
+                        "source_labels": [ROLLUP_METRIC_LABEL],
+                        "regex": "(.+)",
+                        "target_label": "__name__",
+                    },
+                    {"regex": ROLLUP_METRIC_LABEL, "action": "labeldrop"},
+                ],
+            }
+        ],
+    }
+
+
+def longterm_datasource(settings):
+    """Build the Grafana datasource provisioning file for the long-term Prometheus."""
+    return {
+        "apiVersion": 1,
+        "datasources": [
+            {
+                "name": LONGTERM_DATASOURCE_NAME,
+                "uid": "prometheus-longterm",
+                "type": "prometheus",
+                "access": "proxy",
+                "orgId": 1,
+                "url": LONGTERM_DATASOURCE_URL,
+                "basicAuth": False,
+                "isDefault": False,
+                "editable": True,
+                "jsonData": {"timeInterval": settings["resolution"]},
+            }
+        ],
+    }
+
+
+def write_downsampling_tier(receiver_output_configs, settings, args):
+    """Render and (unless in dry-run mode) write the downsampled long-term tier.
+
+    The tier is made of the rollup recording rules for the raw Prometheus, the long-term
+    Prometheus config and its Grafana datasource. Unless downsampling is enabled, nothing is
+    generated and previously generated rules and datasource files are removed, so the raw
+    Prometheus stops evaluating the rules and Grafana drops the datasource. The long-term
+    Prometheus config is kept, since docker-compose.yaml mounts it and only the opt-in
+    longterm profile reads it.
+
+    Args:
+        receiver_output_configs (dict): The merged receiver configurations.
+        settings (dict): The downsampling settings of the default config, or None.
+        args (argparse.Namespace): The parsed command-line arguments.
+
+    Returns:
+        bool: True if any output file was written or removed (i.e. its content changed).
+    """
+    settings = {**DOWNSAMPLING_DEFAULTS, **(settings or {})}
+    if not settings["enabled"]:
+        changed = False
+        for path in [args.downsampling_rules_file, args.longterm_datasource_file]:
+            if not os.path.exists(path):
+                continue
+            if args.dry_run:
+                logging.info("Downsampling is disabled, would remove %s.", path)
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.error("Error removing %s: %s", path, e)
+                continue
+            logging.info("Downsampling is disabled, removed %s.", path)
+            changed = True
+        return changed
+    try:
+        for key in ["resolution", "raw_interval"]:
+            parse_promql_duration(str(settings[key]))
+        if 2 * parse_promql_duration(str(settings["resolution"])) > (
+            parse_promql_duration(LONGTERM_LOOKBACK_DELTA)
+        ):
+            raise ValueError(
+                f"resolution {settings['resolution']} is longer than half the long-term "
+                f"Prometheus --query.lookback-delta ({LONGTERM_LOOKBACK_DELTA}), so queries "
+                "would miss samples"
+            )
+    except ValueError as e:
+        logging.error("Invalid downsampling setting: %s", e)
+        return False
+    rules = downsampling_rule_groups(receiver_output_configs, settings)
+    changed = False
+    for description, data, path in [
+        (
+            f"{len(rules['groups'][0]['rules'])} downsampling rules",
+            rules,
+            args.downsampling_rules_file,
+        ),
+        (
+            "long-term Prometheus config",
+            longterm_prometheus_config(settings),
+            args.longterm_prometheus_config_file,
+        ),
+        (
+            "long-term Prometheus datasource",
+            longterm_datasource(settings),
+            args.longterm_datasource_file,
+        ),
+    ]:
+        rendered = render_yaml(data)
+        emit_output(description, rendered, path, args.dry_run)
+        if not args.dry_run:
+            changed |= write_yaml_to_file(data, path, rendered=rendered)
+    return changed
 
 
-def generate_configs(args):
+def generate_configs(args, default_config=None):
     """Generate configuration files for receivers and pipelines.
 
     This function orchestrates the generation of configuration files by loading default settings and
@@ -481,6 +4360,8 @@ def generate_configs(args):
     Args:
         args (argparse.Namespace): The parsed command-line arguments containing file paths for
                                    default configurations and receiver inputs.
+        default_config (dict, optional): The already loaded default configuration, which is
+                                         otherwise loaded from --default-config-file.
 
     Returns:
         tuple: A tuple containing two dictionaries:
@@ -492,19 +4373,323 @@ def generate_configs(args):
         args.default_config_file,
         args.receiver_input_file,
     )
-    default_config = load_default_config(args)
-    receiver_input_configs = load_receiver_config(args)
+    if default_config is None:
+        with PROFILER.stage("load_default_config"):
+            default_config = load_default_config(args)
+    with PROFILER.stage("load_receiver_config"):
+        receiver_input_configs = load_receiver_config(args)
     logging.info("Generating receiver configs...")
-    receiver_output_configs = generate_receiver_configs(
-        receiver_input_configs, default_config
-    )
+    with PROFILER.stage("generate_receiver_configs"):
+        receiver_output_configs = generate_receiver_configs(
+            receiver_input_configs, default_config
+        )
+    if receiver_output_configs is None:
+        return None, None
+    logging.info("Planning scrape schedule...")
+    with PROFILER.stage("plan_scrape_schedule"):
+        plan_scrape_schedule(
+            receiver_input_configs, receiver_output_configs, default_config
+        )
+    if not args.no_validate:
+        with PROFILER.stage("validate_receiver_configs"):
+            errors = validate_receiver_configs(receiver_output_configs, default_config)
+        if errors:
+            logging.error(
+                "%d errors found in the receiver configs from %s and %s:\n  %s",
+                len(errors),
+                args.default_config_file,
+                args.receiver_input_file,
+                "\n  ".join(errors),
+            )
+            return None, None
     logging.info("Generating pipeline configs...")
-    pipeline_output_configs = generate_pipeline_configs(
-        receiver_input_configs, default_config, args
-    )
+    with PROFILER.stage("generate_pipeline_configs"):
+        pipeline_output_configs = generate_pipeline_configs(
+            receiver_input_configs, default_config, args
+        )
+    if pipeline_output_configs:
+        with PROFILER.stage("split_filtered_pipelines"):
+            pipeline_output_configs = split_filtered_pipelines(
+                pipeline_output_configs, receiver_output_configs
+            )
+        with PROFILER.stage("partition_pipelines"):
+            try:
+                pipeline_output_configs = partition_pipelines(
+                    pipeline_output_configs,
+                    receiver_output_configs,
+                    default_config.get("pipeline_partitioning"),
+                )
+            except ValueError as e:
+                logging.error("Invalid pipeline_partitioning setting: %s", e)
+                return None, None
     return receiver_output_configs, pipeline_output_configs
 
 
+def write_generated_configs(
+    receiver_output_configs, pipeline_output_configs, default_config, args
+):
+    """Render, summarize and (unless in dry-run mode) write the generated configs.
+
+    Each output document is rendered once and the same text is used for the log summary, the
+    dry-run display and the file write.
+
+    With --shards greater than 1, receivers are split across collector instances with
+    `assign_shards` and each shard n is written to receivers-n.yaml and pipelines-n.yaml next
+    to the configured output files, with a collector-shard-n.yaml config loading them and a
+    --compose-shards-file override running a collector service per shard. The unsharded
+    receivers and pipelines files are emptied, so a collector started without the override
+    doesn't scrape a stale fleet. Otherwise the single receivers and pipelines files are
+    written. Shard files left over from a run with more shards are removed.
+
+    Args:
+        receiver_output_configs (dict): The merged receiver configurations.
+        pipeline_output_configs (dict): The generated pipeline configurations.
+        default_config (dict): The default configuration the configs were generated from, for
+                               the collector overlay and the downsampling tier.
+        args (argparse.Namespace): The parsed command-line arguments.
+
+    Returns:
+        bool: True if any output file was written (i.e. its content changed).
+    """
+    changed = remove_stale_shard_outputs(args)
+    outputs = []
+    if args.shards > 1:
+        assignments = assign_shards(receiver_output_configs, args.shards)
+        for shard in range(args.shards):
+            names = {name for name, n in assignments.items() if n == shard}
+            if not names:
+                logging.warning(
+                    "Shard %d has no receivers, consider using fewer shards.", shard
+                )
+            outputs.append(
+                (
+                    {name: receiver_output_configs[name] for name in names},
+                    split_pipeline_configs(pipeline_output_configs, names),
+                    shard_output_path(args.receiver_output_file, shard),
+                    shard_output_path(args.pipelines_output_file, shard),
+                )
+            )
+    else:
+        outputs.append(
+            (
+                receiver_output_configs,
+                pipeline_output_configs,
+                args.receiver_output_file,
+                args.pipelines_output_file,
+            )
+        )
+
+    with PROFILER.stage("load_receiver_cache"):
+        cache = {} if args.no_cache else load_receiver_cache(args.cache_file)
+    new_cache = {}
+    for receivers, pipelines, receiver_path, pipeline_path in outputs:
+        with PROFILER.stage("render_yaml"):
+            receiver_yaml, shard_cache = render_receiver_configs(receivers, cache)
+            new_cache.update(shard_cache)
+            pipeline_yaml = render_yaml(pipelines)
+        emit_output(
+            f"{len(pipelines)} pipelines", pipeline_yaml, pipeline_path, args.dry_run
+        )
+        emit_output(
+            f"{len(receivers)} receivers", receiver_yaml, receiver_path, args.dry_run
+        )
+        if not args.dry_run:
+            with PROFILER.stage("write_files"):
+                changed |= write_yaml_to_file(
+                    pipelines, pipeline_path, rendered=pipeline_yaml
+                )
+                changed |= write_yaml_to_file(
+                    receivers, receiver_path, rendered=receiver_yaml
+                )
+    if args.shards > 1:
+        shard_files = [
+            (
+                f"shard {shard} collector config",
+                shard_collector_config(receiver_path, pipeline_path),
+                shard_collector_config_path(args, shard),
+            )
+            for shard, (_, _, receiver_path, pipeline_path) in enumerate(outputs)
+        ]
+        shard_files += [
+            ("empty receivers (sharded)", {}, args.receiver_output_file),
+            ("empty pipelines (sharded)", {}, args.pipelines_output_file),
+            (
+                f"{args.shards} collector services",
+                shard_compose_override(args),
+                args.compose_shards_file,
+            ),
+        ]
+        for description, data, path in shard_files:
+            rendered = render_yaml(data)
+            emit_output(description, rendered, path, args.dry_run)
+            if not args.dry_run:
+                changed |= write_yaml_to_file(data, path, rendered=rendered)
+        logging.info(
+            "Start the %d collectors with: docker compose -f %s -f %s up -d",
+            args.shards,
+            COMPOSE_FILE,
+            args.compose_shards_file,
+        )
+    collector_template = load_yaml(args.collector_config_file, parse_cache_dir(args))
+    if collector_template is not None:
+        overlay = build_collector_overlay(
+            pipeline_output_configs,
+            collector_template,
+            receiver_output_configs,
+            default_config.get("fleet_tuning"),
+            args.shards,
+        )
+        overlay_yaml = render_yaml(overlay)
+        emit_output(
+            f"{len(overlay.get('processors', {}))} processors and "
+            f"{len(overlay.get('exporters', {}))} exporters",
+            overlay_yaml,
+            args.overlay_output_file,
+            args.dry_run,
+        )
+        if not args.dry_run:
+            changed |= write_yaml_to_file(
+                overlay, args.overlay_output_file, rendered=overlay_yaml
+            )
+    changed |= write_downsampling_tier(
+        receiver_output_configs, default_config.get("downsampling"), args
+    )
+    if not args.dry_run and not args.no_cache:
+        with PROFILER.stage("save_receiver_cache"):
+            save_receiver_cache(new_cache, args.cache_file)
+    return changed
+
+
+def watched_files_state(paths):
+    """Return the (mtime, size) of each path, or None for paths that don't exist."""
+    state = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            state[path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            state[path] = None
+    return state
+
+
+def regenerate_configs(args):
+    """Generate and write the configs once, running the --on-change hook if outputs changed.
+
+    Errors are logged rather than raised, so a bad edit doesn't stop --watch.
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+
+    Returns:
+        bool: True if any output file changed.
+    """
+    try:
+        default_config = load_default_config(args)
+        if default_config is None:
+            return False
+        receiver_config, pipeline_config = generate_configs(args, default_config)
+        if not receiver_config or not pipeline_config:
+            return False
+        changed = write_generated_configs(
+            receiver_config, pipeline_config, default_config, args
+        )
+    except Exception:
+        logging.exception("Error generating configs.")
+        return False
+    if changed and args.on_change:
+        logging.info("Outputs changed, running '%s'...", args.on_change)
+        result = subprocess.run(args.on_change, shell=True)
+        if result.returncode != 0:
+            logging.error(
+                "On-change command '%s' exited with %d.",
+                args.on_change,
+                result.returncode,
+            )
+    elif not changed:
+        logging.info("Outputs unchanged.")
+    return changed
+
+
+def watch_configs(args, sleep=time.sleep, cycles=None):
+    """Regenerate the configs whenever the input files change.
+
+    The default config, receiver input (and receivers.d fragment) and collector template files are
+    polled every --watch-interval seconds. Once a change is seen, regeneration waits until the
+    files have been stable for --debounce seconds, so a burst of edits (or an editor's save
+    sequence) causes a single regeneration. Regeneration runs in this process, reusing the parse
+    and render caches.
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+        sleep (callable): The function used to wait, replaceable for testing.
+        cycles (int, optional): Stop after this many polls (runs forever by default).
+    """
+    paths = [
+        args.default_config_file,
+        args.receiver_input_file,
+        args.collector_config_file,
+    ]
+
+    def input_paths():
+        return paths + list_receiver_fragments(args.receiver_input_dir)
+
+    logging.info(
+        "Watching %s and %s for changes...",
+        ", ".join(paths),
+        args.receiver_input_dir,
+    )
+    state = watched_files_state(input_paths())
+    regenerate_configs(args)
+    polls = 0
+    while cycles is None or polls < cycles:
+        polls += 1
+        sleep(args.watch_interval)
+        current = watched_files_state(input_paths())
+        if current == state:
+            continue
+        while True:
+            sleep(args.debounce)
+            settled = watched_files_state(input_paths())
+            if settled == current:
+                break
+            current = settled
+        state = current
+        logging.info("Input files changed, regenerating configs...")
+        regenerate_configs(args)
+
+
+def write_profile_reports(profiler, args):
+    """Log the recorded stage profile and write it as JSON and as a Prometheus textfile.
+
+    The textfile is replaced atomically, so the node_exporter textfile collector never reads a
+    partial file.
+
+    Args:
+        profiler (StageProfiler): The profiler holding the recorded stages.
+        args (argparse.Namespace): The parsed command-line arguments with the output paths.
+    """
+    report = profiler.to_json()
+    logging.info("Stage profile:\n\n%s", report)
+    try:
+        with open(args.profile_json_file, "w") as f:
+            f.write(report)
+        logging.info("Successfully wrote profile to '%s'.", args.profile_json_file)
+    except IOError as e:
+        logging.error("Error writing profile to '%s': %s", args.profile_json_file, e)
+    write_text_to_file(profiler.to_prometheus(), args.profile_textfile)
+
+
+def positive_int(value):
+    """Parse a command-line value that must be an integer of at least 1."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got '{value}'")
+    return number
+
+
 def get_args():
     """Initialize the argument parser.
 
@@ -528,6 +4713,76 @@ def get_args():
         help="Path to the legacy big-ips.json file to convert (default: ./config/big-ips.json).",
     )
 
+    parser.add_argument(
+        "--import-inventory",
+        type=str,
+        metavar="FILE",
+        help="Import a CSV or JSONL device inventory into the receiver input file.",
+    )
+
+    parser.add_argument(
+        "--inventory-format",
+        choices=["csv", "jsonl"],
+        default=None,
+        help="Format of the --import-inventory file (default: jsonl for .jsonl/.ndjson files, else csv).",
+    )
+
+    parser.add_argument(
+        "--column-map",
+        type=str,
+        default=None,
+        help="Comma separated column=field pairs mapping inventory columns to receiver fields, e.g. 'mgmt_ip=endpoint,user=username'.",
+    )
+
+    parser.add_argument(
+        "--rejects-file",
+        type=str,
+        default=None,
+        help="Where --import-inventory writes rejected rows (default: the receiver input file with a .rejects.jsonl extension).",
+    )
+
+    parser.add_argument(
+        "--simulator-receivers",
+        type=int,
+        metavar="N",
+        default=None,
+        help="Write receiver settings for N devices simulated by bigip_simulator.py to --simulator-output-file.",
+    )
+
+    parser.add_argument(
+        "--simulator-output-file",
+        type=str,
+        default="./config/bigip_receivers.simulator.yaml",
+        help="Where --simulator-receivers writes the simulated receivers (default: ./config/bigip_receivers.simulator.yaml).",
+    )
+
+    parser.add_argument(
+        "--simulator-endpoint",
+        type=str,
+        default="https://127.0.0.1:8443",
+        help="URL of the first simulated device; the others use the following ports (default: https://127.0.0.1:8443).",
+    )
+
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="With --convert-legacy-config, decode and convert legacy entries incrementally in parallel, with bounded memory.",
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for --stream conversion and parsing receivers.d fragments (default: number of CPUs).",
+    )
+
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=500,
+        help="Legacy entries per worker task for --stream conversion (default: 500).",
+    )
+
     parser.add_argument(
         "--dry-run", action="store_true", help="Don't write output to files"
     )
@@ -546,12 +4801,93 @@ def get_args():
         help="Path to the receiver settings input file (bigIP Configs) to generate configs from (default: ./config/bigip_receivers.yaml).",
     )
 
+    parser.add_argument(
+        "--receiver-input-dir",
+        type=str,
+        default="./config/receivers.d",
+        help="Directory of additional receiver settings YAML fragments, merged with the receiver input file (default: ./config/receivers.d).",
+    )
+
     parser.add_argument(
         "--generate-configs",
         action="store_true",
         help="Read files in config directory and write AST Otel Config",
     )
 
+    parser.add_argument(
+        "--no-validate",
+        action="store_true",
+        help="Skip validation of the merged receiver configs before writing them.",
+    )
+
+    parser.add_argument(
+        "--plan-capacity",
+        action="store_true",
+        help="Estimate the series, samples/s, Prometheus disk and memory and collector memory of the configured fleet.",
+    )
+
+    parser.add_argument(
+        "--tsdb-status",
+        type=str,
+        default=None,
+        help="With --plan-capacity, calibrate the per-device series estimates from a saved /api/v1/status/tsdb response.",
+    )
+
+    parser.add_argument(
+        "--snapshot-devices",
+        type=int,
+        default=None,
+        help="Number of devices in the --tsdb-status snapshot (default: its number of f5_system_state_up_ratio series).",
+    )
+
+    parser.add_argument(
+        "--preflight",
+        action="store_true",
+        help="Check that every configured device is reachable (TCP, TLS, iControl REST login) and recommend timeouts.",
+    )
+
+    parser.add_argument(
+        "--preflight-concurrency",
+        type=int,
+        default=None,
+        help="Devices --preflight probes at once (default: the preflight concurrency setting, 50).",
+    )
+
+    parser.add_argument(
+        "--tune-from",
+        action="append",
+        metavar="SOURCE",
+        default=None,
+        help="Tune per-device timeouts and collection intervals from scrape telemetry: a Prometheus "
+        "URL, an exposition URL or a saved exposition or query response (may be repeated).",
+    )
+
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and regenerate configs whenever the input files change.",
+    )
+
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=2.0,
+        help="Seconds between checks of the input files in --watch mode (default: 2).",
+    )
+
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=1.0,
+        help="Seconds the input files must be unchanged before regenerating in --watch mode (default: 1).",
+    )
+
+    parser.add_argument(
+        "--on-change",
+        type=str,
+        help="Shell command to run after generation when any output file changed, e.g. 'docker compose restart otel-collector'.",
+    )
+
     parser.add_argument(
         "--receiver-output-file",
         type=str,
@@ -565,6 +4901,95 @@ def get_args():
         default="./services/otel_collector/pipelines.yaml",
         help="Path to the pipeline settings otel config file (default: ./services/otel_collector/pipelines.yaml).",
     )
+
+    parser.add_argument(
+        "--collector-config-file",
+        type=str,
+        default="./services/otel_collector/defaults/bigip-scraper-config.yaml",
+        help="Path to the otel collector config template the generated files are merged into (default: ./services/otel_collector/defaults/bigip-scraper-config.yaml).",
+    )
+
+    parser.add_argument(
+        "--overlay-output-file",
+        type=str,
+        default="./services/otel_collector/overlay.yaml",
+        help="Path to the generated collector config overlay, e.g. partition batch processors (default: ./services/otel_collector/overlay.yaml).",
+    )
+
+    parser.add_argument(
+        "--downsampling-rules-file",
+        type=str,
+        default="./services/prometheus/rules/f5_downsampling.yml",
+        help="Path to the generated downsampling recording rules, if downsampling is enabled (default: ./services/prometheus/rules/f5_downsampling.yml).",
+    )
+
+    parser.add_argument(
+        "--longterm-prometheus-config-file",
+        type=str,
+        default="./services/prometheus-longterm/prometheus.yml",
+        help="Path to the generated long-term Prometheus config, if downsampling is enabled (default: ./services/prometheus-longterm/prometheus.yml).",
+    )
+
+    parser.add_argument(
+        "--longterm-datasource-file",
+        type=str,
+        default="./services/grafana/provisioning/datasources/prometheus-longterm.yaml",
+        help="Path to the generated long-term Prometheus Grafana datasource, if downsampling is enabled (default: ./services/grafana/provisioning/datasources/prometheus-longterm.yaml).",
+    )
+
+    parser.add_argument(
+        "--shards",
+        type=positive_int,
+        default=1,
+        help="Split receivers across this many otel-collector instances, writing receivers-N.yaml, pipelines-N.yaml and collector-shard-N.yaml for each and a compose override running them (default: 1).",
+    )
+
+    parser.add_argument(
+        "--compose-shards-file",
+        type=str,
+        default="./docker-compose.shards.yaml",
+        help="Path to the generated docker compose override running a collector per shard (default: ./docker-compose.shards.yaml).",
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record wall time, CPU time and peak memory of each stage and write them as JSON and as a Prometheus textfile.",
+    )
+
+    parser.add_argument(
+        "--profile-json-file",
+        type=str,
+        default="./config_helper_profile.json",
+        help="Path of the --profile JSON report (default: ./config_helper_profile.json).",
+    )
+
+    parser.add_argument(
+        "--profile-textfile",
+        type=str,
+        default="./services/node_exporter/textfile/config_helper.prom",
+        help="Path of the --profile Prometheus textfile, scraped through the node-exporter service (default: ./services/node_exporter/textfile/config_helper.prom).",
+    )
+
+    parser.add_argument(
+        "--cache-file",
+        type=str,
+        default="./services/otel_collector/.receivers_cache.json",
+        help="Path to the per-receiver render cache used to speed up re-generation (default: ./services/otel_collector/.receivers_cache.json).",
+    )
+
+    parser.add_argument(
+        "--parse-cache-dir",
+        type=str,
+        default="./config/.parse_cache",
+        help="Directory caching parsed input files, reused until their mtime or size changes (default: ./config/.parse_cache).",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Re-parse inputs and re-render every receiver without reading or writing any cache.",
+    )
     return parser
 
 
@@ -579,44 +5004,114 @@ def main():
     - Parses command-line arguments using `get_args`.
     - If the `--convert-legacy-config` flag is provided:
         - Calls `convert_legacy_config` to convert the legacy configuration file.
-        - Logs the converted output and writes it to a specified YAML file unless in dry-run mode.
+        - Logs a summary of the converted output and writes it to a specified YAML file, or displays
+          it in dry-run mode.
     - If the `--generate-configs` flag is specified:
         - Calls `generate_configs` to create new receiver and pipeline configurations.
-        - Logs the generated configurations and writes them to their respective output files unless in dry-run mode.
+        - Logs a summary of the generated configurations and writes them to their respective output
+          files, or displays them in dry-run mode.
+    - If `--import-inventory` is specified, imports the CSV or JSONL inventory into the receiver
+      input file (see `import_inventory`).
+    - If `--simulator-receivers` is specified, writes receivers for the devices simulated by
+      bigip_simulator.py to the simulator output file (see `write_simulator_receivers`).
+    - If `--plan-capacity` is specified, logs the capacity estimates for the configured fleet (see
+      `run_capacity_plan`).
+    - If `--preflight` is specified, probes every configured device and logs connectivity failures
+      and recommended timeouts (see `run_preflight`).
+    - If `--tune-from` is specified, tunes per-device timeouts and collection intervals from the
+      collector's scrape telemetry and writes them to the receiver input files
+      (see `run_interval_tuning`).
+    - If the `--watch` flag is specified, regenerates the configurations whenever the input files change.
     - If neither action is specified, logs an informational message prompting the user to choose an action.
+    - With `--profile`, records the wall time, CPU time and peak memory of each stage and writes them
+      as JSON and as a Prometheus textfile.
     """
     parser = get_args()
 
     args = parser.parse_args()
 
+    if args.profile:
+        PROFILER.enable()
+    try:
+        with PROFILER.stage("main"):
+            run_command(args)
+    finally:
+        if args.profile:
+            write_profile_reports(PROFILER, args)
+
+
+def run_command(args):
+    """Run the action selected by the command-line arguments (see `main`).
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+    """
+    if args.import_inventory:
+        with PROFILER.stage("import_inventory"):
+            import_inventory(args)
+        return
+
+    if args.simulator_receivers:
+        write_simulator_receivers(args)
+        return
+
+    if args.convert_legacy_config and args.stream:
+        with PROFILER.stage("convert_legacy_config_streaming"):
+            convert_legacy_config_streaming(args)
+        return
+
     if args.convert_legacy_config:
-        new_receivers = convert_legacy_config(args)
+        with PROFILER.stage("convert_legacy_config"):
+            new_receivers = convert_legacy_config(args)
         if not new_receivers:
             return
-        logging.info(
-            "Converted the legacy config to the following "
-            "bigip_receivers.yaml output:\n\n%s",
-            yaml.dump(new_receivers, default_flow_style=False),
+        with PROFILER.stage("render_yaml"):
+            rendered = render_yaml(new_receivers)
+        emit_output(
+            f"{len(new_receivers)} converted receivers",
+            rendered,
+            args.receiver_input_file,
+            args.dry_run,
         )
         if not args.dry_run:
-            write_yaml_to_file(new_receivers, args.receiver_input_file)
+            with PROFILER.stage("write_files"):
+                write_yaml_to_file(
+                    new_receivers, args.receiver_input_file, rendered=rendered
+                )
+        return
+
+    if args.plan_capacity:
+        with PROFILER.stage("plan_capacity"):
+            run_capacity_plan(args)
+        return
+
+    if args.preflight:
+        with PROFILER.stage("preflight"):
+            run_preflight(args)
+        return
+
+    if args.tune_from:
+        with PROFILER.stage("tune_intervals"):
+            run_interval_tuning(args)
+        return
+
+    if args.watch:
+        try:
+            watch_configs(args)
+        except KeyboardInterrupt:
+            logging.info("Stopped watching.")
         return
 
     if args.generate_configs:
-        receiver_config, pipeline_config = generate_configs(args)
+        with PROFILER.stage("load_default_config"):
+            default_config = load_default_config(args)
+        if default_config is None:
+            return
+        with PROFILER.stage("generate_configs"):
+            receiver_config, pipeline_config = generate_configs(args, default_config)
         if not receiver_config or not pipeline_config:
             return
-        logging.info(
-            "Built the following pipeline file:\n\n%s",
-            yaml.dump(pipeline_config, default_flow_style=False),
-        )
-        logging.info(
-            "Built the following receiver file:\n\n%s",
-            yaml.dump(receiver_config, default_flow_style=False),
-        )
-        if not args.dry_run:
-            write_yaml_to_file(pipeline_config, args.pipelines_output_file)
-            write_yaml_to_file(receiver_config, args.receiver_output_file)
+        write_generated_configs(receiver_config, pipeline_config, default_config, args)
         return
 
     logging.info(
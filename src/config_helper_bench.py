@@ -0,0 +1,497 @@
+"""
+config_helper_bench.py
+
+Benchmark suite for config_helper.py against synthetic BigIP fleets.
+
+A synthetic fleet generator builds bigip_receivers.yaml inputs (and equivalent legacy big-ips.json
+inventories) of any size with a realistic mix of per-device overrides. Each stage of the config
+helper is then timed and memory-profiled on its own:
+
+- generate_configs: load both input files, merge receivers, plan the schedule and build pipelines.
+- convert_legacy_config: load and convert a legacy big-ips.json inventory.
+- deep_merge: the original per-receiver deepcopy + deep_merge.
+- generate_receiver_configs: the copy-on-write receiver merge.
+- validate_receiver_configs: check every merged receiver against the receiver schema.
+- assemble_pipelines: attach every receiver to its pipeline.
+- render_yaml: render the receivers output file (without the render cache).
+
+Wall time is the best of --repeat runs without tracing; memory is the tracemalloc peak of a
+separate traced run. Results can be stored as a baseline file and later runs compared against it,
+failing (exit code 1) when any stage regresses by more than --threshold.
+
+Command-Line Interface:
+- --sizes: Comma separated fleet sizes (default: 100,1000,10000,50000).
+- --stages: Comma separated stages to run (default: all).
+- --repeat: Timed runs per stage; the fastest is reported (default: 3).
+- --save-baseline: Write the results to this baseline file.
+- --compare: Compare the results with this baseline file.
+- --threshold: Allowed fractional regression in time or memory when comparing (default: 0.25).
+- --compare-merge: Print the legacy vs copy-on-write merge comparison table instead.
+
+Usage Example:
+    python ./src/config_helper_bench.py --sizes 100,1000 --save-baseline ./bench_baseline.json
+    python ./src/config_helper_bench.py --sizes 100,1000 --compare ./bench_baseline.json
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from copy import deepcopy
+
+import yaml
+
+from config_helper import (
+    NoAliasDumper,
+    assemble_pipelines,
+    convert_legacy_config,
+    deep_merge,
+    generate_configs,
+    generate_receiver_configs,
+    get_args as get_config_helper_args,
+    load_yaml,
+    render_receiver_configs,
+    validate_receiver_configs,
+)
+
+STAGES = [
+    "generate_configs",
+    "convert_legacy_config",
+    "deep_merge",
+    "generate_receiver_configs",
+    "validate_receiver_configs",
+    "assemble_pipelines",
+    "render_yaml",
+]
+# Differences below these are treated as noise when comparing against a baseline.
+MIN_SECONDS_DELTA = 0.005
+MIN_BYTES_DELTA = 64 * 1024
+
+
+def synthetic_receivers(count, default_receiver_config):
+    """Build a synthetic bigip_receivers.yaml style dictionary.
+
+    Most devices only set an endpoint; a realistic fraction override the collection interval,
+    credentials, TLS settings or enable extra data_types.
+
+    Args:
+        count (int): The number of receivers to generate.
+        default_receiver_config (dict): The bigip_receiver_defaults section, used to pick
+                                        data_types to override.
+
+    Returns:
+        dict: A dictionary of "bigip/{index}" keys to receiver override configs.
+    """
+    data_types = sorted(default_receiver_config.get("data_types", {}))
+    receivers = {}
+    for idx in range(1, count + 1):
+        receiver = {
+            "endpoint": f"https://10.{idx >> 16 & 255}.{idx >> 8 & 255}.{idx & 255}"
+        }
+        if idx % 4 == 0:
+            receiver["collection_interval"] = "30s"
+            receiver["timeout"] = "20s"
+        if idx % 7 == 0:
+            receiver["password"] = f"${{env:BIGIP_PASSWORD_{idx}}}"
+        if idx % 5 == 0:
+            receiver["tls"] = {"insecure_skip_verify": True}
+        if idx % 3 == 0 and data_types:
+            receiver["data_types"] = {
+                data_types[idx % len(data_types)]: {"enabled": True}
+            }
+        if idx % 11 == 0:
+            receiver["pipeline"] = "metrics/local"
+        receivers[f"bigip/{idx}"] = receiver
+    return receivers
+
+
+def synthetic_legacy_config(count):
+    """Build a synthetic legacy big-ips.json inventory equivalent to `synthetic_receivers`.
+
+    Args:
+        count (int): The number of devices to generate.
+
+    Returns:
+        list: A list of legacy device dictionaries.
+    """
+    devices = []
+    for idx in range(1, count + 1):
+        device = {
+            "endpoint": f"https://10.{idx >> 16 & 255}.{idx >> 8 & 255}.{idx & 255}",
+            "username": "admin",
+            "password_env_ref": "BIGIP_PASSWORD_1",
+            "collection_interval": 60,
+            "tls_insecure_skip_verify": False,
+            "ca_file": "",
+        }
+        if idx % 4 == 0:
+            device["collection_interval"] = 30
+        if idx % 7 == 0:
+            device["password_env_ref"] = f"BIGIP_PASSWORD_{idx}"
+        if idx % 5 == 0:
+            device["tls_insecure_skip_verify"] = True
+        devices.append(device)
+    return devices
+
+
+def legacy_generate_receiver_configs(receiver_input_configs, default_config):
+    """The original deepcopy + deep_merge implementation, kept for comparison."""
+    merged_config = {}
+    for k, v in receiver_input_configs.items():
+        defaults = deepcopy(default_config.get("bigip_receiver_defaults"))
+        this_cfg = deepcopy(v)
+        if this_cfg.get("pipeline"):
+            del this_cfg["pipeline"]
+        merged_config[k] = deep_merge(defaults, this_cfg)
+    return merged_config
+
+
+def measure(func, *args):
+    """Run func(*args), returning (result, wall seconds, tracemalloc peak bytes)."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def profile_stage(func, repeat):
+    """Time and memory-profile a zero-argument callable.
+
+    Args:
+        func (callable): The stage to run.
+        repeat (int): The number of untraced timed runs; the fastest is reported.
+
+    Returns:
+        dict: The stage result with "seconds", "cpu_seconds" and "peak_bytes".
+    """
+    best_wall = best_cpu = None
+    for _ in range(max(repeat, 1)):
+        gc.collect()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        func()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        if best_wall is None or wall < best_wall:
+            best_wall, best_cpu = wall, cpu
+    _, _, peak = measure(func)
+    return {"seconds": best_wall, "cpu_seconds": best_cpu, "peak_bytes": peak}
+
+
+class SyntheticFleet:
+    """Synthetic inputs for one fleet size, written to a temporary directory."""
+
+    def __init__(self, size, default_config, tmp_dir):
+        self.size = size
+        self.default_config = default_config
+        self.receivers = synthetic_receivers(
+            size, default_config.get("bigip_receiver_defaults", {})
+        )
+        self.legacy = synthetic_legacy_config(size)
+        default_path = os.path.join(tmp_dir, "ast_defaults.yaml")
+        receiver_path = os.path.join(tmp_dir, f"bigip_receivers_{size}.yaml")
+        legacy_path = os.path.join(tmp_dir, f"big-ips_{size}.json")
+        with open(default_path, "w") as f:
+            yaml.dump(default_config, f, Dumper=NoAliasDumper)
+        with open(receiver_path, "w") as f:
+            yaml.dump(self.receivers, f, Dumper=NoAliasDumper)
+        with open(legacy_path, "w") as f:
+            json.dump(self.legacy, f)
+        self.args = get_config_helper_args().parse_args(
+            [
+                "--no-cache",
+                "--default-config-file",
+                default_path,
+                "--receiver-input-file",
+                receiver_path,
+                "--legacy-config-file",
+                legacy_path,
+            ]
+        )
+        self.merged = generate_receiver_configs(self.receivers, default_config)
+
+    def stages(self):
+        """Return a dictionary of stage name to zero-argument callable."""
+        pipelines = self.default_config.get("pipelines", {})
+        pipeline_default = self.default_config.get("pipeline_default")
+        return {
+            "generate_configs": lambda: generate_configs(self.args),
+            "convert_legacy_config": lambda: convert_legacy_config(self.args),
+            "deep_merge": lambda: legacy_generate_receiver_configs(
+                self.receivers, self.default_config
+            ),
+            "generate_receiver_configs": lambda: generate_receiver_configs(
+                self.receivers, self.default_config
+            ),
+            "validate_receiver_configs": lambda: validate_receiver_configs(
+                self.merged, self.default_config
+            ),
+            "assemble_pipelines": lambda: assemble_pipelines(
+                "pipeline",
+                pipeline_default,
+                self.receivers,
+                deepcopy(pipelines),
+                self.args.receiver_input_file,
+            ),
+            "render_yaml": lambda: render_receiver_configs(self.merged),
+        }
+
+
+def run_suite(sizes, stages, default_config, repeat):
+    """Run the selected stages for each fleet size.
+
+    Args:
+        sizes (list): Fleet sizes to benchmark.
+        stages (list): Names of the stages to run.
+        default_config (dict): The parsed ast_defaults.yaml contents.
+        repeat (int): Timed runs per stage.
+
+    Returns:
+        dict: Results keyed by fleet size (as a string), then stage name.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            fleet = SyntheticFleet(size, default_config, tmp_dir)
+            available = fleet.stages()
+            results[str(size)] = {}
+            for stage in stages:
+                results[str(size)][stage] = profile_stage(available[stage], repeat)
+            del fleet
+    return results
+
+
+def compare_results(results, baseline, threshold):
+    """Compare results with a baseline, returning a list of regression descriptions.
+
+    A stage regresses when its time or memory grows by more than threshold (a fraction), and
+    by more than a small absolute amount to ignore noise on tiny stages. Stages or sizes missing
+    from the baseline are not compared.
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, current in stages.items():
+            previous = baseline.get(size, {}).get(stage)
+            if not previous:
+                continue
+            for metric, min_delta in [
+                ("seconds", MIN_SECONDS_DELTA),
+                ("peak_bytes", MIN_BYTES_DELTA),
+            ]:
+                before, after = previous[metric], current[metric]
+                if after > before * (1 + threshold) and after - before > min_delta:
+                    regressions.append(
+                        f"{stage} @ {size} receivers: {metric} {before:.4g} -> {after:.4g} "
+                        f"(+{(after / max(before, 1e-12) - 1) * 100:.0f}%)"
+                    )
+    return regressions
+
+
+def print_results(results, baseline=None):
+    """Print suite results as a fixed-width table, with the change against baseline if given."""
+    print(
+        f"{'receivers':>10} {'stage':<26} {'wall s':>9} {'cpu s':>9} "
+        f"{'peak MiB':>9} {'vs base':>8}"
+    )
+    for size, stages in results.items():
+        for stage, row in stages.items():
+            change = ""
+            previous = (baseline or {}).get(size, {}).get(stage)
+            if previous and previous["seconds"]:
+                change = f"{(row['seconds'] / previous['seconds'] - 1) * 100:+.0f}%"
+            print(
+                f"{size:>10} {stage:<26} {row['seconds']:>9.4f} "
+                f"{row['cpu_seconds']:>9.4f} {row['peak_bytes'] / 2**20:>9.2f} "
+                f"{change:>8}"
+            )
+
+
+def bench_merge(sizes, default_config, verify):
+    """Benchmark the legacy and copy-on-write merges for each fleet size.
+
+    Args:
+        sizes (list): Fleet sizes to benchmark.
+        default_config (dict): The parsed ast_defaults.yaml contents.
+        verify (bool): Whether to check the two merges render byte-identical YAML.
+
+    Returns:
+        list: One result row (dict) per fleet size.
+    """
+    rows = []
+    for size in sizes:
+        receivers = synthetic_receivers(
+            size, default_config.get("bigip_receiver_defaults", {})
+        )
+        legacy, legacy_time, legacy_peak = measure(
+            legacy_generate_receiver_configs, receivers, default_config
+        )
+        cow, cow_time, cow_peak = measure(
+            generate_receiver_configs, receivers, default_config
+        )
+        identical = None
+        if verify:
+            identical = yaml.dump(legacy, default_flow_style=False) == yaml.dump(
+                cow, Dumper=NoAliasDumper, default_flow_style=False
+            )
+        rows.append(
+            {
+                "receivers": size,
+                "legacy_seconds": legacy_time,
+                "legacy_peak_bytes": legacy_peak,
+                "cow_seconds": cow_time,
+                "cow_peak_bytes": cow_peak,
+                "identical": identical,
+            }
+        )
+        del legacy, cow
+    return rows
+
+
+def print_merge_table(rows):
+    """Print benchmark rows as a fixed-width table."""
+    print(
+        f"{'receivers':>10} {'legacy s':>10} {'legacy MiB':>11} "
+        f"{'cow s':>10} {'cow MiB':>10} {'speedup':>8} {'identical':>10}"
+    )
+    for row in rows:
+        print(
+            f"{row['receivers']:>10} {row['legacy_seconds']:>10.3f} "
+            f"{row['legacy_peak_bytes'] / 2**20:>11.1f} {row['cow_seconds']:>10.3f} "
+            f"{row['cow_peak_bytes'] / 2**20:>10.1f} "
+            f"{row['legacy_seconds'] / max(row['cow_seconds'], 1e-9):>7.1f}x "
+            f"{'-' if row['identical'] is None else str(row['identical']):>10}"
+        )
+
+
+def get_args():
+    """Initialize the argument parser.
+
+    Returns:
+        parser: argumentparser object with benchmark arguments specified.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark config_helper against synthetic BigIP fleets."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=str,
+        default="100,1000,10000,50000",
+        help="Comma separated fleet sizes to benchmark (default: 100,1000,10000,50000).",
+    )
+    parser.add_argument(
+        "--stages",
+        type=str,
+        default=",".join(STAGES),
+        help=f"Comma separated stages to run (default: {','.join(STAGES)}).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Timed runs per stage, the fastest is reported (default: 3).",
+    )
+    parser.add_argument(
+        "--default-config-file",
+        type=str,
+        default="./config/ast_defaults.yaml",
+        help="Path to the default settings file (default: ./config/ast_defaults.yaml).",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        type=str,
+        help="Write the results to this baseline file.",
+    )
+    parser.add_argument(
+        "--compare",
+        type=str,
+        help="Compare the results with this baseline file and fail on regressions.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Allowed fractional regression in time or memory when comparing (default: 0.25).",
+    )
+    parser.add_argument(
+        "--compare-merge",
+        action="store_true",
+        help="Print the legacy deepcopy vs copy-on-write merge comparison instead.",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="With --compare-merge, also check both merges render byte-identical YAML.",
+    )
+    return parser
+
+
+def main():
+    """Run the benchmark suite and print, store or compare the results.
+
+    Returns:
+        int: The process exit code, 1 if a regression against the baseline was found.
+    """
+    args = get_args().parse_args()
+    default_config = load_yaml(args.default_config_file)
+    if not default_config:
+        return 1
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    if args.compare_merge:
+        print_merge_table(bench_merge(sizes, default_config, args.verify))
+        return 0
+
+    stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        logging.error("Unknown stages: %s", ", ".join(sorted(unknown)))
+        return 1
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)["results"]
+
+    # The stages log every step; keep the output to the results table.
+    logging.disable(logging.WARNING)
+    try:
+        results = run_suite(sizes, stages, default_config, args.repeat)
+    finally:
+        logging.disable(logging.NOTSET)
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "libyaml": yaml.__with_libyaml__,
+                    "results": results,
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        logging.info("Saved baseline to '%s'.", args.save_baseline)
+
+    if baseline is not None:
+        regressions = compare_results(results, baseline, args.threshold)
+        for regression in regressions:
+            logging.error("Regression: %s", regression)
+        if regressions:
+            return 1
+        logging.info("No stage regressed by more than %.0f%%.", args.threshold * 100)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import unittest
+
+from config_helper import transform_receiver_configs
+from config_helper_bench import (
+    compare_results,
+    synthetic_legacy_config,
+    synthetic_receivers,
+)
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def test_synthetic_fleet_sizes(self):
+        defaults = {"data_types": {"f5.dns": {"enabled": False}}}
+
+        self.assertEqual(len(synthetic_receivers(250, defaults)), 250)
+        self.assertEqual(len(synthetic_legacy_config(250)), 250)
+
+    def test_synthetic_legacy_config_converts_to_overrides(self):
+        defaults = {
+            "collection_interval": "60s",
+            "username": "admin",
+            "password": "${env:BIGIP_PASSWORD_1}",
+            "tls": {"insecure_skip_verify": False, "ca_file": ""},
+        }
+
+        converted = transform_receiver_configs(synthetic_legacy_config(20), defaults)
+
+        self.assertEqual(converted["bigip/1"]["endpoint"], "https://10.0.0.1")
+        self.assertNotIn("username", converted["bigip/1"])
+        self.assertNotIn("tls", converted["bigip/1"])
+        self.assertEqual(converted["bigip/4"]["collection_interval"], "30s")
+        self.assertEqual(converted["bigip/5"]["tls"], {"insecure_skip_verify": True})
+
+    def test_compare_results_flags_regressions_beyond_threshold(self):
+        baseline = {
+            "1000": {
+                "render_yaml": {"seconds": 1.0, "peak_bytes": 10_000_000},
+                "deep_merge": {"seconds": 0.001, "peak_bytes": 1000},
+            }
+        }
+        results = {
+            "1000": {
+                "render_yaml": {"seconds": 1.2, "peak_bytes": 20_000_000},
+                "deep_merge": {"seconds": 0.002, "peak_bytes": 2000},
+            }
+        }
+
+        regressions = compare_results(results, baseline, 0.25)
+
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("render_yaml", regressions[0])
+        self.assertIn("peak_bytes", regressions[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,74 @@
+import asyncio
+import socket
 import unittest
 from unittest.mock import patch, MagicMock
+import io
+import json
 import logging
+import os
+import tempfile
+import tracemalloc
 import yaml
+from copy import deepcopy
+
+import config_helper
+from bigip_simulator import SIMULATED_COUNTS, SimulatedDevice, start_device
 
 # Assuming the convert_legacy_config function is in a module named my_module
 from config_helper import (
+    DATA_TYPE_SERIES_ESTIMATES,
+    NoAliasDumper,
+    INTERVAL_TUNING_DEFAULTS,
+    PREFLIGHT_DEFAULTS,
+    StageProfiler,
     convert_legacy_config,
+    cow_merge,
     deep_merge,
+    downsampling_rule_groups,
     generate_receiver_configs,
     generate_pipeline_configs,
     generate_configs,
+    assign_shards,
+    build_collector_overlay,
+    calibrate_series_estimates,
+    collect_scrape_telemetry,
+    convert_legacy_config_streaming,
+    estimate_scrape_cost,
+    get_args,
+    http_request,
+    import_inventory,
+    iter_json_array,
+    normalize_inventory_row,
+    transform_receiver_configs,
+    tune_receiver_intervals,
+    validate_receiver_configs,
+    load_receiver_config,
+    load_yaml,
+    metric_filter_conditions,
+    metric_filter_processors,
+    parse_duration,
+    parse_exposition,
+    parse_query_result,
+    partition_pipelines,
+    plan_capacity,
+    plan_scrape_schedule,
+    probe_receivers,
+    recommend_timeouts,
+    regenerate_configs,
+    render_receiver_configs,
+    split_filtered_pipelines,
+    split_pipeline_configs,
+    summarize_output,
+    render_yaml,
+    run_capacity_plan,
+    run_command,
+    run_interval_tuning,
+    simulator_receivers,
+    resolve_profile_chain,
+    watch_configs,
+    write_downsampling_tier,
+    write_generated_configs,
+    write_yaml_to_file,
 )
 
 
@@ -117,6 +176,277 @@ class TestConvertLegacyConfig(unittest.TestCase):
         self.assertIsNone(result)
 
 
+class TestStreamingLegacyConversion(unittest.TestCase):
+
+    def setUp(self):
+        self.defaults = {
+            "bigip_receiver_defaults": {
+                "collection_interval": "60s",
+                "username": "admin",
+                "tls": {"insecure_skip_verify": False, "ca_file": ""},
+            }
+        }
+        self.legacy = [
+            {
+                "endpoint": f"https://10.0.0.{idx}",
+                "username": "admin" if idx % 2 else "telemetry",
+                "collection_interval": 60 if idx % 3 else 30,
+                "tls_insecure_skip_verify": idx % 5 == 0,
+            }
+            for idx in range(1, 26)
+        ]
+
+    def test_iter_json_array_across_read_boundaries(self):
+        items = [1234567, {"a": [1, 2, {"b": "x,]"}]}, "s", None, 1.5e10, []]
+        text = " [ " + " , ".join(json.dumps(item) for item in items) + " ] "
+
+        for read_size in [1, 3, 7, 1024]:
+            self.assertEqual(list(iter_json_array(io.StringIO(text), read_size)), items)
+        self.assertEqual(list(iter_json_array(io.StringIO("[]"))), [])
+
+    def test_iter_json_array_rejects_invalid_input(self):
+        for text in ['{"a": 1}', "[1, 2", "[1 2]", "[1,,2]"]:
+            with self.assertRaises(json.JSONDecodeError):
+                list(iter_json_array(io.StringIO(text), 2))
+
+    def convert(self, workers):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = {
+                name: os.path.join(tmp, name)
+                for name in ["defaults.yaml", "big-ips.json", "receivers.yaml"]
+            }
+            with open(paths["defaults.yaml"], "w") as f:
+                yaml.dump(self.defaults, f)
+            with open(paths["big-ips.json"], "w") as f:
+                json.dump(self.legacy, f)
+            args = get_args().parse_args(
+                [
+                    "--convert-legacy-config",
+                    "--stream",
+                    "--no-cache",
+                    f"--workers={workers}",
+                    "--chunk-size=4",
+                    f"--default-config-file={paths['defaults.yaml']}",
+                    f"--legacy-config-file={paths['big-ips.json']}",
+                    f"--receiver-input-file={paths['receivers.yaml']}",
+                ]
+            )
+            count = convert_legacy_config_streaming(args)
+            with open(paths["receivers.yaml"]) as f:
+                text = f.read()
+        return count, text
+
+    def test_streaming_conversion_matches_in_memory_conversion(self):
+        expected = transform_receiver_configs(
+            self.legacy, self.defaults["bigip_receiver_defaults"]
+        )
+
+        for workers in [1, 2]:
+            count, text = self.convert(workers)
+            self.assertEqual(count, 25)
+            self.assertEqual(yaml.safe_load(text), expected)
+            keys = [line.split(":")[0] for line in text.splitlines() if line[0] != " "]
+            self.assertEqual(keys, [f"bigip/{idx}" for idx in range(1, 26)])
+
+    def test_streaming_conversion_removes_partial_output_on_write_error(self):
+        def failing_conversion(*args):
+            yield 1, "bigip/1:\n  endpoint: https://10.0.0.1\n"
+            raise OSError("No space left on device")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = {
+                name: os.path.join(tmp, name)
+                for name in ["defaults.yaml", "big-ips.json", "receivers.yaml"]
+            }
+            with open(paths["defaults.yaml"], "w") as f:
+                yaml.dump(self.defaults, f)
+            with open(paths["big-ips.json"], "w") as f:
+                json.dump(self.legacy, f)
+            args = get_args().parse_args(
+                [
+                    "--convert-legacy-config",
+                    "--stream",
+                    "--no-cache",
+                    f"--default-config-file={paths['defaults.yaml']}",
+                    f"--legacy-config-file={paths['big-ips.json']}",
+                    f"--receiver-input-file={paths['receivers.yaml']}",
+                ]
+            )
+            with patch(
+                "config_helper.stream_legacy_conversion", failing_conversion
+            ), patch("logging.error"):
+                self.assertIsNone(convert_legacy_config_streaming(args))
+
+            self.assertEqual(sorted(os.listdir(tmp)), ["big-ips.json", "defaults.yaml"])
+
+
+class TestInventoryImport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.defaults_path = os.path.join(self.tmp.name, "defaults.yaml")
+        self.output_path = os.path.join(self.tmp.name, "receivers.yaml")
+        with open(self.defaults_path, "w") as f:
+            yaml.dump(
+                {
+                    "bigip_receiver_defaults": {
+                        "collection_interval": "60s",
+                        "username": "admin",
+                        "tls": {"insecure_skip_verify": False, "ca_file": ""},
+                    }
+                },
+                f,
+            )
+
+    def run_import(self, filename, content, *extra):
+        path = os.path.join(self.tmp.name, filename)
+        with open(path, "w") as f:
+            f.write(content)
+        args = get_args().parse_args(
+            [
+                f"--import-inventory={path}",
+                "--no-cache",
+                f"--default-config-file={self.defaults_path}",
+                f"--receiver-input-file={self.output_path}",
+                *extra,
+            ]
+        )
+        return import_inventory(args)
+
+    def read_rejects(self):
+        with open(os.path.join(self.tmp.name, "receivers.rejects.jsonl")) as f:
+            return [json.loads(line) for line in f]
+
+    def test_normalize_inventory_row(self):
+        row = {
+            "mgmt_ip": "10.0.0.1",
+            "collection_interval": "30",
+            "tls_insecure_skip_verify": "Yes",
+            "site": "dc1",
+            "ca_file": "",
+            "timeout": "20",
+        }
+
+        self.assertEqual(
+            normalize_inventory_row(row, {"mgmt_ip": "endpoint"}),
+            {
+                "endpoint": "https://10.0.0.1",
+                "collection_interval": 30,
+                "tls_insecure_skip_verify": True,
+                "timeout": "20s",
+            },
+        )
+        self.assertEqual(
+            normalize_inventory_row({"endpoint": "a", "timeout": "1m30s"}, {})[
+                "timeout"
+            ],
+            "1m30s",
+        )
+        for bad in [
+            {"username": "x"},
+            {"endpoint": "a", "collection_interval": "1m"},
+            {"endpoint": "a", "timeout": "20 sec"},
+        ]:
+            with self.assertRaises(ValueError):
+                normalize_inventory_row(bad, {})
+
+    def test_import_csv_writes_only_overrides_and_rejects(self):
+        count = self.run_import(
+            "inventory.csv",
+            "hostname,mgmt_ip,user,collection_interval\n"
+            "lb1,10.0.0.1,admin,60\n"
+            "bigip/lb2,10.0.0.2,telemetry,30\n"
+            "lb3,,admin,60\n"
+            "bigip/lb1,10.0.0.9,admin,60\n",
+            "--column-map=hostname=name,mgmt_ip=endpoint,user=username",
+        )
+
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            load_yaml(self.output_path),
+            {
+                "bigip/lb1": {"endpoint": "https://10.0.0.1"},
+                "bigip/lb2": {
+                    "endpoint": "https://10.0.0.2",
+                    "username": "telemetry",
+                    "collection_interval": "30s",
+                },
+            },
+        )
+        rejects = self.read_rejects()
+        self.assertEqual([r["line"] for r in rejects], [4, 5])
+        self.assertEqual(rejects[0]["error"], "Missing endpoint")
+        self.assertIn("Duplicate", rejects[1]["error"])
+
+    def test_import_jsonl_matches_legacy_conversion(self):
+        legacy = [
+            {"endpoint": "https://10.0.0.1", "username": "admin"},
+            {"endpoint": "https://10.0.0.2", "tls_insecure_skip_verify": True},
+        ]
+        content = "\n".join(json.dumps(item) for item in legacy)
+
+        count = self.run_import("inventory.jsonl", content + "\nnot json\n")
+
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            load_yaml(self.output_path),
+            transform_receiver_configs(
+                legacy, {"username": "admin", "tls": {"insecure_skip_verify": False}}
+            ),
+        )
+        self.assertEqual(self.read_rejects()[0]["line"], 3)
+
+
+class TestSimulatorReceivers(unittest.TestCase):
+
+    def test_simulator_receivers(self):
+        receivers = simulator_receivers(3, "https://127.0.0.1:8443")
+
+        self.assertEqual(
+            receivers["bigip/sim-2"],
+            {
+                "endpoint": "https://127.0.0.1:8445",
+                "tls": {"insecure_skip_verify": True},
+            },
+        )
+        self.assertEqual(
+            simulator_receivers(1, "http://[::1]:80"),
+            {"bigip/sim-0": {"endpoint": "http://[::1]:80"}},
+        )
+        for bad in ["127.0.0.1:8443", "https://127.0.0.1", "ftp://host:21"]:
+            with self.assertLogs(level="ERROR"):
+                self.assertIsNone(simulator_receivers(1, bad))
+
+    def test_write_simulator_receivers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            inventory = os.path.join(tmp, "bigip_receivers.yaml")
+            path = os.path.join(tmp, "bigip_receivers.simulator.yaml")
+            with open(inventory, "w") as f:
+                f.write("bigip/1:\n  endpoint: https://10.0.0.1\n")
+            args = get_args().parse_args(
+                [
+                    "--simulator-receivers=50",
+                    "--simulator-endpoint=http://localhost:9000",
+                    f"--receiver-input-file={inventory}",
+                    f"--simulator-output-file={path}",
+                ]
+            )
+
+            run_command(args)
+
+            receivers = load_yaml(path)
+            # The real inventory is left alone.
+            self.assertEqual(list(load_yaml(inventory)), ["bigip/1"])
+        self.assertEqual(len(receivers), 50)
+        self.assertEqual(
+            receivers["bigip/sim-49"], {"endpoint": "http://localhost:9049"}
+        )
+        self.assertEqual(
+            validate_receiver_configs(receivers, {"bigip_receiver_defaults": {}}), []
+        )
+
+
 class TestConfigFunctions(unittest.TestCase):
 
     def test_deep_merge(self):
@@ -156,6 +486,65 @@ class TestConfigFunctions(unittest.TestCase):
         result = generate_receiver_configs(receiver_input_configs, default_config)
         self.assertEqual(result, expected_output)
 
+    def test_cow_merge_shares_untouched_subtrees(self):
+        base = {
+            "collection_interval": "60s",
+            "data_types": {"f5.dns": {"enabled": False}, "f5.gtm": {"enabled": False}},
+            "tls": {"insecure_skip_verify": False, "ca_file": ""},
+        }
+        overrides = {"data_types": {"f5.gtm": {"enabled": True}}, "timeout": "20s"}
+
+        result = cow_merge(base, overrides)
+
+        self.assertEqual(
+            result,
+            {
+                "collection_interval": "60s",
+                "data_types": {
+                    "f5.dns": {"enabled": False},
+                    "f5.gtm": {"enabled": True},
+                },
+                "tls": {"insecure_skip_verify": False, "ca_file": ""},
+                "timeout": "20s",
+            },
+        )
+        self.assertIs(result["tls"], base["tls"])
+        self.assertIs(result["data_types"]["f5.dns"], base["data_types"]["f5.dns"])
+        self.assertFalse(base["data_types"]["f5.gtm"]["enabled"])
+        self.assertNotIn("timeout", base)
+
+    def test_generate_receiver_configs_matches_deep_merge_output(self):
+        default_config = {
+            "bigip_receiver_defaults": {
+                "collection_interval": "60s",
+                "data_types": {"f5.dns": {"enabled": False}},
+                "tls": {"insecure_skip_verify": False, "ca_file": ""},
+            }
+        }
+        receiver_input_configs = {
+            "bigip/1": {"endpoint": "https://10.0.0.1"},
+            "bigip/2": {
+                "endpoint": "https://10.0.0.2",
+                "pipeline": "metrics/local",
+                "tls": {"insecure_skip_verify": True},
+            },
+        }
+        expected = {}
+        for k, v in receiver_input_configs.items():
+            this_cfg = deepcopy(v)
+            this_cfg.pop("pipeline", None)
+            expected[k] = deep_merge(
+                deepcopy(default_config["bigip_receiver_defaults"]), this_cfg
+            )
+
+        result = generate_receiver_configs(receiver_input_configs, default_config)
+
+        self.assertEqual(
+            yaml.dump(result, Dumper=NoAliasDumper, default_flow_style=False),
+            yaml.dump(expected, default_flow_style=False),
+        )
+        self.assertIn("pipeline", receiver_input_configs["bigip/2"])
+
     @patch("config_helper.logging.error")
     def test_generate_pipeline_configs_no_pipeline(self, mock_error):
         receiver_input_configs = {"receiver1": {"pipeline": "pipeline1"}}
@@ -167,6 +556,23 @@ class TestConfigFunctions(unittest.TestCase):
         self.assertIsNone(result)
         mock_error.assert_called_once()
 
+    @patch("config_helper.logging.error")
+    def test_generate_pipeline_configs_no_default_pipeline_logs_summary(
+        self, mock_error
+    ):
+        default_config = {
+            "bigip_receiver_defaults": {f"key{i}": "x" * 100 for i in range(100)},
+            "pipelines": {"metrics/local": {}},
+        }
+        args = MagicMock()
+        args.default_config_file = "ast_defaults.yaml"
+
+        result = generate_pipeline_configs({}, default_config, args)
+
+        self.assertIsNone(result)
+        message = mock_error.call_args[0][0] % mock_error.call_args[0][1:]
+        self.assertLess(len(message), 200)
+
     @patch("config_helper.load_default_config")
     @patch("config_helper.load_receiver_config")
     @patch("config_helper.logging.info")
@@ -279,5 +685,1465 @@ class TestConfigFunctions(unittest.TestCase):
         )
 
 
+class TestIncrementalOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.receivers = {
+            "bigip/2": {"endpoint": "https://10.0.0.2", "tls": {"ca_file": ""}},
+            "bigip/1": {"endpoint": "https://10.0.0.1", "tls": {"ca_file": ""}},
+        }
+
+    def test_render_receiver_configs_matches_full_render(self):
+        rendered, cache = render_receiver_configs(self.receivers)
+
+        self.assertEqual(rendered, render_yaml(self.receivers))
+        self.assertEqual(sorted(cache), ["bigip/1", "bigip/2"])
+
+    def test_render_receiver_configs_reuses_unchanged_receivers(self):
+        _, cache = render_receiver_configs(self.receivers)
+        cache["bigip/1"]["yaml"] = "bigip/1: cached\n"
+        cache["bigip/2"]["yaml"] = "bigip/2: cached\n"
+        self.receivers["bigip/2"] = {"endpoint": "https://10.0.0.22"}
+
+        rendered, new_cache = render_receiver_configs(self.receivers, cache)
+
+        self.assertTrue(rendered.startswith("bigip/1: cached\n"))
+        self.assertIn("endpoint: https://10.0.0.22", rendered)
+        self.assertNotEqual(new_cache["bigip/2"]["hash"], cache["bigip/2"]["hash"])
+
+    def test_summarize_output(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "receivers.yaml")
+            rendered = render_yaml(self.receivers)
+
+            self.assertIn("(new file)", summarize_output(rendered, path))
+            write_yaml_to_file(self.receivers, path, rendered=rendered)
+            self.assertIn("(unchanged)", summarize_output(rendered, path))
+            self.receivers["bigip/1"]["endpoint"] = "https://10.0.0.11"
+            self.receivers["bigip/3"] = {"endpoint": "https://10.0.0.3"}
+            summary = summarize_output(render_yaml(self.receivers), path)
+
+        self.assertIn("(+3 -1 lines)", summary)
+
+    def test_write_yaml_to_file_skips_unchanged_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "receivers.yaml")
+
+            self.assertTrue(write_yaml_to_file(self.receivers, path))
+            mtime = os.stat(path).st_mtime_ns
+            self.assertFalse(write_yaml_to_file(self.receivers, path))
+            self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+            self.receivers["bigip/3"] = {"endpoint": "https://10.0.0.3"}
+            self.assertTrue(write_yaml_to_file(self.receivers, path))
+
+
+class TestScrapeSchedule(unittest.TestCase):
+
+    def setUp(self):
+        self.receiver_input_configs = {
+            f"bigip/{idx}": {"endpoint": f"https://10.0.0.{idx}"}
+            for idx in range(1, 121)
+        }
+        self.receiver_input_configs["bigip/1"]["collection_interval"] = "30s"
+        self.receiver_input_configs["bigip/1"]["timeout"] = "20s"
+        self.receiver_input_configs["bigip/2"]["initial_delay"] = "3s"
+        self.default_config = {
+            "bigip_receiver_defaults": {"collection_interval": "60s", "timeout": "60s"}
+        }
+
+    def plan(self):
+        receiver_output_configs = generate_receiver_configs(
+            self.receiver_input_configs, self.default_config
+        )
+        report = plan_scrape_schedule(
+            self.receiver_input_configs, receiver_output_configs, self.default_config
+        )
+        return receiver_output_configs, report
+
+    def test_reports_peak_and_timeout_conflicts(self):
+        self.receiver_input_configs["bigip/3"]["timeout"] = "90s"
+
+        receivers, report = self.plan()
+
+        self.assertEqual(report["peak_concurrency"], 120)
+        # A timeout equal to the collection_interval (the defaults) is a conflict too.
+        self.assertEqual(len(report["timeout_conflicts"]), 119)
+        self.assertNotIn("bigip/1", report["timeout_conflicts"])
+        self.assertIn("bigip/3", report["timeout_conflicts"])
+        self.assertEqual(report["rescheduled"], 0)
+        self.assertNotIn("initial_delay", receivers["bigip/3"])
+
+    def test_timeout_conflicts_are_summarized(self):
+        with self.assertLogs(level="WARNING") as logs:
+            self.plan()
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("119 receivers", logs.output[0])
+
+        self.default_config["scrape_schedule"] = {"warn_timeout_conflicts": False}
+        with patch("logging.warning") as warning:
+            _, report = self.plan()
+        warning.assert_not_called()
+        self.assertEqual(len(report["timeout_conflicts"]), 119)
+
+    def test_stagger_spreads_initial_delay(self):
+        self.default_config["scrape_schedule"] = {"stagger": True}
+
+        receivers, report = self.plan()
+
+        self.assertEqual(receivers["bigip/2"]["initial_delay"], "3s")
+        self.assertEqual(report["rescheduled"], 119)
+        self.assertLess(report["peak_concurrency"], 40)
+        self.assertNotIn(
+            "initial_delay", self.default_config["bigip_receiver_defaults"]
+        )
+
+    def test_spread_intervals_skips_explicit_intervals(self):
+        self.default_config["scrape_schedule"] = {"spread_intervals": ["55s", "65s"]}
+
+        receivers, _ = self.plan()
+
+        self.assertEqual(receivers["bigip/1"]["collection_interval"], "30s")
+        intervals = {cfg["collection_interval"] for cfg in receivers.values()}
+        self.assertEqual(intervals, {"30s", "55s", "65s"})
+
+    @patch("config_helper.load_receiver_config")
+    @patch("config_helper.load_default_config")
+    def test_spread_intervals_are_validated(self, mock_defaults, mock_receivers):
+        self.default_config["scrape_schedule"] = {"spread_intervals": ["45s"]}
+        mock_defaults.return_value = self.default_config
+        mock_receivers.return_value = {"bigip/1": {"endpoint": "https://10.0.0.1"}}
+        args = get_args().parse_args(["--generate-configs"])
+
+        with self.assertLogs(level="ERROR") as logs:
+            self.assertEqual(generate_configs(args), (None, None))
+        self.assertIn(
+            "timeout (60s) is greater than collection_interval (45s)", logs.output[0]
+        )
+
+    def test_schedule_keeps_profile_settings(self):
+        self.default_config["bigip_receiver_profiles"] = {
+            "slow": {"collection_interval": "300s"},
+            "lab": {"profile": "slow", "initial_delay": "7s"},
+        }
+        self.default_config["scrape_schedule"] = {
+            "spread_intervals": ["55s", "65s"],
+            "stagger": True,
+        }
+        for idx in range(3, 6):
+            self.receiver_input_configs[f"bigip/{idx}"]["profile"] = "lab"
+
+        receivers, _ = self.plan()
+
+        for idx in range(3, 6):
+            self.assertEqual(receivers[f"bigip/{idx}"]["collection_interval"], "300s")
+            self.assertEqual(receivers[f"bigip/{idx}"]["initial_delay"], "7s")
+        self.assertIn(receivers["bigip/6"]["collection_interval"], ["55s", "65s"])
+
+
+class TestReceiverValidation(unittest.TestCase):
+
+    def setUp(self):
+        self.default_config = {
+            "bigip_receiver_defaults": {
+                "collection_interval": "60s",
+                "timeout": "30s",
+                "username": "admin",
+                "password": "${env:BIGIP_PASSWORD_1}",
+                "tls": {"insecure_skip_verify": False, "ca_file": ""},
+                "data_types": {"f5.dns": {"enabled": False}},
+            }
+        }
+
+    def validate(self, receivers):
+        merged = generate_receiver_configs(receivers, self.default_config)
+        return validate_receiver_configs(merged, self.default_config)
+
+    def test_valid_receivers(self):
+        receivers = {
+            f"bigip/{idx}": {
+                "endpoint": f"https://10.0.0.{idx}",
+                "data_types": {"f5.gtm": {"enabled": True}},
+            }
+            for idx in range(1, 6)
+        }
+        receivers["bigip/6"] = {"endpoint": "https://10.0.0.6", "pipeline": "x"}
+
+        self.assertEqual(self.validate(receivers), [])
+
+    def test_pipeline_assignments_are_not_receiver_settings(self):
+        self.default_config["bigip_receiver_profiles"] = {
+            "lab": {"pipeline": "metrics/lab", "timeout": "20s"}
+        }
+        receivers = {
+            "bigip/1": {"endpoint": "https://10.0.0.1", "f5_pipeline": "metrics/f5"},
+            "bigip/2": {"endpoint": "https://10.0.0.2", "profile": "lab"},
+            "bigip/3": {"endpoint": "https://10.0.0.3", "pipeline": None},
+        }
+
+        merged = generate_receiver_configs(receivers, self.default_config)
+
+        self.assertEqual(validate_receiver_configs(merged, self.default_config), [])
+        for config in merged.values():
+            self.assertFalse({"pipeline", "f5_pipeline"} & set(config))
+        self.assertEqual(merged["bigip/2"]["timeout"], "20s")
+
+    def test_reports_every_error(self):
+        receivers = {
+            "bigip/1": {"endpoint": "https://10.0.0.1", "collection_interval": "6Os"},
+            "bigip/2": {"username": "admin"},
+            "f5/3": {"endpoint": "https://10.0.0.3"},
+            "bigip/4": {
+                "endpoint": "10.0.0.4",
+                "data_types": {"f5.gmt": {"enabled": True}},
+            },
+            "bigip/5": {"endpoint": "https://10.0.0.5", "timeout": "90s"},
+            "bigip/6": {"endpoint": "https://10.0.0.6", "tls": {"insecure": "no"}},
+            "bigip/7": {"endpoint": "https://10.0.0.7", "colection_interval": "5s"},
+        }
+
+        errors = self.validate(receivers)
+
+        self.assertEqual(len(errors), 8)
+        for expected in [
+            "bigip/1: collection_interval: invalid duration '6Os'",
+            "bigip/2: missing endpoint",
+            "f5/3: receiver name must be 'bigip/<name>'",
+            "bigip/4: endpoint must be an http(s) URL, got '10.0.0.4'",
+            "bigip/5: timeout (90s) is greater than collection_interval (60s)",
+            "bigip/6: tls.insecure must be a bool",
+            "bigip/7: unknown setting 'colection_interval'",
+        ]:
+            self.assertIn(expected, errors)
+        self.assertTrue(
+            any(e.startswith("bigip/4: unknown data type 'f5.gmt'") for e in errors)
+        )
+
+    @patch("config_helper.load_receiver_config")
+    @patch("config_helper.load_default_config")
+    def test_generate_configs_stops_on_errors(self, mock_defaults, mock_receivers):
+        mock_defaults.return_value = self.default_config
+        mock_receivers.return_value = {"bigip/1": {"timeout": "1h"}}
+        args = get_args().parse_args(["--generate-configs"])
+
+        with self.assertLogs(level="ERROR") as logs:
+            self.assertEqual(generate_configs(args), (None, None))
+        self.assertIn("2 errors found", logs.output[0])
+
+
+class TestReceiverFragments(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.fragments_dir = os.path.join(self.tmp.name, "receivers.d")
+        os.mkdir(self.fragments_dir)
+        self.receiver_file = os.path.join(self.tmp.name, "bigip_receivers.yaml")
+        with open(self.receiver_file, "w") as f:
+            f.write("bigip/main:\n  endpoint: https://10.0.0.1\n")
+        for team in range(10):
+            self.write_fragment(f"team-{team}.yaml", team)
+
+    def write_fragment(self, name, team):
+        with open(os.path.join(self.fragments_dir, name), "w") as f:
+            for idx in range(3):
+                f.write(f"bigip/{team}-{idx}:\n  endpoint: https://10.{team}.0.{idx}\n")
+
+    def args(self, *extra):
+        return get_args().parse_args(
+            [
+                "--generate-configs",
+                f"--receiver-input-file={self.receiver_file}",
+                f"--receiver-input-dir={self.fragments_dir}",
+                f"--parse-cache-dir={os.path.join(self.tmp.name, 'cache')}",
+                *extra,
+            ]
+        )
+
+    def test_fragments_are_merged_in_parallel(self):
+        with open(os.path.join(self.fragments_dir, "notes.txt"), "w") as f:
+            f.write("not yaml: [")
+
+        receivers = load_receiver_config(self.args("--workers=2"))
+
+        self.assertEqual(len(receivers), 31)
+        self.assertEqual(receivers["bigip/9-2"], {"endpoint": "https://10.9.0.2"})
+        self.assertEqual(list(receivers)[:2], ["bigip/main", "bigip/0-0"])
+
+    def test_unchanged_fragments_are_not_reparsed(self):
+        load_receiver_config(self.args("--workers=1"))
+        self.write_fragment("team-3.yaml", 33)
+
+        with patch(
+            "config_helper.parse_receiver_fragment",
+            wraps=config_helper.parse_receiver_fragment,
+        ) as parse:
+            receivers = load_receiver_config(self.args("--workers=1"))
+
+        parse.assert_called_once_with(os.path.join(self.fragments_dir, "team-3.yaml"))
+        self.assertIn("bigip/33-0", receivers)
+        self.assertNotIn("bigip/3-0", receivers)
+
+    def test_duplicates_and_bad_fragments_are_reported(self):
+        self.write_fragment("team-dup.yaml", 4)
+        with open(os.path.join(self.fragments_dir, "list.yml"), "w") as f:
+            f.write("- bigip/x\n")
+        with open(os.path.join(self.fragments_dir, "broken.yaml"), "w") as f:
+            f.write("bigip/y: [\n")
+
+        with self.assertLogs(level="ERROR") as logs:
+            self.assertIsNone(load_receiver_config(self.args("--no-cache")))
+
+        self.assertIn("5 errors loading the receiver settings", logs.output[0])
+        self.assertIn(
+            f"bigip/4-0 is defined in both {self.fragments_dir}/team-4.yaml and "
+            f"{self.fragments_dir}/team-dup.yaml",
+            logs.output[0],
+        )
+        self.assertIn("list.yml: expected a mapping of receivers", logs.output[0])
+        self.assertIn("broken.yaml: ", logs.output[0])
+
+    def test_receiver_file_is_optional_with_fragments(self):
+        os.remove(self.receiver_file)
+
+        self.assertEqual(len(load_receiver_config(self.args())), 30)
+
+
+class TestReceiverProfiles(unittest.TestCase):
+
+    def setUp(self):
+        self.default_config = {
+            "bigip_receiver_defaults": {
+                "collection_interval": "60s",
+                "data_types": {
+                    "f5.policy.asm": {"enabled": False},
+                    "f5.gtm": {"enabled": False},
+                },
+                "tls": {"insecure_skip_verify": False},
+            },
+            "bigip_receiver_profiles": {
+                "edge": {"collection_interval": "30s"},
+                "asm-edge": {
+                    "profile": "edge",
+                    "data_types": {"f5.policy.asm": {"enabled": True}},
+                },
+                "lab": {"tls": {"insecure_skip_verify": True}},
+            },
+        }
+
+    def test_resolve_profile_chain(self):
+        profiles = self.default_config["bigip_receiver_profiles"]
+
+        self.assertEqual(
+            resolve_profile_chain("asm-edge", profiles), ("edge", "asm-edge")
+        )
+        self.assertEqual(
+            resolve_profile_chain(["lab", "asm-edge"], profiles),
+            ("lab", "edge", "asm-edge"),
+        )
+        profiles["edge"]["profile"] = "asm-edge"
+        for bad in ["asm-edge", "missing", 3]:
+            with self.assertRaises(ValueError):
+                resolve_profile_chain(bad, profiles)
+
+    def test_profiles_layer_between_defaults_and_device(self):
+        receivers = {
+            "bigip/1": {"endpoint": "https://10.0.0.1", "profile": "asm-edge"},
+            "bigip/2": {
+                "endpoint": "https://10.0.0.2",
+                "profile": ["asm-edge", "lab"],
+                "collection_interval": "10s",
+            },
+            "bigip/3": {"endpoint": "https://10.0.0.3", "profile": "asm-edge"},
+        }
+
+        result = generate_receiver_configs(receivers, self.default_config)
+
+        self.assertEqual(
+            result["bigip/1"],
+            {
+                "collection_interval": "30s",
+                "data_types": {
+                    "f5.policy.asm": {"enabled": True},
+                    "f5.gtm": {"enabled": False},
+                },
+                "tls": {"insecure_skip_verify": False},
+                "endpoint": "https://10.0.0.1",
+            },
+        )
+        self.assertEqual(result["bigip/2"]["collection_interval"], "10s")
+        self.assertEqual(result["bigip/2"]["tls"], {"insecure_skip_verify": True})
+        # Devices with the same profile chain share its merged sub-trees.
+        self.assertIs(result["bigip/1"]["data_types"], result["bigip/3"]["data_types"])
+        self.assertFalse(
+            self.default_config["bigip_receiver_defaults"]["tls"][
+                "insecure_skip_verify"
+            ]
+        )
+
+    def test_unknown_profiles_are_reported(self):
+        receivers = {
+            "bigip/1": {"endpoint": "https://10.0.0.1", "profile": "gtm"},
+            "bigip/2": {"endpoint": "https://10.0.0.2", "profile": "gtm"},
+        }
+
+        with self.assertLogs(level="ERROR") as logs:
+            self.assertIsNone(generate_receiver_configs(receivers, self.default_config))
+        self.assertIn("2 receivers have invalid profiles", logs.output[0])
+
+
+class TestStageProfiler(unittest.TestCase):
+
+    def test_records_nothing_until_enabled(self):
+        profiler = StageProfiler()
+
+        with profiler.stage("main"):
+            pass
+
+        self.assertEqual(profiler.stages, [])
+
+    def test_records_nested_stages(self):
+        profiler = StageProfiler()
+        profiler.enable()
+        self.addCleanup(tracemalloc.stop)
+
+        with profiler.stage("main"):
+            for _ in range(2):
+                with profiler.stage("render_yaml"):
+                    data = [str(i) for i in range(10000)]
+            del data
+
+        names = [record["stage"] for record in profiler.stages]
+        self.assertEqual(names, ["main/render_yaml", "main/render_yaml", "main"])
+        main = profiler.stages[-1]
+        self.assertGreaterEqual(main["wall_seconds"], 0)
+        self.assertGreaterEqual(
+            main["peak_memory_bytes"], profiler.stages[0]["peak_memory_bytes"]
+        )
+        self.assertGreater(profiler.stages[0]["peak_memory_bytes"], 0)
+
+        text = profiler.to_prometheus()
+        self.assertEqual(
+            text.count('config_helper_stage_wall_seconds{stage="main/render_yaml"}'), 1
+        )
+        self.assertIn("# TYPE config_helper_stage_peak_memory_bytes gauge", text)
+
+
+class TestPipelinePartitioning(unittest.TestCase):
+
+    def setUp(self):
+        self.receivers = {
+            f"bigip/{idx}": {"collection_interval": "60s"} for idx in range(1, 11)
+        }
+        self.pipelines = {
+            "metrics/local": {
+                "processors": ["batch/local"],
+                "exporters": ["otlphttp/metrics-local"],
+                "receivers": sorted(self.receivers),
+            },
+            "metrics/f5-datafabric": {
+                "processors": ["interval/f5-datafabric", "batch/f5-datafabric"],
+                "exporters": ["otlp/f5-datafabric"],
+                "receivers": ["bigip/1"],
+            },
+        }
+
+    def test_disabled_by_default(self):
+        self.assertEqual(
+            partition_pipelines(self.pipelines, self.receivers, None), self.pipelines
+        )
+
+    def test_splits_large_pipelines_evenly(self):
+        result = partition_pipelines(
+            self.pipelines, self.receivers, {"max_receivers_per_pipeline": 4}
+        )
+
+        self.assertEqual(
+            sorted(result),
+            [
+                "metrics/f5-datafabric",
+                "metrics/local/0",
+                "metrics/local/1",
+                "metrics/local/2",
+            ],
+        )
+        sizes = [len(result[f"metrics/local/{idx}"]["receivers"]) for idx in range(3)]
+        self.assertEqual(sorted(sizes), [3, 3, 4])
+        self.assertEqual(result["metrics/local/1"]["processors"], ["batch/local/1"])
+        self.assertEqual(
+            result["metrics/local/1"]["exporters"], ["otlphttp/metrics-local"]
+        )
+
+    def test_explicit_partition_count_and_overlay(self):
+        template = {
+            "processors": {
+                "batch/local": None,
+                "interval/f5-datafabric": {"interval": "300s"},
+                "batch/f5-datafabric": {"send_batch_max_size": 8192},
+            }
+        }
+
+        result = partition_pipelines(
+            self.pipelines,
+            self.receivers,
+            {"partitions": {"metrics/f5-datafabric": 2, "metrics/local": 2}},
+        )
+        overlay = build_collector_overlay(result, template)
+
+        self.assertIn("metrics/f5-datafabric", result)
+        self.assertEqual(
+            overlay, {"processors": {"batch/local/0": None, "batch/local/1": None}}
+        )
+
+    def test_rejects_malformed_settings(self):
+        for partitioning in [
+            {"partitions": 2},
+            {"partitions": {"metrics/local": "two"}},
+            {"partitions": {"metrics/local": 0}},
+            {"max_receivers_per_pipeline": "100"},
+            ["metrics/local"],
+        ]:
+            with self.subTest(partitioning=partitioning):
+                with self.assertRaises(ValueError):
+                    partition_pipelines(self.pipelines, self.receivers, partitioning)
+
+
+class TestMetricFilters(unittest.TestCase):
+
+    def setUp(self):
+        self.default_config = {
+            "bigip_receiver_defaults": {
+                "collection_interval": "60s",
+                "metric_filters": {"exclude_metrics": ["f5\\.policy\\.asm\\.bot-.*"]},
+            },
+            "bigip_receiver_profiles": {
+                "lab": {
+                    "metric_filters": {
+                        "exclude_attributes": {"f5.virtual_server.name": ["test-.*"]}
+                    }
+                }
+            },
+        }
+        receivers = {
+            "bigip/1": {"endpoint": "https://10.0.0.1"},
+            "bigip/2": {"endpoint": "https://10.0.0.2"},
+            "bigip/3": {"endpoint": "https://10.0.0.3", "profile": "lab"},
+            "bigip/4": {
+                "endpoint": "https://10.0.0.4",
+                "metric_filters": {"exclude_metrics": []},
+            },
+        }
+        self.receivers = generate_receiver_configs(receivers, self.default_config)
+        self.pipelines = {
+            "metrics/local": {
+                "processors": ["batch/local"],
+                "exporters": ["otlphttp/metrics-local"],
+                "receivers": sorted(self.receivers),
+            }
+        }
+
+    def test_metric_filter_conditions(self):
+        conditions = metric_filter_conditions(
+            {
+                "include_metrics": ["f5\\..*", "endpoint.*"],
+                "exclude_attributes": {"f5.pool.name": ['"quoted"']},
+                "include_attributes": {"f5.policy.asm.name": []},
+            }
+        )
+
+        self.assertEqual(
+            conditions,
+            {
+                "metric": ['not IsMatch(name, "^(?:f5\\\\..*|endpoint.*)$")'],
+                "datapoint": [
+                    'IsMatch(attributes["f5.pool.name"], "^(?:\\"quoted\\")$")'
+                ],
+            },
+        )
+
+    def test_split_filtered_pipelines_groups_receivers_by_filter(self):
+        result = split_filtered_pipelines(self.pipelines, self.receivers)
+        assignments, processors = metric_filter_processors(self.receivers)
+
+        self.assertEqual(len(processors), 2)
+        default_filter = assignments["bigip/1"]
+        lab_filter = assignments["bigip/3"]
+        self.assertEqual(assignments["bigip/2"], default_filter)
+        self.assertNotIn("bigip/4", assignments)
+        self.assertEqual(result["metrics/local"]["receivers"], ["bigip/4"])
+        filtered = result[f"metrics/local/{default_filter.split('/')[1]}"]
+        self.assertEqual(filtered["receivers"], ["bigip/1", "bigip/2"])
+        self.assertEqual(filtered["processors"], [default_filter, "batch/local"])
+        self.assertEqual(
+            processors[lab_filter]["metrics"],
+            {
+                "metric": ['IsMatch(name, "^(?:f5\\\\.policy\\\\.asm\\\\.bot-.*)$")'],
+                "datapoint": [
+                    'IsMatch(attributes["f5.virtual_server.name"], "^(?:test-.*)$")'
+                ],
+            },
+        )
+
+    def test_filters_in_overlay_not_receivers(self):
+        pipelines = split_filtered_pipelines(self.pipelines, self.receivers)
+        overlay = build_collector_overlay(
+            pipelines, {"processors": {"batch/local": None}}, self.receivers
+        )
+        rendered, _ = render_receiver_configs(self.receivers)
+
+        self.assertEqual(
+            sorted(overlay["processors"]),
+            sorted(set(metric_filter_processors(self.receivers)[0].values())),
+        )
+        self.assertNotIn("metric_filters", rendered)
+        self.assertIn("metric_filters", self.receivers["bigip/1"])
+
+    def test_invalid_filters_are_reported(self):
+        self.receivers["bigip/4"] = {
+            "endpoint": "https://10.0.0.4",
+            "metric_filters": {
+                "exclude_metrics": "f5.*",
+                "include_attributes": {"a": ["("]},
+                "drop": [],
+            },
+        }
+
+        errors = validate_receiver_configs(self.receivers, self.default_config)
+
+        self.assertEqual(len(errors), 3)
+        self.assertIn(
+            "bigip/4: metric_filters.exclude_metrics must be a list of regular expressions",
+            errors,
+        )
+        self.assertIn("bigip/4: unknown metric_filters setting 'drop'", errors)
+
+
+class TestFleetTuning(unittest.TestCase):
+
+    def setUp(self):
+        self.template = {
+            "processors": {"batch/local": None},
+            "exporters": {"otlphttp/metrics-local": {"endpoint": "http://prom"}},
+        }
+        self.pipelines = {
+            "metrics/local": {
+                "processors": ["batch/local"],
+                "exporters": ["otlphttp/metrics-local", "debug/bigip"],
+                "receivers": [],
+            }
+        }
+
+    def overlay(self, count, tuning=None, collectors=1):
+        receivers = {
+            f"bigip/{idx}": {
+                "collection_interval": "10s",
+                "data_types": {"f5.policy.asm": {"enabled": True}},
+            }
+            for idx in range(count)
+        }
+        self.pipelines["metrics/local"]["receivers"] = sorted(receivers)
+        return build_collector_overlay(
+            self.pipelines,
+            self.template,
+            receivers,
+            {"enabled": True} if tuning is None else tuning,
+            collectors,
+        )
+
+    def test_disabled_tuning_adds_nothing(self):
+        self.assertEqual(self.overlay(10, tuning={}), {})
+
+    def test_small_fleet_keeps_library_minimums(self):
+        overlay = self.overlay(1)
+
+        self.assertEqual(overlay["processors"]["batch/local"]["send_batch_size"], 8192)
+        exporter = overlay["exporters"]["otlphttp/metrics-local"]
+        self.assertEqual(exporter["compression"], "gzip")
+        self.assertEqual(exporter["sending_queue"]["queue_size"], 1000)
+        self.assertEqual(exporter["sending_queue"]["num_consumers"], 10)
+        self.assertNotIn("debug/bigip", overlay["exporters"])
+
+    def test_large_fleet_scales_batches_and_queue(self):
+        overlay = self.overlay(20000)
+        batch = overlay["processors"]["batch/local"]
+        queue = overlay["exporters"]["otlphttp/metrics-local"]["sending_queue"]
+
+        self.assertEqual(batch["send_batch_size"], 65536)
+        self.assertEqual(batch["send_batch_max_size"], 131072)
+        self.assertGreater(queue["num_consumers"], 10)
+        self.assertGreater(queue["queue_size"], 1000)
+
+        sharded = self.overlay(20000, collectors=4)
+        sharded_queue = sharded["exporters"]["otlphttp/metrics-local"]["sending_queue"]
+        self.assertLess(sharded_queue["queue_size"], queue["queue_size"])
+
+    def test_overlay_uses_the_generating_default_config(self):
+        receivers = {"bigip/1": {"collection_interval": "60s"}}
+        self.pipelines["metrics/local"]["receivers"] = ["bigip/1"]
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(f"{tmp}/collector.yaml", "w") as f:
+                yaml.dump(self.template, f)
+            args = get_args().parse_args(
+                [
+                    "--generate-configs",
+                    "--no-cache",
+                    # Not read: the overlay follows the config passed in.
+                    f"--default-config-file={tmp}/missing.yaml",
+                    f"--collector-config-file={tmp}/collector.yaml",
+                    f"--receiver-output-file={tmp}/receivers.yaml",
+                    f"--pipelines-output-file={tmp}/pipelines.yaml",
+                    f"--overlay-output-file={tmp}/overlay.yaml",
+                    f"--downsampling-rules-file={tmp}/rules.yml",
+                    f"--longterm-datasource-file={tmp}/datasource.yaml",
+                ]
+            )
+
+            write_generated_configs(
+                receivers, self.pipelines, {"fleet_tuning": {"enabled": True}}, args
+            )
+            overlay = load_yaml(f"{tmp}/overlay.yaml")
+
+        self.assertIn("otlphttp/metrics-local", overlay["exporters"])
+
+
+class TestPreflight(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        device = SimulatedDevice(0, {**SIMULATED_COUNTS, "virtual_servers": 2})
+        latency = {"base_ms": 0, "jitter_ms": 0, "per_object_ms": 0}
+        self.server = await start_device(device, "127.0.0.1", 0, latency)
+        self.url = f"127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        with socket.socket() as closed:
+            closed.bind(("127.0.0.1", 0))
+            self.closed_url = f"127.0.0.1:{closed.getsockname()[1]}"
+        self.settings = {**PREFLIGHT_DEFAULTS, "connect_timeout": "2s"}
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def receiver(self, endpoint, **overrides):
+        return {
+            "endpoint": endpoint,
+            "username": "admin",
+            "password": "secret",
+            "timeout": "5s",
+            "collection_interval": "60s",
+            **overrides,
+        }
+
+    async def test_probe_receivers(self):
+        receivers = {
+            "bigip/ok": self.receiver(f"http://{self.url}"),
+            "bigip/down": self.receiver(f"http://{self.closed_url}"),
+            "bigip/plain": self.receiver(
+                f"https://{self.url}", tls={"insecure_skip_verify": True}, timeout="1s"
+            ),
+            "bigip/noenv": self.receiver(
+                f"http://{self.url}", password="${env:AST_PREFLIGHT_UNSET}"
+            ),
+            "bigip/badtimeout": self.receiver(f"http://{self.url}", timeout="soon"),
+        }
+
+        results = {
+            r["receiver"]: r for r in await probe_receivers(receivers, self.settings)
+        }
+
+        self.assertIsNone(results["bigip/ok"]["error"])
+        self.assertIsNotNone(results["bigip/ok"]["login"])
+        self.assertEqual(len(results["bigip/ok"]["latencies"]), 3)
+        self.assertEqual(results["bigip/badtimeout"]["stage"], "config")
+        self.assertEqual(results["bigip/down"]["stage"], "tcp")
+        self.assertEqual(results["bigip/plain"]["stage"], "tls")
+        self.assertEqual(results["bigip/noenv"]["stage"], "auth")
+        self.assertIn("AST_PREFLIGHT_UNSET", results["bigip/noenv"]["error"])
+
+    async def test_http_request_reads_chunked_responses(self):
+        async def respond(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+                b'3\r\n{"a\r\n4;x=y\r\n": 1\r\n1\r\n}\r\n0\r\n\r\n'
+            )
+            await writer.drain()
+
+        server = await asyncio.start_server(respond, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", server.sockets[0].getsockname()[1]
+        )
+        try:
+            status, body = await http_request(reader, writer, "h", "GET", "/")
+        finally:
+            writer.close()
+            server.close()
+
+        self.assertEqual((status, json.loads(body)), (200, {"a": 1}))
+
+    async def test_http_request_rejects_responses_without_length(self):
+        async def respond(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            # The body would only end when the connection closes, which it never does.
+            writer.write(b"HTTP/1.1 200 OK\r\n\r\n{}")
+            await writer.drain()
+            await reader.read()
+
+        server = await asyncio.start_server(respond, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", server.sockets[0].getsockname()[1]
+        )
+        try:
+            with self.assertRaisesRegex(ValueError, "no Content-Length"):
+                await asyncio.wait_for(http_request(reader, writer, "h", "GET", "/"), 5)
+        finally:
+            writer.close()
+            server.close()
+
+    def test_recommend_timeouts(self):
+        receivers = {
+            "bigip/fast": self.receiver("x", timeout="60s"),
+            "bigip/ok": self.receiver("x", timeout="20s"),
+            "bigip/slow": self.receiver(
+                "x", data_types={"f5.policy.asm": {"enabled": True}}
+            ),
+            "bigip/slowest": self.receiver("x", collection_interval="30s"),
+            "bigip/failed": self.receiver("x"),
+        }
+        results = [
+            {"receiver": "bigip/fast", "error": None, "latencies": [0.1, 0.2]},
+            {"receiver": "bigip/ok", "error": None, "latencies": [0.1]},
+            {"receiver": "bigip/slow", "error": None, "latencies": [1.1, 0.5]},
+            {"receiver": "bigip/slowest", "error": None, "latencies": [9.0]},
+            {"receiver": "bigip/failed", "error": "timed out", "latencies": []},
+        ]
+
+        overrides, capped = recommend_timeouts(results, receivers, self.settings)
+
+        self.assertEqual(
+            overrides,
+            {
+                # Needs 10s, but is only lowered to a third of its timeout
+                "bigip/fast": {"timeout": "20s"},
+                # 1.1s p95 * (4 core modules + asm) * 2 headroom
+                "bigip/slow": {"timeout": "11s"},
+                "bigip/slowest": {"timeout": "30s"},
+            },
+        )
+        self.assertEqual(capped, ["bigip/slowest"])
+
+
+class TestIntervalTuning(unittest.TestCase):
+
+    EXPOSITION = (
+        "# TYPE scrape_duration_seconds gauge\n"
+        'scrape_duration_seconds{job="bigip/fast",instance="a"} 1.2 1700000000000\n'
+        'scrape_duration_seconds{job="bigip/slow"} 58.5\n'
+        'endpoint_scrape_responses_total{job="bigip/slow",status_code="200"} 90\n'
+        'endpoint_scrape_responses_total{job="bigip/denied",status_code="401"} 4\n'
+        'scrape_duration_seconds{job="bigip/denied"} 0.4\n'
+        'otelcol_scraper_errored_metric_points_total{receiver="bigip/slow"} 12\n'
+        'up{job="otel-collector"} 1\n'
+    )
+    # The results of the increase() TUNING_QUERIES, which have no metric names.
+    FAILURES = {
+        "status": "success",
+        "data": {
+            "resultType": "vector",
+            "result": [
+                {
+                    "metric": {"job": "bigip/slow", "status_code": "200"},
+                    "value": [1, "90"],
+                },
+                {
+                    "metric": {"job": "bigip/denied", "status_code": "401"},
+                    "value": [1, "4"],
+                },
+                {"metric": {"receiver": "bigip/slow"}, "value": [1, "12"]},
+            ],
+        },
+    }
+
+    def test_collect_scrape_telemetry(self):
+        matrix = {
+            "status": "success",
+            "data": {
+                "resultType": "matrix",
+                "result": [
+                    {
+                        "metric": {
+                            "__name__": "endpoint_scrape_responses_total",
+                            "job": "bigip/fast",
+                            "status_code": "503",
+                        },
+                        # The counter reset after 7.
+                        "values": [[1, "5"], [2, "7"], [3, "2"], [4, "NaN"]],
+                    }
+                ],
+            },
+        }
+        vector = {
+            "status": "success",
+            "data": {
+                "resultType": "vector",
+                "result": [{"metric": {"job": "bigip/fast"}, "value": [4, "0.9"]}],
+            },
+        }
+
+        with self.assertLogs(level="WARNING") as logs:
+            telemetry = collect_scrape_telemetry(
+                parse_exposition(self.EXPOSITION)
+                + parse_query_result(matrix)
+                + parse_query_result(vector)
+            )
+
+        self.assertEqual(set(telemetry), {"bigip/fast", "bigip/slow", "bigip/denied"})
+        self.assertEqual(telemetry["bigip/fast"]["durations"], [1.2, 0.9])
+        self.assertEqual(telemetry["bigip/fast"]["responses"], {"503": 4})
+        # The exposition's counters only hold totals since the collector started.
+        self.assertEqual(telemetry["bigip/slow"]["errors"], 0)
+        self.assertEqual(telemetry["bigip/denied"]["responses"], {})
+        self.assertIn("Skipped 3 counter series", logs.output[0])
+        with self.assertRaises(ValueError):
+            parse_query_result({"status": "error", "error": "bad query"})
+
+    def test_tune_receiver_intervals(self):
+        receivers = {
+            name: {"timeout": "60s", "collection_interval": "60s"}
+            for name in ["bigip/fast", "bigip/slow", "bigip/denied", "bigip/idle"]
+        }
+        telemetry = collect_scrape_telemetry(
+            parse_exposition(self.EXPOSITION) + parse_query_result(self.FAILURES)
+        )
+
+        tuned, failing = tune_receiver_intervals(
+            telemetry, receivers, receivers, INTERVAL_TUNING_DEFAULTS
+        )
+
+        self.assertEqual(set(tuned), {"bigip/fast", "bigip/slow", "bigip/denied"})
+        self.assertEqual(tuned["bigip/fast"]["timeout"], 10)
+        self.assertEqual(tuned["bigip/fast"]["collection_interval"], 60)
+        # Timing out at 60s, so the timeout grows by the headroom: 60s * 1.5, and the
+        # interval to 90s * 1.25 rounded up to 30s.
+        self.assertTrue(tuned["bigip/slow"]["timed_out"])
+        self.assertEqual(tuned["bigip/slow"]["timeout"], 90)
+        self.assertEqual(tuned["bigip/slow"]["collection_interval"], 120)
+        self.assertEqual(failing, ["bigip/denied"])
+
+    def test_run_interval_tuning_writes_minimal_overrides(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            defaults = os.path.join(tmp, "defaults.yaml")
+            receivers = os.path.join(tmp, "receivers.yaml")
+            fragments = os.path.join(tmp, "receivers.d")
+            telemetry = os.path.join(tmp, "telemetry.prom")
+            failures = os.path.join(tmp, "failures.json")
+            os.mkdir(fragments)
+            with open(defaults, "w") as f:
+                f.write(
+                    "bigip_receiver_defaults:\n"
+                    "  collection_interval: 60s\n  timeout: 60s\n"
+                    "interval_tuning:\n  min_timeout: 5s\n"
+                )
+            with open(receivers, "w") as f:
+                f.write(
+                    "# Lab devices\n"
+                    "bigip/idle:\n  endpoint: https://10.0.0.2\n"
+                    "bigip/fast:\n  endpoint: https://10.0.0.1  # core\n"
+                    "  collection_interval: 120s\n"
+                    "  # timeout: 30s\n"
+                )
+            with open(os.path.join(fragments, "team.yaml"), "w") as f:
+                f.write("bigip/slow:\n  endpoint: https://10.0.0.3\n")
+            with open(telemetry, "w") as f:
+                f.write(self.EXPOSITION)
+            with open(failures, "w") as f:
+                json.dump(self.FAILURES, f)
+            args = get_args().parse_args(
+                [
+                    f"--tune-from={telemetry}",
+                    f"--tune-from={failures}",
+                    f"--default-config-file={defaults}",
+                    f"--receiver-input-file={receivers}",
+                    f"--receiver-input-dir={fragments}",
+                    "--no-cache",
+                ]
+            )
+
+            tuned = run_interval_tuning(args)
+            with open(receivers) as f:
+                main = f.read()
+            fragment = load_yaml(os.path.join(fragments, "team.yaml"))
+
+        self.assertEqual(tuned["bigip/fast"]["timeout"], 5)
+        # The comments and order are kept, and the over-provisioned interval override is
+        # dropped for the default.
+        self.assertEqual(
+            main,
+            "# Lab devices\n"
+            "bigip/idle:\n  endpoint: https://10.0.0.2\n"
+            "bigip/fast:\n  endpoint: https://10.0.0.1  # core\n"
+            "  # timeout: 30s\n"
+            "  timeout: 5s\n",
+        )
+        self.assertEqual(
+            fragment,
+            {
+                "bigip/slow": {
+                    "endpoint": "https://10.0.0.3",
+                    "timeout": "90s",
+                    "collection_interval": "120s",
+                }
+            },
+        )
+
+
+class TestCapacityPlanning(unittest.TestCase):
+
+    def receivers(self, count, interval="60s", data_types=None):
+        return {
+            f"bigip/{idx}": {
+                "collection_interval": interval,
+                "data_types": data_types or {},
+            }
+            for idx in range(count)
+        }
+
+    def test_small_fleet_fits(self):
+        report = plan_capacity(self.receivers(2, "30s"), None)
+
+        self.assertEqual(report["active_series"], 3000)
+        self.assertEqual(report["samples_per_second"], 100)
+        self.assertAlmostEqual(report["disk_bytes"], 100 * 31536000 * 1.5)
+        self.assertEqual((report["shards"], report["warnings"]), (1, []))
+
+    def test_large_fleet_needs_sharding_and_downsampling(self):
+        receivers = self.receivers(5000, "10s", {"f5.policy.asm": {"enabled": True}})
+
+        report = plan_capacity(receivers, {"disk_gib": 1000})
+        sharded = plan_capacity(receivers, {"disk_gib": 1000}, collectors=8)
+
+        self.assertEqual(report["samples_per_second"], 5000 * 1750 / 10)
+        self.assertEqual(report["shards"], 9)
+        self.assertEqual(len(report["warnings"]), 3)
+        self.assertIn("--shards 9", report["warnings"][0])
+        self.assertIn("downsample", report["warnings"][1])
+        self.assertIn("metric_filters", report["warnings"][2])
+        self.assertEqual(sharded["shards"], 9)
+        self.assertLess(
+            sharded["collector_memory_bytes"], report["collector_memory_bytes"]
+        )
+
+    def test_calibrate_series_estimates(self):
+        receivers = self.receivers(4)
+        receivers["bigip/0"]["data_types"] = {"f5.policy.asm": {"enabled": True}}
+        tsdb_status = {
+            "series": {
+                "f5_system_cpu_utilization": 9992,
+                "f5_system_state_up_ratio": 8,
+                "f5_policy_asm_info": 4000,
+                "f5_policy_api_protection_info": 800,
+                "otelcol_process_uptime": 5,
+            },
+            # The prometheus and otel-collector jobs are not devices.
+            "label_values": {"job": 10},
+        }
+
+        estimates = calibrate_series_estimates(tsdb_status, receivers)
+
+        self.assertEqual(estimates["base"], 1250)
+        self.assertEqual(estimates["f5.policy.asm"], 2000)
+        self.assertEqual(
+            estimates["f5.policy.api_protection"],
+            DATA_TYPE_SERIES_ESTIMATES["f5.policy.api_protection"],
+        )
+        self.assertEqual(
+            calibrate_series_estimates(tsdb_status, receivers, devices=2)["base"], 5000
+        )
+        del tsdb_status["series"]["f5_system_state_up_ratio"]
+        self.assertEqual(
+            calibrate_series_estimates(tsdb_status, receivers),
+            DATA_TYPE_SERIES_ESTIMATES,
+        )
+
+    @patch("config_helper.load_receiver_config")
+    @patch("config_helper.load_default_config")
+    def test_run_capacity_plan(self, mock_defaults, mock_receivers):
+        mock_defaults.return_value = {
+            "bigip_receiver_defaults": {"collection_interval": "60s"},
+            "capacity_planning": {"retention": "30d"},
+        }
+        mock_receivers.return_value = {"bigip/1": {}, "bigip/2": {}}
+        args = get_args().parse_args(["--plan-capacity"])
+
+        with self.assertLogs(level="INFO") as logs:
+            report = run_capacity_plan(args)
+
+        self.assertEqual(report["active_series"], 3000)
+        self.assertTrue(any("30d retention" in line for line in logs.output))
+
+        mock_defaults.return_value["capacity_planning"]["retention"] = "a year"
+        with self.assertLogs(level="ERROR"):
+            self.assertIsNone(run_capacity_plan(args))
+
+
+class TestDownsampling(unittest.TestCase):
+
+    def setUp(self):
+        self.receivers = {
+            "bigip/1": {"data_types": {"f5.dos": {"enabled": True}}},
+            "bigip/2": {"data_types": {"f5.dns": {"enabled": False}}},
+        }
+
+    def test_rules_follow_enabled_data_types(self):
+        rules = downsampling_rule_groups(
+            self.receivers, {"resolution": "1h", "raw_interval": "1m"}
+        )["groups"][0]
+
+        self.assertEqual(rules["interval"], "1h")
+        self.assertEqual(
+            [rule["record"] for rule in rules["rules"]],
+            [
+                "f5:avg_over_time1h",
+                "f5:last_over_time1h",
+                "f5_dos:avg_over_time1h",
+                "f5_dos:last_over_time1h",
+            ],
+        )
+        self.assertEqual(
+            rules["rules"][3]["expr"],
+            'last_over_time(label_replace({__name__=~"f5_dos_[^:]+", '
+            '__name__=~".+_(?:total|bucket|count|sum)"}, '
+            '"f5_metric", "$1", "__name__", "(.+)")[1h:1m])',
+        )
+        # The always-on modules exclude every data_type's metrics, enabled or not.
+        self.assertIn("f5_dns_|f5_dos_", rules["rules"][0]["expr"])
+
+    def test_disabled_by_default(self):
+        args = get_args().parse_args(["--generate-configs"])
+
+        self.assertFalse(write_downsampling_tier(self.receivers, None, args))
+
+    def test_writes_tier(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            args = get_args().parse_args(
+                [
+                    "--generate-configs",
+                    f"--downsampling-rules-file={tmp}/rules.yml",
+                    f"--longterm-prometheus-config-file={tmp}/prometheus.yml",
+                    f"--longterm-datasource-file={tmp}/datasource.yaml",
+                ]
+            )
+
+            self.assertTrue(
+                write_downsampling_tier(self.receivers, {"enabled": True}, args)
+            )
+            self.assertFalse(
+                write_downsampling_tier(self.receivers, {"enabled": True}, args)
+            )
+            with open(f"{tmp}/prometheus.yml") as f:
+                config = yaml.safe_load(f)
+            with open(f"{tmp}/datasource.yaml") as f:
+                datasource = yaml.safe_load(f)["datasources"][0]
+
+            # Disabling the tier removes the rules and datasource the running services read.
+            self.assertTrue(
+                write_downsampling_tier(self.receivers, {"enabled": False}, args)
+            )
+            self.assertEqual(sorted(os.listdir(tmp)), ["prometheus.yml"])
+
+        job = config["scrape_configs"][0]
+        self.assertEqual(job["scrape_interval"], "5m")
+        self.assertEqual(
+            job["params"]["match[]"], ['{__name__=~"f5[^:]*:(?:avg|last)_over_time5m"}']
+        )
+        self.assertEqual(job["metric_relabel_configs"][0]["target_label"], "__name__")
+        self.assertEqual(datasource["jsonData"], {"timeInterval": "5m"})
+
+    def test_invalid_resolution(self):
+        args = get_args().parse_args(["--generate-configs"])
+
+        for resolution in ["5 min", "2h"]:
+            with self.assertLogs(level="ERROR"):
+                self.assertFalse(
+                    write_downsampling_tier(
+                        self.receivers,
+                        {"enabled": True, "resolution": resolution},
+                        args,
+                    )
+                )
+
+
+class TestParseCache(unittest.TestCase):
+
+    def test_load_yaml_reuses_cache_until_file_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bigip_receivers.yaml")
+            cache_dir = os.path.join(tmp, "cache")
+            with open(path, "w") as f:
+                f.write("bigip/1:\n  endpoint: https://10.0.0.1\n")
+
+            first = load_yaml(path, cache_dir)
+            with patch("config_helper.yaml.load") as mock_load:
+                second = load_yaml(path, cache_dir)
+                mock_load.assert_not_called()
+            with open(path, "a") as f:
+                f.write("bigip/2:\n  endpoint: https://10.0.0.2\n")
+            third = load_yaml(path, cache_dir)
+
+        self.assertEqual(first, {"bigip/1": {"endpoint": "https://10.0.0.1"}})
+        self.assertEqual(second, first)
+        self.assertIn("bigip/2", third)
+
+    def test_load_yaml_without_cache_dir(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "defaults.yaml")
+            with open(path, "w") as f:
+                f.write("pipeline_default: metrics/local\n")
+
+            self.assertEqual(load_yaml(path), {"pipeline_default": "metrics/local"})
+            self.assertEqual(os.listdir(tmp), ["defaults.yaml"])
+
+
+class TestSharding(unittest.TestCase):
+
+    def setUp(self):
+        self.receivers = {}
+        for idx in range(1, 401):
+            config = {"collection_interval": "60s", "data_types": {}}
+            if idx % 10 == 0:
+                config["collection_interval"] = "10s"
+                config["data_types"] = {"f5.gtm": {"enabled": True}}
+            self.receivers[f"bigip/{idx}"] = config
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration("60s"), 60)
+        self.assertEqual(parse_duration("1m30s"), 90)
+        self.assertEqual(parse_duration("500ms"), 0.5)
+        self.assertEqual(parse_duration("0"), 0)
+        for bad in ["60", "1x", "", "s", 60]:
+            with self.assertRaises(ValueError):
+                parse_duration(bad)
+
+    def test_estimate_scrape_cost(self):
+        self.assertEqual(estimate_scrape_cost(self.receivers["bigip/1"]), 4)
+        self.assertEqual(estimate_scrape_cost(self.receivers["bigip/10"]), 30)
+
+    def test_assign_shards_balances_by_cost(self):
+        assignments = assign_shards(self.receivers, 4)
+        loads = [0.0] * 4
+        for name, shard in assignments.items():
+            loads[shard] += estimate_scrape_cost(self.receivers[name])
+
+        self.assertEqual(set(assignments), set(self.receivers))
+        self.assertLessEqual(max(loads), 1.25 * sum(loads) / 4 + 30)
+
+    def test_assign_shards_moves_few_receivers_when_adding_shard(self):
+        before = assign_shards(self.receivers, 4)
+        after = assign_shards(self.receivers, 5)
+
+        moved = sum(1 for name in before if before[name] != after[name])
+        self.assertLess(moved, len(self.receivers) / 2)
+
+    def test_assign_shards_moves_only_to_added_shard(self):
+        before = assign_shards(self.receivers, 4)
+        # A new device whose name sorts before the others, and a new shard.
+        self.receivers["bigip/0"] = {
+            "collection_interval": "10s",
+            "data_types": {"f5.gtm": {"enabled": True}},
+        }
+        after = assign_shards(self.receivers, 5)
+
+        moved = [name for name in before if before[name] != after[name]]
+        self.assertTrue(all(after[name] == 4 for name in moved))
+        # About a fifth of the receivers now rank the new shard highest.
+        self.assertLess(len(moved), 1.5 * len(before) / 5)
+        # Adding a receiver alone moves no other receiver.
+        with_added = assign_shards(self.receivers, 4)
+        self.assertTrue(all(with_added[name] == before[name] for name in before))
+
+    def test_write_sharded_configs(self):
+        pipelines = {
+            "metrics/local": {"exporters": ["a"], "receivers": sorted(self.receivers)}
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            os.mkdir(f"{tmp}/defaults")
+            with open(f"{tmp}/defaults/collector.yaml", "w") as f:
+                yaml.dump({"processors": {"batch/local": None}}, f)
+
+            def write(shards):
+                args = get_args().parse_args(
+                    [
+                        "--generate-configs",
+                        "--no-cache",
+                        f"--shards={shards}",
+                        f"--collector-config-file={tmp}/defaults/collector.yaml",
+                        f"--receiver-output-file={tmp}/receivers.yaml",
+                        f"--pipelines-output-file={tmp}/pipelines.yaml",
+                        f"--overlay-output-file={tmp}/overlay.yaml",
+                        f"--compose-shards-file={tmp}/docker-compose.shards.yaml",
+                        f"--downsampling-rules-file={tmp}/rules.yml",
+                        f"--longterm-datasource-file={tmp}/datasource.yaml",
+                    ]
+                )
+                write_generated_configs(self.receivers, pipelines, {}, args)
+                return sorted(os.listdir(tmp))
+
+            self.assertEqual(
+                write(3),
+                [
+                    "collector-shard-0.yaml",
+                    "collector-shard-1.yaml",
+                    "collector-shard-2.yaml",
+                    "defaults",
+                    "docker-compose.shards.yaml",
+                    "overlay.yaml",
+                    "pipelines-0.yaml",
+                    "pipelines-1.yaml",
+                    "pipelines-2.yaml",
+                    "pipelines.yaml",
+                    "receivers-0.yaml",
+                    "receivers-1.yaml",
+                    "receivers-2.yaml",
+                    "receivers.yaml",
+                ],
+            )
+            # The unsharded files no longer hold the fleet.
+            self.assertEqual(load_yaml(f"{tmp}/receivers.yaml"), {})
+            self.assertEqual(load_yaml(f"{tmp}/pipelines.yaml"), {})
+            shard = load_yaml(f"{tmp}/collector-shard-1.yaml")
+            compose = load_yaml(f"{tmp}/docker-compose.shards.yaml")["services"]
+            self.assertEqual(
+                shard["receivers"],
+                "${file:/etc/otel-collector-config/receivers-1.yaml}",
+            )
+            self.assertEqual(
+                shard["service"]["pipelines"],
+                "${file:/etc/otel-collector-config/pipelines-1.yaml}",
+            )
+            self.assertEqual(
+                compose["otel-collector-1"]["command"],
+                [
+                    "--config=/etc/otel-collector-config/defaults/collector.yaml",
+                    "--config=/etc/otel-collector-config/overlay.yaml",
+                    "--config=/etc/otel-collector-config/collector-shard-1.yaml",
+                ],
+            )
+            self.assertEqual(
+                compose["otel-collector-1"]["extends"]["service"], "otel-collector"
+            )
+            self.assertEqual(
+                sorted(compose),
+                ["otel-collector", "otel-collector-1", "otel-collector-2"],
+            )
+
+            self.assertNotIn("receivers-2.yaml", write(2))
+            self.assertEqual(
+                write(1),
+                ["defaults", "overlay.yaml", "pipelines.yaml", "receivers.yaml"],
+            )
+            self.assertEqual(
+                len(load_yaml(f"{tmp}/receivers.yaml")), len(self.receivers)
+            )
+
+    def test_shards_must_be_positive(self):
+        self.assertEqual(get_args().parse_args(["--shards", "3"]).shards, 3)
+        for bad in ["0", "-2", "two"]:
+            with self.subTest(shards=bad), patch("sys.stderr"):
+                with self.assertRaises(SystemExit):
+                    get_args().parse_args(["--shards", bad])
+
+    def test_split_pipeline_configs(self):
+        pipelines = {
+            "metrics/local": {"exporters": ["a"], "receivers": ["bigip/1", "bigip/2"]},
+            "metrics/other": {"exporters": ["b"], "receivers": ["bigip/2"]},
+        }
+
+        result = split_pipeline_configs(pipelines, {"bigip/1"})
+
+        self.assertEqual(
+            result, {"metrics/local": {"exporters": ["a"], "receivers": ["bigip/1"]}}
+        )
+        self.assertEqual(len(pipelines["metrics/local"]["receivers"]), 2)
+
+
+class TestWatchMode(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.args = MagicMock()
+        self.args.default_config_file = os.path.join(self.tmp.name, "defaults.yaml")
+        self.args.receiver_input_file = os.path.join(self.tmp.name, "receivers.yaml")
+        self.args.collector_config_file = os.path.join(self.tmp.name, "collector.yaml")
+        self.args.receiver_input_dir = os.path.join(self.tmp.name, "receivers.d")
+        self.args.watch_interval = 2
+        self.args.debounce = 1
+        self.args.on_change = "true"
+        for path in (self.args.default_config_file, self.args.receiver_input_file):
+            with open(path, "w") as f:
+                f.write("a: 1\n")
+
+    def test_write_yaml_to_file_replaces_atomically(self):
+        path = os.path.join(self.tmp.name, "out.yaml")
+        write_yaml_to_file({"a": 1}, path)
+        os.chmod(path, 0o640)
+
+        self.assertTrue(write_yaml_to_file({"a": 2}, path))
+        self.assertEqual(os.listdir(self.tmp.name).count("out.yaml"), 1)
+        self.assertFalse([n for n in os.listdir(self.tmp.name) if n.endswith(".tmp")])
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+        self.assertEqual(load_yaml(path), {"a": 2})
+
+    @patch("config_helper.regenerate_configs")
+    def test_watch_configs_debounces_bursts(self, mock_regenerate):
+        edits = iter(["a: 22\n", "a: 333\n", "a: 4444\n", None, None, None])
+
+        def sleep(_):
+            content = next(edits)
+            if content is not None:
+                with open(self.args.receiver_input_file, "w") as f:
+                    f.write(content)
+
+        watch_configs(self.args, sleep=sleep, cycles=3)
+
+        # The initial run plus one for the burst of three edits.
+        self.assertEqual(mock_regenerate.call_count, 2)
+
+    @patch("config_helper.regenerate_configs")
+    def test_watch_configs_sees_new_fragments(self, mock_regenerate):
+        os.mkdir(self.args.receiver_input_dir)
+        edits = iter(["team-a.yaml", None])
+
+        def sleep(_):
+            name = next(edits)
+            if name is not None:
+                path = os.path.join(self.args.receiver_input_dir, name)
+                with open(path, "w") as f:
+                    f.write("bigip/a: {}\n")
+
+        watch_configs(self.args, sleep=sleep, cycles=1)
+
+        self.assertEqual(mock_regenerate.call_count, 2)
+
+    @patch("config_helper.subprocess.run")
+    @patch("config_helper.write_generated_configs")
+    @patch("config_helper.generate_configs")
+    def test_regenerate_configs_runs_hook_only_on_change(
+        self, mock_generate, mock_write, mock_run
+    ):
+        mock_generate.return_value = ({"bigip/1": {}}, {"metrics/local": {}})
+        mock_run.return_value.returncode = 0
+
+        mock_write.return_value = False
+        self.assertFalse(regenerate_configs(self.args))
+        mock_run.assert_not_called()
+
+        mock_write.return_value = True
+        self.assertTrue(regenerate_configs(self.args))
+        mock_run.assert_called_once_with("true", shell=True)
+
+    @patch("config_helper.generate_configs", side_effect=KeyError("boom"))
+    def test_regenerate_configs_survives_errors(self, _):
+        with self.assertLogs(level="ERROR"):
+            self.assertFalse(regenerate_configs(self.args))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,518 @@
+"""
+promql_cost.py
+
+Offline cost analyzer for the PromQL queries in the provisioned Grafana dashboards.
+
+Every panel query and templating (variable) query in the dashboards is parsed into its series
+selectors and scored with a static cost model of the work Prometheus does to evaluate it on each
+dashboard load:
+
+- Series selected: the series count of each metric (from a saved /api/v1/status/tsdb snapshot if
+  given, otherwise --default-series), reduced by equality matchers. Matchers on template variables
+  with =~ (e.g. job=~"$device_name") are assumed to select everything, as they do for "All".
+- Index work: regex and negative matchers are checked against every value of their label, and
+  selectors without a metric name (or with a __name__ regex) against every metric name.
+- Samples: range selectors read range / --scrape-interval samples per series at each step, where
+  $__rate_interval is 4 scrape intervals and $__range the dashboard's time range.
+- Steps: instant queries are evaluated once; range queries once per step across the dashboard's
+  time range (the panel's min interval, and at most --max-data-points steps).
+
+The score is the estimated number of samples (and index entries) touched. The worst queries and
+dashboards are ranked, with notes on what makes them expensive. The scores are relative; they are
+meant for finding the queries worth fixing at a given fleet size, not for predicting latency.
+
+Command-Line Interface:
+- --dashboards-dir: Directory searched recursively for dashboards (default: ./services/grafana/provisioning/dashboards).
+- --tsdb-status: Saved output of Prometheus' /api/v1/status/tsdb?limit=10000 to take series and label
+  value counts from.
+- --default-series: Series assumed for metrics not in the snapshot (default: 1000).
+- --default-label-values: Values assumed for labels not in the snapshot (default: 100).
+- --scrape-interval: The Prometheus scrape / push interval (default: 60s).
+- --max-data-points: Maximum points per series in a range query (default: 1000).
+- --top: Number of queries and dashboards to list (default: 20).
+- --json-file: Also write every scored query as JSON to this file.
+
+Usage Example:
+    curl -s 'http://localhost:9090/api/v1/status/tsdb?limit=10000' > tsdb_status.json
+    python ./src/promql_cost.py --tsdb-status tsdb_status.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+
+from config_helper import load_tsdb_status, parse_promql_duration
+
+# Identifiers that are PromQL keywords rather than metric names.
+PROMQL_KEYWORDS = {
+    "and",
+    "or",
+    "unless",
+    "by",
+    "without",
+    "on",
+    "ignoring",
+    "group_left",
+    "group_right",
+    "bool",
+    "offset",
+    "inf",
+    "nan",
+}
+GROUPING_RE = re.compile(
+    r"\b(?:by|without|on|ignoring|group_left|group_right)\s*\([^()]*\)"
+)
+SELECTOR_RE = re.compile(
+    r"(?<![\w:.$])(?P<metric>[a-zA-Z_:][a-zA-Z0-9_:]*)?\s*"
+    r"(?P<matchers>\{[^{}]*\})?\s*(?:\[(?P<range>[^\]:]+)\])?"
+)
+MATCHER_RE = re.compile(
+    r'\s*(?P<label>[a-zA-Z_][a-zA-Z0-9_]*)\s*(?P<op>=~|!~|!=|=)\s*"(?P<value>(?:[^"\\]|\\.)*)"\s*,?'
+)
+LABEL_VALUES_RE = re.compile(
+    r"^\s*label_values\(\s*(?:(?P<selector>[^,]+?)\s*,\s*)?(?P<label>[a-zA-Z_]\w*)\s*\)\s*$"
+)
+QUERY_RESULT_RE = re.compile(r"^\s*query_result\((?P<expr>.*)\)\s*$", re.DOTALL)
+TIME_RANGE_RE = re.compile(r"^now-(?P<duration>\w+)$")
+VARIABLE_RE = re.compile(r"\{[^{}]*\}|\w+")
+REGEX_CHARS = set(".*+?|()[]{}^$\\")
+
+# Share of a label's values a literal regex matcher is assumed to select.
+REGEX_SELECTIVITY = 0.5
+# Grafana's $__rate_interval is (at least) four scrape intervals.
+RATE_INTERVAL_SCRAPES = 4
+DEFAULT_TIME_RANGE = 3600
+
+
+def strip_strings(expr):
+    """Blank out string literals and Grafana variables outside of selector braces and ranges.
+
+    This drops label_replace arguments and templated function or metric name suffixes (e.g.
+    ${metric:value}(...) or otelcol_process_cpu${suffix}) that would otherwise be taken for
+    selectors.
+    """
+    out = []
+    depth = 0
+    quote = None
+    escaped = False
+    pos = 0
+    while pos < len(expr):
+        char = expr[pos]
+        pos += 1
+        if quote:
+            if depth:
+                out.append(char)
+            if char == quote and not escaped:
+                quote = None
+            escaped = char == "\\" and not escaped
+            continue
+        if char in "\"'`":
+            quote = char
+            if depth:
+                out.append(char)
+            continue
+        if char == "$" and not depth:
+            match = VARIABLE_RE.match(expr, pos)
+            if match:
+                pos = match.end()
+                continue
+        if char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth = max(depth - 1, 0)
+        out.append(char)
+    return "".join(out)
+
+
+def find_selectors(expr):
+    """Find the series selectors in a PromQL expression.
+
+    Args:
+        expr (str): The PromQL expression.
+
+    Returns:
+        list: Dicts with the "metric" name (or None), the "matchers" as (label, op, value)
+              tuples and the "range" text of range selectors (or None).
+    """
+    text = GROUPING_RE.sub("", strip_strings(expr))
+    selectors = []
+    for match in SELECTOR_RE.finditer(text):
+        metric, matchers = match.group("metric"), match.group("matchers")
+        if not metric and not matchers:
+            continue
+        if metric and not matchers and not match.group("range"):
+            rest = text[match.end() :].lstrip()
+            if rest.startswith("(") or metric.lower() in PROMQL_KEYWORDS:
+                continue  # A function, aggregation or keyword.
+        parsed = [
+            (m.group("label"), m.group("op"), m.group("value"))
+            for m in MATCHER_RE.finditer(matchers[1:-1] if matchers else "")
+        ]
+        if metric is None:
+            names = [v for label, op, v in parsed if label == "__name__" and op == "="]
+            metric = names[0] if names else None
+        selectors.append(
+            {
+                "metric": metric,
+                "matchers": parsed,
+                "range": match.group("range").strip() if match.group("range") else None,
+            }
+        )
+    return selectors
+
+
+def resolve_range(range_text, context):
+    """Return the seconds covered by a selector's range, resolving Grafana variables."""
+    scrape_interval = context["scrape_interval"]
+    if range_text in ("$__rate_interval", "${__rate_interval}"):
+        return RATE_INTERVAL_SCRAPES * scrape_interval
+    if range_text in ("$__interval", "${__interval}"):
+        return context["step"]
+    if range_text in ("$__range", "${__range}"):
+        return context["time_range"]
+    try:
+        return parse_promql_duration(range_text)
+    except ValueError:
+        # A custom variable, assume it's about as long as a rate interval.
+        return RATE_INTERVAL_SCRAPES * scrape_interval
+
+
+def selector_cost(selector, context, cardinality):
+    """Estimate the series, samples and index entries touched by one selector at one step.
+
+    Returns:
+        tuple: (series, cost per step, notes).
+    """
+    notes = []
+    series_counts = cardinality.get("series") or {}
+    label_values = cardinality.get("label_values") or {}
+    default_values = context["default_label_values"]
+    metric = selector["metric"]
+    if metric is not None:
+        series = series_counts.get(metric, context["default_series"])
+        index = 0.0
+    else:
+        series = cardinality.get("total_series") or context["default_series"] * max(
+            len(series_counts), default_values
+        )
+        index = float(len(series_counts) or default_values)
+        notes.append("selector without a metric name")
+
+    for label, op, value in selector["matchers"]:
+        if label == "__name__":
+            if op == "=~" and metric is None:
+                notes.append(f'__name__=~"{value}" checks every metric name')
+            continue
+        values = label_values.get(label, default_values)
+        templated = "$" in value
+        literal = not (REGEX_CHARS & set(value))
+        if op == "=" or (op == "=~" and literal and not templated):
+            series /= max(values, 1)
+        elif op == "=~":
+            index += values
+            if templated:
+                notes.append(f"regex {label}=~ on a variable (selects all for All)")
+            else:
+                series *= REGEX_SELECTIVITY
+                notes.append(f"regex {label}=~")
+        else:
+            index += values
+            notes.append(f"negative matcher {label}{op}")
+
+    samples = 1.0
+    if selector["range"]:
+        seconds = resolve_range(selector["range"], context)
+        samples = max(seconds / context["scrape_interval"], 1.0)
+        if seconds >= 3600:
+            notes.append(f"[{selector['range']}] range")
+    return series, series * samples + index, notes
+
+
+def score_query(expr, context, cardinality, instant=False):
+    """Score one PromQL expression.
+
+    Args:
+        expr (str): The PromQL expression.
+        context (dict): The cost model settings and the dashboard's time range and step.
+        cardinality (dict): Series and label value counts (see `load_tsdb_status`).
+        instant (bool): Whether the query is evaluated once rather than at each step.
+
+    Returns:
+        dict: The "cost", "series" and "steps" of the query and the "notes" explaining it.
+    """
+    steps = 1 if instant else context["steps"]
+    cost = 0.0
+    total_series = 0.0
+    notes = []
+    for selector in find_selectors(expr):
+        series, step_cost, selector_notes = selector_cost(
+            selector, context, cardinality
+        )
+        cost += step_cost * steps
+        total_series += series
+        notes.extend(note for note in selector_notes if note not in notes)
+    return {"cost": cost, "series": total_series, "steps": steps, "notes": notes}
+
+
+def score_variable_query(query, context, cardinality):
+    """Score a Prometheus templating query (label_values, query_result or a plain selector)."""
+    match = LABEL_VALUES_RE.match(query)
+    if match:
+        if match.group("selector"):
+            result = score_query(match.group("selector"), context, cardinality, True)
+        else:
+            values = (cardinality.get("label_values") or {}).get(
+                match.group("label"), context["default_label_values"]
+            )
+            result = {"cost": float(values), "series": 0.0, "steps": 1, "notes": []}
+        result["notes"].append(f"label_values({match.group('label')}) on every load")
+        return result
+    match = QUERY_RESULT_RE.match(query)
+    return score_query(
+        match.group("expr") if match else query, context, cardinality, True
+    )
+
+
+def iter_panels(panels):
+    """Yield every panel, including those nested in rows."""
+    for panel in panels or []:
+        if not isinstance(panel, dict):
+            continue
+        yield panel
+        yield from iter_panels(panel.get("panels"))
+
+
+def dashboard_context(dashboard, model):
+    """Return the cost model settings for a dashboard's default time range."""
+    time_range = DEFAULT_TIME_RANGE
+    match = TIME_RANGE_RE.match(str((dashboard.get("time") or {}).get("from", "")))
+    if match:
+        try:
+            time_range = parse_promql_duration(match.group("duration"))
+        except ValueError:
+            pass
+    return {**model, "time_range": time_range}
+
+
+def panel_steps(panel, target, context):
+    """Return the step and number of steps of a range query in a panel."""
+    min_step = context["scrape_interval"]
+    for interval in (target.get("interval"), panel.get("interval")):
+        if interval:
+            try:
+                min_step = parse_promql_duration(interval)
+                break
+            except ValueError:
+                continue  # A variable, e.g. $minstep.
+    max_points = panel.get("maxDataPoints") or context["max_data_points"]
+    step = max(context["time_range"] / max_points, min_step)
+    return step, max(int(context["time_range"] // step), 1)
+
+
+def analyze_dashboard(dashboard, name, model, cardinality):
+    """Score every panel and templating query in a dashboard.
+
+    Args:
+        dashboard (dict): The Grafana dashboard model.
+        name (str): The dashboard's file name, used in the results.
+        model (dict): The cost model settings.
+        cardinality (dict): Series and label value counts (see `load_tsdb_status`).
+
+    Returns:
+        list: A result dict (see `score_query`) per query, with the "dashboard", "panel" title,
+              "kind" (panel or variable) and "expr".
+    """
+    context = dashboard_context(dashboard, model)
+    results = []
+    for panel in iter_panels(dashboard.get("panels")):
+        for target in panel.get("targets") or []:
+            expr = target.get("expr") if isinstance(target, dict) else None
+            if not isinstance(expr, str) or not expr.strip() or target.get("hide"):
+                continue
+            step, steps = panel_steps(panel, target, context)
+            instant = bool(target.get("instant")) and not target.get("range")
+            result = score_query(
+                expr, {**context, "step": step, "steps": steps}, cardinality, instant
+            )
+            result.update(
+                dashboard=name, panel=panel.get("title") or "", kind="panel", expr=expr
+            )
+            results.append(result)
+
+    for variable in (dashboard.get("templating") or {}).get("list") or []:
+        if variable.get("type") != "query":
+            continue
+        query = variable.get("query")
+        if isinstance(query, dict):
+            query = query.get("query")
+        if not isinstance(query, str) or not query.strip():
+            continue
+        result = score_variable_query(
+            query,
+            {**context, "step": context["scrape_interval"], "steps": 1},
+            cardinality,
+        )
+        result.update(
+            dashboard=name,
+            panel=f"${variable.get('name', '')}",
+            kind="variable",
+            expr=query,
+        )
+        results.append(result)
+    return results
+
+
+def analyze_dashboards(dashboards_dir, model, cardinality):
+    """Score the queries of every dashboard found (recursively) in dashboards_dir."""
+    results = []
+    for root, _, files in sorted(os.walk(dashboards_dir)):
+        for filename in sorted(files):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(root, filename)
+            try:
+                with open(path, "r") as f:
+                    dashboard = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logging.warning("Skipping dashboard '%s': %s", path, e)
+                continue
+            name = os.path.relpath(path, dashboards_dir)
+            results.extend(analyze_dashboard(dashboard, name, model, cardinality))
+    return results
+
+
+def format_cost(cost):
+    """Format a cost for display, e.g. 1234567 -> "1.2M"."""
+    for threshold, suffix in ((1e9, "G"), (1e6, "M"), (1e3, "k")):
+        if cost >= threshold:
+            return f"{cost / threshold:.1f}{suffix}"
+    return f"{cost:.0f}"
+
+
+def format_report(results, top):
+    """Format the ranking of the most expensive queries and dashboards as text."""
+    lines = [f"Top {top} queries by estimated samples touched per dashboard load:"]
+    lines.append(f"{'cost':>8} {'series':>8} {'steps':>5}  dashboard / panel")
+    for result in sorted(results, key=lambda r: r["cost"], reverse=True)[:top]:
+        lines.append(
+            f"{format_cost(result['cost']):>8} {format_cost(result['series']):>8} "
+            f"{result['steps']:>5}  {result['dashboard']} / {result['panel']}"
+        )
+        lines.append(f"{'':>24}  {' '.join(result['expr'].split())[:100]}")
+        if result["notes"]:
+            lines.append(f"{'':>24}  ({'; '.join(result['notes'])})")
+
+    totals = {}
+    for result in results:
+        total = totals.setdefault(result["dashboard"], [0.0, 0])
+        total[0] += result["cost"]
+        total[1] += 1
+    lines.append("")
+    lines.append(f"Top {top} dashboards by estimated cost per load:")
+    lines.append(f"{'cost':>8} {'queries':>7}  dashboard")
+    for name, (cost, count) in sorted(
+        totals.items(), key=lambda item: item[1][0], reverse=True
+    )[:top]:
+        lines.append(f"{format_cost(cost):>8} {count:>7}  {name}")
+    return "\n".join(lines)
+
+
+def get_args():
+    """Set up the command-line argument parser."""
+    parser = argparse.ArgumentParser(
+        description="Rank the Grafana dashboard queries by estimated Prometheus evaluation cost."
+    )
+    parser.add_argument(
+        "--dashboards-dir",
+        type=str,
+        default="./services/grafana/provisioning/dashboards",
+        help="Directory searched recursively for dashboards (default: ./services/grafana/provisioning/dashboards).",
+    )
+    parser.add_argument(
+        "--tsdb-status",
+        type=str,
+        default=None,
+        help="Saved /api/v1/status/tsdb response to take series and label value counts from.",
+    )
+    parser.add_argument(
+        "--default-series",
+        type=int,
+        default=1000,
+        help="Series assumed for metrics not in the TSDB status snapshot (default: 1000).",
+    )
+    parser.add_argument(
+        "--default-label-values",
+        type=int,
+        default=100,
+        help="Values assumed for labels not in the TSDB status snapshot (default: 100).",
+    )
+    parser.add_argument(
+        "--scrape-interval",
+        type=str,
+        default="60s",
+        help="The Prometheus scrape / push interval (default: 60s).",
+    )
+    parser.add_argument(
+        "--max-data-points",
+        type=int,
+        default=1000,
+        help="Maximum points per series in a range query (default: 1000).",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=20,
+        help="Number of queries and dashboards to list (default: 20).",
+    )
+    parser.add_argument(
+        "--json-file",
+        type=str,
+        default=None,
+        help="Also write every scored query as JSON to this file.",
+    )
+    return parser
+
+
+def main():
+    """Score the dashboard queries and print the ranking, exiting 1 on error."""
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    args = get_args().parse_args()
+    try:
+        scrape_interval = parse_promql_duration(args.scrape_interval)
+    except ValueError as e:
+        logging.error("Error: %s", e)
+        sys.exit(1)
+    cardinality = {}
+    if args.tsdb_status:
+        cardinality = load_tsdb_status(args.tsdb_status)
+        if cardinality is None:
+            sys.exit(1)
+    model = {
+        "scrape_interval": scrape_interval,
+        "default_series": args.default_series,
+        "default_label_values": args.default_label_values,
+        "max_data_points": args.max_data_points,
+    }
+    results = analyze_dashboards(args.dashboards_dir, model, cardinality)
+    if not results:
+        logging.error("No dashboard queries found in '%s'.", args.dashboards_dir)
+        sys.exit(1)
+    print(format_report(results, args.top))
+    if args.json_file:
+        try:
+            with open(args.json_file, "w") as f:
+                json.dump(
+                    sorted(results, key=lambda r: r["cost"], reverse=True), f, indent=2
+                )
+        except OSError as e:
+            logging.error("Error writing '%s': %s", args.json_file, e)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import json
+import os
+import tempfile
+import unittest
+
+from promql_cost import (
+    analyze_dashboard,
+    analyze_dashboards,
+    find_selectors,
+    format_report,
+    load_tsdb_status,
+    parse_promql_duration,
+    score_query,
+    score_variable_query,
+)
+
+MODEL = {
+    "scrape_interval": 60,
+    "default_series": 1000,
+    "default_label_values": 100,
+    "max_data_points": 1000,
+}
+
+
+class TestPromqlCost(unittest.TestCase):
+
+    def context(self, **overrides):
+        return {**MODEL, "time_range": 3600, "step": 60, "steps": 60, **overrides}
+
+    def test_parse_promql_duration(self):
+        self.assertEqual(parse_promql_duration("5m"), 300)
+        self.assertEqual(parse_promql_duration("1h30m"), 5400)
+        self.assertEqual(parse_promql_duration("500ms"), 0.5)
+        for text in ["", "5", "m5", "$__rate_interval", "5m x"]:
+            with self.assertRaises(ValueError):
+                parse_promql_duration(text)
+
+    def test_find_selectors(self):
+        selectors = find_selectors(
+            'sum by(job) (rate(f5_dos_stats_total{job=~"$device_name"}[$__rate_interval])) '
+            '/ on(job) group_left label_replace(f5_system_info, "a", "$1", "b", "(.*)")'
+        )
+
+        self.assertEqual(
+            selectors,
+            [
+                {
+                    "metric": "f5_dos_stats_total",
+                    "matchers": [("job", "=~", "$device_name")],
+                    "range": "$__rate_interval",
+                },
+                {"metric": "f5_system_info", "matchers": [], "range": None},
+            ],
+        )
+
+    def test_find_selectors_skips_grafana_variables(self):
+        selectors = find_selectors(
+            'sum(${metric:value}(otelcol_process_cpu${suffix}{job="$job"}[5m])) by (job $grouping)'
+        )
+
+        self.assertEqual(
+            [(s["metric"], s["range"]) for s in selectors],
+            [("otelcol_process_cpu", "5m")],
+        )
+        self.assertEqual(find_selectors('{__name__="up", job="a"}')[0]["metric"], "up")
+
+    def test_score_query(self):
+        cardinality = {"series": {"m": 5000}, "label_values": {"job": 50}}
+
+        # Equality matchers narrow the series, regexes on variables don't.
+        narrow = score_query('rate(m{job="a"}[5m])', self.context(), cardinality)
+        wide = score_query('rate(m{job=~"$d"}[5m])', self.context(), cardinality)
+        instant = score_query('m{job="a"}', self.context(), cardinality, instant=True)
+
+        self.assertEqual(narrow["series"], 100)
+        self.assertEqual(narrow["cost"], 100 * 5 * 60)
+        self.assertEqual(wide["series"], 5000)
+        self.assertEqual(wide["cost"], (5000 * 5 + 50) * 60)
+        self.assertIn("regex job=~ on a variable (selects all for All)", wide["notes"])
+        self.assertEqual((instant["cost"], instant["steps"]), (100, 1))
+
+    def test_score_query_without_metric_name(self):
+        result = score_query(
+            '{__name__=~"f5_.*"}',
+            self.context(),
+            {"series": {"a": 1, "b": 2}, "total_series": 300},
+            instant=True,
+        )
+
+        self.assertEqual(result["cost"], 300 + 2)
+        self.assertIn('__name__=~"f5_.*" checks every metric name', result["notes"])
+
+    def test_score_variable_query(self):
+        cardinality = {"series": {"f5_system_info": 10}, "label_values": {"job": 50}}
+        context = self.context(steps=1)
+
+        with_selector = score_variable_query(
+            "label_values(f5_system_info, job)", context, cardinality
+        )
+        without_selector = score_variable_query(
+            "label_values(job)", context, cardinality
+        )
+        query_result = score_variable_query(
+            "query_result(topk(5, f5_system_info))", context, cardinality
+        )
+
+        self.assertEqual(with_selector["cost"], 10)
+        self.assertEqual(without_selector["cost"], 50)
+        self.assertEqual(query_result["cost"], 10)
+
+    def test_analyze_dashboard(self):
+        dashboard = {
+            "time": {"from": "now-6h"},
+            "panels": [
+                {
+                    "title": "Row",
+                    "type": "row",
+                    "panels": [
+                        {
+                            "title": "Rate",
+                            "interval": "5m",
+                            "targets": [
+                                {"expr": "rate(m[5m])"},
+                                {"expr": "m", "hide": True},
+                            ],
+                        }
+                    ],
+                },
+                {"title": "Stat", "targets": [{"expr": "m", "instant": True}]},
+            ],
+            "templating": {
+                "list": [
+                    {
+                        "name": "d",
+                        "type": "query",
+                        "query": {"query": "label_values(j)"},
+                    },
+                    {"name": "c", "type": "custom", "query": "a,b"},
+                ]
+            },
+        }
+
+        results = analyze_dashboard(dashboard, "d.json", MODEL, {})
+
+        self.assertEqual(
+            [(r["panel"], r["kind"], r["steps"]) for r in results],
+            [("Rate", "panel", 72), ("Stat", "panel", 1), ("$d", "variable", 1)],
+        )
+        self.assertEqual(results[0]["cost"], 1000 * 5 * 72)
+
+    def test_analyze_dashboards_and_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.mkdir(os.path.join(tmp, "fleet"))
+            for name, expr in [("a.json", "rate(x[1h])"), ("fleet/b.json", "x")]:
+                with open(os.path.join(tmp, name), "w") as f:
+                    json.dump(
+                        {"panels": [{"title": "P", "targets": [{"expr": expr}]}]}, f
+                    )
+            with open(os.path.join(tmp, "broken.json"), "w") as f:
+                f.write("{")
+            status_file = os.path.join(tmp, "status.json")
+            with open(status_file, "w") as f:
+                json.dump(
+                    {
+                        "status": "success",
+                        "data": {
+                            "headStats": {"numSeries": 7},
+                            "seriesCountByMetricName": [{"name": "x", "value": 5}],
+                            "labelValueCountByLabelName": [],
+                        },
+                    },
+                    f,
+                )
+
+            cardinality = load_tsdb_status(status_file)
+            results = analyze_dashboards(tmp, MODEL, cardinality)
+
+        self.assertEqual(cardinality["series"], {"x": 5})
+        self.assertEqual(
+            [r["dashboard"] for r in results],
+            ["a.json", os.path.join("fleet", "b.json")],
+        )
+        report = format_report(results, 1)
+        self.assertIn("a.json / P", report)
+        self.assertNotIn("b.json / P", report)
+        self.assertIn("[1h] range", report)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,476 @@
+"""
+recording_rules.py
+
+Generates Prometheus recording rules for the expensive queries in the fleet Grafana dashboards.
+
+Fleet dashboards evaluate range-vector functions (rate, increase, changes and the *_over_time
+functions) over every device on each refresh. This tool extracts the PromQL from the shipped
+dashboards, finds those calls (and any sum / min / max aggregation directly around them) and
+writes:
+
+- A recording rules file, loaded by Prometheus (see services/prometheus/prometheus.yml), that
+  pre-computes each call once per evaluation interval for the whole fleet. Rules with a range of
+  --long-range-threshold or more (e.g. the 24h availability queries) are evaluated in their own,
+  less frequent group.
+- A copy of each dashboard, with its own uid and a "(Recorded)" title suffix, whose queries read
+  the recorded series instead.
+
+Recorded series are aggregated: a call inside a sum / min / max is recorded with that aggregation
+by its grouping labels, and a bare call is recorded as a sum by the labels its panel displays, so
+each rule produces fewer series than it reads. Dashboard filters (label matchers using template
+variables such as $device_name) can't be pre-computed, so recorded series also keep job and the
+labels the dashboards filter on, and the matchers are applied to the recorded series. Grafana's
+$__rate_interval is replaced by a fixed --rate-window. Queries that can't be recorded this way, and
+bare calls whose panel shows one series per object (e.g. per virtual server, or every label in a
+table), are left unchanged: recording them would only duplicate the raw series.
+
+Command-Line Interface:
+- --dashboards-dir: Directory of dashboards to read (default: ./services/grafana/provisioning/dashboards/bigip/fleet).
+- --output-dir: Directory for the rewritten dashboards (default: ./services/grafana/provisioning/dashboards/bigip/fleet-recorded).
+- --rules-file: Path of the recording rules file (default: ./services/prometheus/rules/f5_fleet_dashboards.yml).
+- --rate-window: Range used in place of $__rate_interval (default: 5m).
+- --long-range-threshold: Rules with at least this range go in the long range group (default: 1h).
+- --long-range-interval: Evaluation interval of the long range group (default: 5m).
+- --dry-run: Log the rules and rewritten queries without writing any files.
+
+Usage Example:
+    python ./src/recording_rules.py
+"""
+
+import argparse
+import copy
+import json
+import logging
+import os
+import re
+import sys
+
+from config_helper import (
+    emit_output,
+    parse_duration,
+    render_yaml,
+    write_text_to_file,
+    write_yaml_to_file,
+)
+
+# Range-vector functions worth recording; irate is left alone as it only uses the last 2 samples.
+RANGE_FUNCTIONS = [
+    "rate",
+    "increase",
+    "changes",
+    "sum_over_time",
+    "count_over_time",
+    "avg_over_time",
+    "min_over_time",
+    "max_over_time",
+]
+# Aggregations that give the same result when applied again to their own (finer grained) output.
+COMPOSABLE_AGGREGATIONS = ["sum", "min", "max"]
+# Grafana range variables that can be replaced by a fixed window without changing the meaning.
+TEMPLATE_RANGES = [
+    "$__rate_interval",
+    "${__rate_interval}",
+    "$__interval",
+    "${__interval}",
+]
+# Functions returning a per-second average over the range: replacing a template range with the
+# fixed rate window keeps the result's scale and only changes how much it is smoothed. (Functions
+# like increase or max_over_time scale with the range, so their template ranges are not fixed.)
+PER_SECOND_FUNCTIONS = ["rate"]
+
+# Recorded series always keep the device label, so dashboards can still filter on $device_name.
+DEVICE_LABEL = "job"
+LEGEND_LABEL_RE = re.compile(r"\{\{\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*\}\}")
+
+RULE_GROUP = "f5_fleet_dashboards"
+LONG_RANGE_RULE_GROUP = "f5_fleet_dashboards_long_range"
+RECORDED_UID_SUFFIX = "-rec"
+RECORDED_TITLE_SUFFIX = " (Recorded)"
+# Grafana dashboard uids are limited to 40 characters.
+MAX_UID_LENGTH = 40
+
+SELECTOR = (
+    r"(?P<metric>[a-zA-Z_][a-zA-Z0-9_]*)\s*(?:\{(?P<matchers>[^{}]*)\})?"
+    r"\s*\[(?P<range>[^\]]+)\]"
+)
+RANGE_CALL_RE = re.compile(
+    rf"\b(?P<fn>{'|'.join(RANGE_FUNCTIONS)})\s*\(\s*{SELECTOR}\s*\)"
+)
+AGGREGATION_RE = re.compile(
+    rf"\b(?P<agg>{'|'.join(COMPOSABLE_AGGREGATIONS)})\s*"
+    r"(?:by\s*\((?P<by_before>[^()]*)\)\s*)?"
+    rf"\(\s*(?P<fn>{'|'.join(RANGE_FUNCTIONS)})\s*\(\s*{SELECTOR}\s*\)\s*\)"
+    r"(?:\s*by\s*\((?P<by_after>[^()]*)\))?"
+)
+MATCHER_RE = re.compile(
+    r'\s*(?P<label>[a-zA-Z_][a-zA-Z0-9_]*)\s*(?P<op>=~|!~|!=|=)\s*"(?P<value>(?:[^"\\]|\\.)*)"\s*(?:,|$)'
+)
+
+
+def parse_matcher_labels(matchers):
+    """Return the label names used by a selector's matchers, or None if they can't be parsed."""
+    labels = []
+    pos = 0
+    matchers = matchers or ""
+    while pos < len(matchers.strip()):
+        match = MATCHER_RE.match(matchers, pos)
+        if not match:
+            return None
+        labels.append(match.group("label"))
+        pos = match.end()
+    return labels
+
+
+def fixed_matcher_labels(matchers):
+    """Return the labels a selector's matchers pin to a single literal value (label="value")."""
+    return {
+        match.group("label")
+        for match in MATCHER_RE.finditer(matchers or "")
+        if match.group("op") == "=" and "$" not in match.group("value")
+    }
+
+
+def displayed_labels(target):
+    """Return the labels a panel query displays, or None if it displays all of them.
+
+    Time series panels show the labels named in the legendFormat; tables (and the automatic
+    legend) show every label.
+    """
+    legend = target.get("legendFormat") or ""
+    if target.get("format") == "table" or legend in ("", "__auto"):
+        return None
+    return set(LEGEND_LABEL_RE.findall(legend))
+
+
+def record_window(fn, range_text, rate_window):
+    """Return the fixed range to record a call with, or None if it can't be fixed."""
+    range_text = range_text.strip()
+    if range_text in TEMPLATE_RANGES:
+        return rate_window if fn in PER_SECOND_FUNCTIONS else None
+    try:
+        parse_duration(range_text)
+    except ValueError:
+        return None
+    return range_text
+
+
+def find_recordable_calls(expr, rate_window, display=None):
+    """Find the range-vector calls in a PromQL expression that can be replaced by recorded series.
+
+    A call inside a sum / min / max is recorded with that aggregation, by its grouping labels
+    plus job and the labels it is filtered on. A bare call is recorded as a sum by job and the
+    labels of its matchers, but only if the panel displays no other labels and every matcher
+    label other than job has a single literal value, i.e. the panel shows one series per
+    device; otherwise it keeps one recorded series per raw series and is left alone.
+
+    Args:
+        expr (str): The PromQL expression.
+        rate_window (str): The range used in place of $__rate_interval.
+        display (set, optional): The labels the panel displays (see `displayed_labels`), or
+                                 None if it displays all of them.
+
+    Returns:
+        list: Dicts with the "start" and "end" of the replaced text, the "rule" ({record, expr})
+              to record and its "window", and the "rewrite" querying the recorded series.
+    """
+    calls = []
+    taken = []
+
+    def overlaps(match):
+        return any(match.start() < end and start < match.end() for start, end in taken)
+
+    for match in AGGREGATION_RE.finditer(expr):
+        window = record_window(match.group("fn"), match.group("range"), rate_window)
+        labels = parse_matcher_labels(match.group("matchers"))
+        by_text = match.group("by_before") or match.group("by_after")
+        if (
+            window is None
+            or labels is None
+            or (match.group("by_before") and match.group("by_after"))
+        ):
+            continue
+        by = [label.strip() for label in (by_text or "").split(",") if label.strip()]
+        grouping = sorted(set(by) | set(labels) | {DEVICE_LABEL})
+        record = (
+            f"{'_'.join(grouping)}:{match.group('metric')}:{match.group('fn')}{window}"
+        )
+        if match.group("agg") != "sum":
+            # Don't share the sum's series (recorded bare calls are sums too).
+            record += f"_{match.group('agg')}"
+        matchers = match.group("matchers") or ""
+        rewrite_by = f" by ({', '.join(by)})" if by else ""
+        calls.append(
+            {
+                "start": match.start(),
+                "end": match.end(),
+                "window": window,
+                "rule": {
+                    "record": record,
+                    "expr": f"{match.group('agg')} by ({', '.join(grouping)}) "
+                    f"({match.group('fn')}({match.group('metric')}[{window}]))",
+                },
+                "rewrite": f"{match.group('agg')}{rewrite_by} ({record}"
+                + (f"{{{matchers}}}" if matchers.strip() else "")
+                + ")",
+            }
+        )
+        taken.append((match.start(), match.end()))
+
+    for match in RANGE_CALL_RE.finditer(expr):
+        if overlaps(match) or display is None:
+            continue
+        window = record_window(match.group("fn"), match.group("range"), rate_window)
+        labels = parse_matcher_labels(match.group("matchers"))
+        if window is None or labels is None:
+            continue
+        matchers = match.group("matchers") or ""
+        if not (set(labels) | display) <= (
+            fixed_matcher_labels(matchers) | {DEVICE_LABEL}
+        ):
+            continue
+        grouping = sorted(set(labels) | {DEVICE_LABEL})
+        record = (
+            f"{'_'.join(grouping)}:{match.group('metric')}:{match.group('fn')}{window}"
+        )
+        calls.append(
+            {
+                "start": match.start(),
+                "end": match.end(),
+                "window": window,
+                "rule": {
+                    "record": record,
+                    "expr": f"sum by ({', '.join(grouping)}) "
+                    f"({match.group('fn')}({match.group('metric')}[{window}]))",
+                },
+                "rewrite": record + (f"{{{matchers}}}" if matchers.strip() else ""),
+            }
+        )
+    return sorted(calls, key=lambda call: call["start"])
+
+
+def rewrite_expr(expr, calls):
+    """Return expr with each recordable call replaced by its query of the recorded series."""
+    for call in sorted(calls, key=lambda call: call["start"], reverse=True):
+        expr = expr[: call["start"]] + call["rewrite"] + expr[call["end"] :]
+    return expr
+
+
+def iter_targets(node):
+    """Yield every panel query (a dict with a string "expr") in a dashboard."""
+    if isinstance(node, dict):
+        if isinstance(node.get("expr"), str):
+            yield node
+        for value in node.values():
+            yield from iter_targets(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from iter_targets(value)
+
+
+def record_dashboard(dashboard, rate_window, rules):
+    """Return a copy of a dashboard whose queries use recorded series.
+
+    Args:
+        dashboard (dict): The Grafana dashboard model.
+        rate_window (str): The range used in place of $__rate_interval.
+        rules (dict): Recording rules found so far, by record name, updated in place with
+                      (window, rule) for each rule this dashboard needs.
+
+    Returns:
+        tuple: The rewritten dashboard and the number of queries rewritten.
+    """
+    recorded = copy.deepcopy(dashboard)
+    rewritten = 0
+    for target in iter_targets(recorded):
+        calls = find_recordable_calls(
+            target["expr"], rate_window, displayed_labels(target)
+        )
+        if not calls:
+            continue
+        for call in calls:
+            rules.setdefault(call["rule"]["record"], (call["window"], call["rule"]))
+        new_expr = rewrite_expr(target["expr"], calls)
+        logging.debug("Rewrote '%s' as '%s'.", target["expr"], new_expr)
+        target["expr"] = new_expr
+        rewritten += 1
+    if recorded.get("uid"):
+        recorded["uid"] = (
+            recorded["uid"][: MAX_UID_LENGTH - len(RECORDED_UID_SUFFIX)]
+            + RECORDED_UID_SUFFIX
+        )
+    if recorded.get("title"):
+        recorded["title"] += RECORDED_TITLE_SUFFIX
+    recorded["id"] = None
+    return recorded, rewritten
+
+
+def build_rule_groups(rules, long_range_threshold, long_range_interval):
+    """Build the Prometheus rules file contents, splitting off the long range rules.
+
+    Args:
+        rules (dict): (window, rule) by record name.
+        long_range_threshold (str): Rules with a window at least this long are long range.
+        long_range_interval (str): The evaluation interval of the long range group.
+
+    Returns:
+        dict: The rules file contents, with the rules of each group sorted by record name.
+    """
+    threshold = parse_duration(long_range_threshold)
+    short, long = [], []
+    for record in sorted(rules):
+        window, rule = rules[record]
+        (long if parse_duration(window) >= threshold else short).append(rule)
+    groups = []
+    if short:
+        groups.append({"name": RULE_GROUP, "rules": short})
+    if long:
+        groups.append(
+            {
+                "name": LONG_RANGE_RULE_GROUP,
+                "interval": long_range_interval,
+                "rules": long,
+            }
+        )
+    return {"groups": groups}
+
+
+def render_dashboard(dashboard):
+    """Render a dashboard as JSON, formatted like the shipped dashboards."""
+    return json.dumps(dashboard, indent=2) + "\n"
+
+
+def generate_recording_rules(args):
+    """Generate the recording rules file and the rewritten dashboards.
+
+    Rewritten copies of dashboards that no longer use any recorded series are removed, since
+    they would query series that are no longer recorded.
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+
+    Returns:
+        int: The number of recording rules, or None if any error occurs.
+    """
+    try:
+        parse_duration(args.rate_window)
+        parse_duration(args.long_range_threshold)
+        parse_duration(args.long_range_interval)
+    except ValueError as e:
+        logging.error("Error: %s", e)
+        return None
+    try:
+        filenames = sorted(
+            name for name in os.listdir(args.dashboards_dir) if name.endswith(".json")
+        )
+    except OSError as e:
+        logging.error("Error reading dashboards in '%s': %s", args.dashboards_dir, e)
+        return None
+
+    rules = {}
+    dashboards = {}
+    for filename in filenames:
+        path = os.path.join(args.dashboards_dir, filename)
+        try:
+            with open(path, "r") as f:
+                dashboard = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error("Error reading dashboard '%s': %s", path, e)
+            return None
+        recorded, rewritten = record_dashboard(dashboard, args.rate_window, rules)
+        total = sum(1 for _ in iter_targets(dashboard))
+        logging.info(
+            "%s: %d of %d queries use recorded series.", filename, rewritten, total
+        )
+        if rewritten:
+            dashboards[filename] = recorded
+
+    rules_file = build_rule_groups(
+        rules, args.long_range_threshold, args.long_range_interval
+    )
+    rendered = render_yaml(rules_file)
+    emit_output(
+        f"{len(rules)} recording rules", rendered, args.rules_file, args.dry_run
+    )
+    if args.dry_run:
+        return len(rules)
+
+    os.makedirs(os.path.dirname(args.rules_file) or ".", exist_ok=True)
+    write_yaml_to_file(rules_file, args.rules_file, rendered=rendered)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for filename, dashboard in dashboards.items():
+        write_text_to_file(
+            render_dashboard(dashboard), os.path.join(args.output_dir, filename)
+        )
+    for filename in filenames:
+        path = os.path.join(args.output_dir, filename)
+        if filename not in dashboards and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.error("Error removing '%s': %s", path, e)
+                continue
+            logging.info("Removed '%s', which no longer uses recorded series.", path)
+    return len(rules)
+
+
+def get_args():
+    """Set up the command-line argument parser."""
+    parser = argparse.ArgumentParser(
+        description="Generate Prometheus recording rules and recorded dashboards from the fleet dashboards."
+    )
+    parser.add_argument(
+        "--dashboards-dir",
+        type=str,
+        default="./services/grafana/provisioning/dashboards/bigip/fleet",
+        help="Directory of dashboards to read (default: ./services/grafana/provisioning/dashboards/bigip/fleet).",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default="./services/grafana/provisioning/dashboards/bigip/fleet-recorded",
+        help="Directory for the rewritten dashboards (default: ./services/grafana/provisioning/dashboards/bigip/fleet-recorded).",
+    )
+    parser.add_argument(
+        "--rules-file",
+        type=str,
+        default="./services/prometheus/rules/f5_fleet_dashboards.yml",
+        help="Path of the recording rules file (default: ./services/prometheus/rules/f5_fleet_dashboards.yml).",
+    )
+    parser.add_argument(
+        "--rate-window",
+        type=str,
+        default="5m",
+        help="Range used in place of $__rate_interval (default: 5m).",
+    )
+    parser.add_argument(
+        "--long-range-threshold",
+        type=str,
+        default="1h",
+        help="Rules with at least this range are evaluated in the long range group (default: 1h).",
+    )
+    parser.add_argument(
+        "--long-range-interval",
+        type=str,
+        default="5m",
+        help="Evaluation interval of the long range rule group (default: 5m).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Log the rules without writing any files.",
+    )
+    return parser
+
+
+def main():
+    """Generate the recording rules and recorded dashboards, exiting 1 on error."""
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    args = get_args().parse_args()
+    if generate_recording_rules(args) is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import json
+import os
+import tempfile
+import unittest
+
+import yaml
+
+from recording_rules import (
+    build_rule_groups,
+    find_recordable_calls,
+    generate_recording_rules,
+    get_args,
+    record_dashboard,
+    rewrite_expr,
+)
+
+
+class TestRecordingRules(unittest.TestCase):
+
+    def record(self, expr, display=None):
+        calls = find_recordable_calls(expr, "5m", display)
+        return rewrite_expr(expr, calls), {
+            c["rule"]["record"]: c["rule"] for c in calls
+        }
+
+    def test_aggregated_rate_keeps_filtered_labels(self):
+        expr, rules = self.record(
+            'sum by(f5_dos_vector_name) (rate(f5_dos_stats_total{job=~"$device_name"}[$__rate_interval]))'
+        )
+
+        self.assertEqual(
+            expr,
+            "sum by (f5_dos_vector_name) "
+            '(f5_dos_vector_name_job:f5_dos_stats_total:rate5m{job=~"$device_name"})',
+        )
+        self.assertEqual(
+            rules["f5_dos_vector_name_job:f5_dos_stats_total:rate5m"]["expr"],
+            "sum by (f5_dos_vector_name, job) (rate(f5_dos_stats_total[5m]))",
+        )
+
+    def test_trailing_by_clause_and_arithmetic(self):
+        expr, rules = self.record(
+            '8*sum(rate(f5_dos_bytes_total{job=~"$device_name"}[$__rate_interval])) by (job)'
+        )
+
+        self.assertEqual(
+            expr, '8*sum by (job) (job:f5_dos_bytes_total:rate5m{job=~"$device_name"})'
+        )
+        self.assertEqual(list(rules), ["job:f5_dos_bytes_total:rate5m"])
+
+    def test_range_functions_without_aggregation(self):
+        expr, rules = self.record(
+            'sum_over_time(m{a="x", job=~"$d"}[24h]) / count_over_time(m{a="x"}[24h])',
+            display={"job"},
+        )
+
+        self.assertEqual(
+            expr,
+            'a_job:m:sum_over_time24h{a="x", job=~"$d"} / a_job:m:count_over_time24h{a="x"}',
+        )
+        self.assertEqual(
+            rules["a_job:m:sum_over_time24h"]["expr"],
+            "sum by (a, job) (sum_over_time(m[24h]))",
+        )
+
+    def test_per_object_calls_are_not_recorded(self):
+        for expr, display in [
+            # Shows each virtual server, so the rule would keep every raw series.
+            ('rate(m{vs=~"$vs"}[5m])', {"job", "vs"}),
+            ('rate(m{job=~"$d"}[5m])', {"job", "vs"}),
+            ('rate(m{vs=~"$vs"}[5m])', {"job"}),
+            # Tables and automatic legends show every label.
+            ('rate(m{job=~"$d"}[5m])', None),
+        ]:
+            with self.subTest(expr=expr, display=display):
+                self.assertEqual(self.record(expr, display), (expr, {}))
+
+    def test_unrecordable_queries_are_left_alone(self):
+        for expr in [
+            'f5_system_info{job=~"$device_name"}',
+            "increase(m[$__rate_interval])",
+            "irate(m[5m])",
+        ]:
+            self.assertEqual(self.record(expr), (expr, {}))
+        # avg doesn't compose, and the rate inside it shows every series.
+        self.assertEqual(
+            self.record("avg by(job) (rate(m[5m]))")[0], "avg by(job) (rate(m[5m]))"
+        )
+
+    def test_aggregations_keep_job_and_their_own_series(self):
+        expr, rules = self.record('max(rate(m{vs=~"$vs"}[$__rate_interval]))')
+
+        self.assertEqual(expr, 'max (job_vs:m:rate5m_max{vs=~"$vs"})')
+        self.assertEqual(
+            rules["job_vs:m:rate5m_max"]["expr"], "max by (job, vs) (rate(m[5m]))"
+        )
+
+    def test_build_rule_groups_splits_long_ranges(self):
+        rules = {}
+        dashboard = {
+            "uid": "abc",
+            "title": "Fleet",
+            "panels": [
+                {"targets": [{"expr": "sum(rate(a[$__rate_interval]))"}]},
+                {"targets": [{"expr": "changes(b[24h])", "legendFormat": "{{job}}"}]},
+                {"targets": [{"expr": "changes(c[24h])", "format": "table"}]},
+            ],
+        }
+
+        recorded, rewritten = record_dashboard(dashboard, "5m", rules)
+        groups = build_rule_groups(rules, "1h", "5m")["groups"]
+
+        self.assertEqual(rewritten, 2)
+        self.assertEqual(recorded["panels"][2]["targets"][0]["expr"], "changes(c[24h])")
+        self.assertEqual(
+            (recorded["uid"], recorded["title"]), ("abc-rec", "Fleet (Recorded)")
+        )
+        self.assertEqual(
+            dashboard["panels"][0]["targets"][0]["expr"],
+            "sum(rate(a[$__rate_interval]))",
+        )
+        self.assertEqual(
+            [g["rules"][0]["record"] for g in groups],
+            ["job:a:rate5m", "job:b:changes24h"],
+        )
+        self.assertEqual(groups[1]["interval"], "5m")
+
+    def test_generate_recording_rules(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            dashboards_dir = os.path.join(tmp, "fleet")
+            os.mkdir(dashboards_dir)
+            with open(os.path.join(dashboards_dir, "a.json"), "w") as f:
+                json.dump(
+                    {
+                        "uid": "a",
+                        "panels": [{"targets": [{"expr": "sum(rate(x[5m]))"}]}],
+                    },
+                    f,
+                )
+            with open(os.path.join(dashboards_dir, "b.json"), "w") as f:
+                json.dump({"uid": "b", "panels": [{"targets": [{"expr": "x"}]}]}, f)
+            args = get_args().parse_args(
+                [
+                    f"--dashboards-dir={dashboards_dir}",
+                    f"--output-dir={os.path.join(tmp, 'recorded')}",
+                    f"--rules-file={os.path.join(tmp, 'rules', 'rules.yml')}",
+                ]
+            )
+
+            os.mkdir(os.path.join(tmp, "recorded"))
+            with open(os.path.join(tmp, "recorded", "b.json"), "w") as f:
+                json.dump({"uid": "b-rec"}, f)  # From an earlier run.
+
+            self.assertEqual(generate_recording_rules(args), 1)
+            self.assertEqual(os.listdir(os.path.join(tmp, "recorded")), ["a.json"])
+            with open(os.path.join(tmp, "rules", "rules.yml")) as f:
+                rules = yaml.safe_load(f)
+        self.assertEqual(
+            rules["groups"][0]["rules"],
+            [{"record": "job:x:rate5m", "expr": "sum by (job) (rate(x[5m]))"}],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,792 @@
+"""
+synthetic_metrics.py
+
+Generates synthetic f5_* metrics shaped like the ones the provisioned Grafana dashboards query, to
+measure Prometheus ingestion ceilings and dashboard query times on a single box.
+
+The metric names and label sets are taken from the dashboard queries (series selectors, grouping
+clauses and label_values() variables). Each metric gets one series per device per object, where
+the object is identified by its f5_<object>_name label (e.g. f5_virtual_server_name for the
+f5_virtual_server_* metrics), times the values of the state-like labels (e.g. availability_state).
+Counters (*_total) grow at a steady per-series rate and gauges follow a slow wave, so rate() and
+*_over_time() queries return realistic data. Values depend only on the series and the timestamp,
+so backfilled and streamed data line up.
+
+The series can be:
+- Streamed every --interval to an OTLP/HTTP endpoint (--otlp-url, e.g. Prometheus'
+  /api/v1/otlp/v1/metrics), as the collector does.
+- Streamed every --interval to a Prometheus remote-write endpoint (--remote-write-url; Prometheus
+  must run with --web.enable-remote-write-receiver).
+- Backfilled over the last --backfill period into an OpenMetrics file (--openmetrics-file), for
+  `promtool tsdb create-blocks-from openmetrics`.
+
+Without any of these, the metrics found and the series counts are logged.
+
+Command-Line Interface:
+- --dashboards-dir: Directory searched recursively for dashboards (default: ./services/grafana/provisioning/dashboards).
+- --metric-prefix: Only generate metrics with this prefix (default: f5_).
+- --devices: Number of synthetic devices (default: 10).
+- --first-device: Number of the first device, so several generators can each send a share of a
+  larger fleet (default: 0).
+- --objects: Objects (virtual servers, pools, ...) of each kind per device (default: 50).
+- --object-counts: Per-label overrides of --objects, e.g. 'f5_pool_member_name=200,f5_rule_name=10'.
+- --interval: Time between the samples of a series (default: 60s).
+- --duration: Stop streaming after this long (default: run until interrupted).
+- --batch-size: Series per OTLP / remote-write request (default: 2000).
+- --concurrency: Requests in flight at once (default: 4).
+- --backfill: Period backfilled into --openmetrics-file, ending now (default: 24h).
+- --seed: Seed for the per-series values (default: 0).
+
+Usage Example:
+    python ./src/synthetic_metrics.py --devices 100 --objects 200 --otlp-url http://localhost:9090/api/v1/otlp/v1/metrics
+    python ./src/synthetic_metrics.py --devices 100 --backfill 7d --openmetrics-file synthetic.om
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import logging
+import math
+import os
+import re
+import struct
+import sys
+import time
+import urllib.request
+import zlib
+
+from config_helper import parse_promql_duration
+from promql_cost import (
+    GROUPING_RE,
+    LABEL_VALUES_RE,
+    QUERY_RESULT_RE,
+    find_selectors,
+    iter_panels,
+)
+
+# Values of the state-like labels the dashboards filter or group on; each multiplies the series.
+ENUM_LABEL_VALUES = {
+    "active_state": ["active", "inactive"],
+    "availability_state": ["available", "offline", "unknown"],
+    "enabled_state": ["enabled", "disabled"],
+    "http_status_range": ["1xx", "2xx", "3xx", "4xx", "5xx"],
+    "state": ["used", "free"],
+}
+# Labels that aren't generated: job is set per device, the others are internal.
+RESERVED_LABELS = {"job", "instance", "le", "quantile"}
+OBJECT_LABEL_RE = re.compile(r"^f5_(?P<object>\w+)_name$")
+LABEL_NAME_RE = re.compile(r"[a-zA-Z_]\w*")
+COUNTER_SUFFIX = "_total"
+# Counters start from zero at this time, so their values stay readable.
+COUNTER_EPOCH = 1_700_000_000
+# Gauges follow a wave of this period around their base value.
+GAUGE_PERIOD = 6 * 3600
+OTLP_CUMULATIVE = 2
+SCOPE_NAME = "synthetic_metrics"
+OTLP_HEADERS = {"Content-Type": "application/json"}
+REMOTE_WRITE_HEADERS = {
+    "Content-Type": "application/x-protobuf",
+    "Content-Encoding": "snappy",
+    "X-Prometheus-Remote-Write-Version": "0.1.0",
+}
+
+
+def parse_object_counts(spec):
+    """Parse an --object-counts value of comma separated label=count pairs.
+
+    Raises:
+        ValueError: If a pair is malformed or its count is not a positive integer.
+    """
+    counts = {}
+    for pair in (spec or "").split(","):
+        if not pair.strip():
+            continue
+        label, sep, count = (part.strip() for part in pair.partition("="))
+        if not sep or not label or not count.isdigit() or int(count) < 1:
+            raise ValueError(
+                f"Invalid object count '{pair}', expected label=count, e.g. f5_pool_name=100"
+            )
+        counts[label] = int(count)
+    return counts
+
+
+def iter_dashboard_queries(dashboards_dir):
+    """Yield every panel and templating query of the dashboards found in dashboards_dir."""
+    for root, _, files in sorted(os.walk(dashboards_dir)):
+        for filename in sorted(files):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(root, filename)
+            try:
+                with open(path, "r") as f:
+                    dashboard = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logging.warning("Skipping dashboard '%s': %s", path, e)
+                continue
+            for panel in iter_panels(dashboard.get("panels")):
+                for target in panel.get("targets") or []:
+                    expr = target.get("expr") if isinstance(target, dict) else None
+                    if isinstance(expr, str) and expr.strip():
+                        yield expr
+            for variable in (dashboard.get("templating") or {}).get("list") or []:
+                query = variable.get("query")
+                if isinstance(query, dict):
+                    query = query.get("query")
+                if variable.get("type") == "query" and isinstance(query, str):
+                    yield query
+
+
+def dashboard_metrics(queries, prefix="f5_"):
+    """Find the metrics queried by the dashboards and the labels each is queried with.
+
+    A metric's labels are those of its selector's matchers, of the grouping clauses (by, on, ...)
+    of the queries it appears in, and of label_values(<metric>, <label>) variables. Names that
+    are used as labels elsewhere (e.g. in label_values(f5_pool_name)) are not metrics, nor are
+    recorded series (e.g. f5_pool_bytes_in_total:rate5m), which Prometheus computes itself.
+
+    Args:
+        queries (iterable): PromQL panel and templating queries.
+        prefix (str): Only metrics with this prefix are returned.
+
+    Returns:
+        dict: Sorted label sets by metric name.
+    """
+    metrics = collections.defaultdict(set)
+    all_labels = set()
+    for query in queries:
+        match = QUERY_RESULT_RE.match(query)
+        if match:
+            query = match.group("expr")
+        extra = set()
+        match = LABEL_VALUES_RE.match(query)
+        if match:
+            extra.add(match.group("label"))
+            query = match.group("selector") or ""
+        for grouping in GROUPING_RE.findall(query):
+            inner = grouping[grouping.index("(") + 1 : -1]
+            extra.update(LABEL_NAME_RE.findall(inner))
+        all_labels.update(extra)
+        for selector in find_selectors(query):
+            labels = {label for label, _, _ in selector["matchers"]}
+            all_labels.update(labels)
+            if selector["metric"]:
+                metrics[selector["metric"]].update(labels | extra)
+    return {
+        metric: sorted(labels - {"__name__"})
+        for metric, labels in sorted(metrics.items())
+        if metric.startswith(prefix) and ":" not in metric and metric not in all_labels
+    }
+
+
+def object_label(metric, labels, object_labels):
+    """Return the label identifying a metric's object (e.g. f5_pool_name), or None.
+
+    This is the f5_<object>_name label of the longest <object> the metric name starts with,
+    looked up in the metric's own labels first and then in all the dashboards' labels.
+    """
+    for candidates in (labels, object_labels):
+        best = None
+        for label in candidates:
+            match = OBJECT_LABEL_RE.match(label)
+            if match and metric.startswith(f"f5_{match.group('object')}_"):
+                if best is None or len(label) > len(best):
+                    best = label
+        if best:
+            return best
+    return None
+
+
+def series_plan(metrics, objects, object_counts=None):
+    """Plan the synthetic series of each metric.
+
+    Args:
+        metrics (dict): Label names by metric (see `dashboard_metrics`).
+        objects (int): Objects of each kind per device.
+        object_counts (dict, optional): Objects per device by object label, overriding objects.
+
+    Returns:
+        list: A dict per metric with its "name", "counter" flag, object "identity" label (or
+              None), object "count", "enums" (label -> values) and other "attributes" labels,
+              and "series" per device.
+    """
+    object_counts = object_counts or {}
+    object_labels = {label for labels in metrics.values() for label in labels} | {
+        label for label in object_counts
+    }
+    plan = []
+    for metric, labels in metrics.items():
+        identity = object_label(metric, labels, object_labels)
+        labels = set(labels) - RESERVED_LABELS - {identity}
+        enums = {
+            label: ENUM_LABEL_VALUES[label]
+            for label in sorted(labels)
+            if label in ENUM_LABEL_VALUES
+        }
+        count = object_counts.get(identity, objects) if identity else 1
+        plan.append(
+            {
+                "name": metric,
+                "counter": metric.endswith(COUNTER_SUFFIX),
+                "identity": identity,
+                "count": count,
+                "enums": enums,
+                "attributes": sorted(labels - set(enums)),
+                "series": count * math.prod(len(v) for v in enums.values()),
+            }
+        )
+    return plan
+
+
+def object_name(label, index):
+    """Return the synthetic value of an object name label, e.g. /Common/pool_3."""
+    match = OBJECT_LABEL_RE.match(label)
+    kind = match.group("object") if match else label
+    return f"/Common/{kind}_{index}"
+
+
+def device_job(device):
+    """Return the job label of a synthetic device."""
+    return f"bigip/synthetic-{device}"
+
+
+def iter_device_series(entry, device):
+    """Yield the label dicts of one metric's series on one device (without __name__)."""
+    enum_labels = list(entry["enums"])
+    enum_combinations = [{}]
+    for label in enum_labels:
+        enum_combinations = [
+            {**combination, label: value}
+            for combination in enum_combinations
+            for value in entry["enums"][label]
+        ]
+    for index in range(entry["count"]):
+        base = {"job": device_job(device)}
+        if entry["identity"]:
+            base[entry["identity"]] = object_name(entry["identity"], index)
+        for label in entry["attributes"]:
+            base[label] = (
+                object_name(label, index % 7)
+                if OBJECT_LABEL_RE.match(label)
+                else f"{label}_{(device + index) % 3}"
+            )
+        for combination in enum_combinations:
+            yield {**base, **combination}
+
+
+def device_range(args):
+    """Return the device numbers to generate (see --first-device)."""
+    return range(args.first_device, args.first_device + args.devices)
+
+
+def iter_series(plan, devices, seed=0):
+    """Yield (plan entry, labels, series hash) for every series of the device numbers in devices."""
+    for device in devices:
+        for entry in plan:
+            for labels in iter_device_series(entry, device):
+                key = f"{seed}|{entry['name']}|" + "|".join(
+                    f"{k}={v}" for k, v in sorted(labels.items())
+                )
+                yield entry, labels, zlib.crc32(key.encode())
+
+
+def sample_value(entry, series_hash, timestamp):
+    """Return the value of a series at a timestamp (in seconds).
+
+    Counters grow at 1 to 1000 per second from COUNTER_EPOCH, *_info metrics are 1, *_ratio
+    metrics stay between 0 and 1 and other gauges follow a wave around a base of up to 1000.
+    """
+    name = entry["name"]
+    if entry["counter"]:
+        rate = 1 + series_hash % 1000
+        return float(int(rate * max(timestamp - COUNTER_EPOCH, 0)))
+    if name.endswith("_info"):
+        return 1.0
+    phase = (series_hash % 360) * math.pi / 180
+    wave = math.sin(2 * math.pi * timestamp / GAUGE_PERIOD + phase)
+    if name.endswith("_ratio"):
+        return round(0.5 + 0.5 * wave, 4)
+    return round((series_hash % 1000) * (1 + 0.2 * wave), 2)
+
+
+def escape_label_value(value):
+    """Escape a label value for the Prometheus / OpenMetrics text formats."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def write_openmetrics(plan, devices, start, end, interval, out, seed=0):
+    """Write every series' samples between start and end as OpenMetrics text.
+
+    Samples of a metric family are written together, as the format requires.
+
+    Args:
+        plan (list): The series plan (see `series_plan`).
+        devices (range): The synthetic device numbers.
+        start (float): The first timestamp, in seconds.
+        end (float): The last timestamp, in seconds.
+        interval (float): The seconds between samples.
+        out (file): The text file to write to.
+        seed (int): The seed for the per-series values.
+
+    Returns:
+        int: The number of samples written.
+    """
+    timestamps = []
+    timestamp = start
+    while timestamp <= end:
+        timestamps.append(timestamp)
+        timestamp += interval
+    samples = 0
+    for entry in plan:
+        name = entry["name"]
+        if entry["counter"]:
+            out.write(f"# TYPE {name[: -len(COUNTER_SUFFIX)]} counter\n")
+        else:
+            out.write(f"# TYPE {name} gauge\n")
+        for _, labels, series_hash in iter_series([entry], devices, seed):
+            selector = ",".join(
+                f'{k}="{escape_label_value(v)}"' for k, v in sorted(labels.items())
+            )
+            out.writelines(
+                f"{name}{{{selector}}} {sample_value(entry, series_hash, ts)} {ts:.3f}\n"
+                for ts in timestamps
+            )
+            samples += len(timestamps)
+    out.write("# EOF\n")
+    return samples
+
+
+def encode_varint(value):
+    """Encode an unsigned protobuf varint."""
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def encode_field(number, payload):
+    """Encode a length-delimited protobuf field."""
+    return encode_varint(number << 3 | 2) + encode_varint(len(payload)) + payload
+
+
+def encode_write_request(timeseries):
+    """Encode a Prometheus remote-write WriteRequest protobuf message.
+
+    Args:
+        timeseries (list): (labels dict including __name__, [(timestamp ms, value)]) pairs.
+
+    Returns:
+        bytes: The serialized prometheus.WriteRequest.
+    """
+    out = bytearray()
+    for labels, samples in timeseries:
+        series = bytearray()
+        for name, value in sorted(labels.items()):
+            series += encode_field(
+                1, encode_field(1, name.encode()) + encode_field(2, value.encode())
+            )
+        for timestamp_ms, value in samples:
+            series += encode_field(
+                2,
+                b"\x09"
+                + struct.pack("<d", value)
+                + b"\x10"
+                + encode_varint(timestamp_ms),
+            )
+        out += encode_field(1, bytes(series))
+    return bytes(out)
+
+
+def snappy_block(data):
+    """Frame data as a snappy block of literals (valid, but uncompressed).
+
+    Remote write requires snappy framing. Without the snappy library the payload is sent as
+    literals, which any snappy decoder accepts, trading bandwidth for no extra dependency.
+    """
+    out = bytearray(encode_varint(len(data)))
+    for offset in range(0, len(data), 65536):
+        chunk = data[offset : offset + 65536]
+        length = len(chunk) - 1
+        if length < 60:
+            out.append(length << 2)
+        elif length < 256:
+            out += bytes([60 << 2, length])
+        else:
+            out += bytes([61 << 2]) + length.to_bytes(2, "little")
+        out += chunk
+    return bytes(out)
+
+
+def otlp_attributes(labels):
+    """Return OTLP JSON key/value attributes."""
+    return [{"key": k, "value": {"stringValue": v}} for k, v in sorted(labels.items())]
+
+
+def encode_otlp_request(batch, timestamp):
+    """Encode an OTLP/HTTP JSON ExportMetricsServiceRequest.
+
+    Each device's job is sent as its service.name resource attribute, which Prometheus' OTLP
+    receiver turns back into the job label, and counters are sent as monotonic sums without
+    their _total suffix, which it adds back.
+
+    Args:
+        batch (list): (plan entry, labels, series hash) tuples (see `iter_series`).
+        timestamp (float): The sample time, in seconds.
+
+    Returns:
+        bytes: The JSON request body.
+    """
+    time_nano = str(int(timestamp * 1e9))
+    by_job = collections.defaultdict(lambda: collections.defaultdict(list))
+    for entry, labels, series_hash in batch:
+        attributes = {k: v for k, v in labels.items() if k != "job"}
+        point = {
+            "attributes": otlp_attributes(attributes),
+            "timeUnixNano": time_nano,
+            "asDouble": sample_value(entry, series_hash, timestamp),
+        }
+        by_job[labels["job"]][entry["name"]].append(point)
+    resource_metrics = []
+    for job, metrics in by_job.items():
+        otlp_metrics = []
+        for name, points in metrics.items():
+            if name.endswith(COUNTER_SUFFIX):
+                otlp_metrics.append(
+                    {
+                        "name": name[: -len(COUNTER_SUFFIX)],
+                        "sum": {
+                            "aggregationTemporality": OTLP_CUMULATIVE,
+                            "isMonotonic": True,
+                            "dataPoints": points,
+                        },
+                    }
+                )
+            else:
+                otlp_metrics.append({"name": name, "gauge": {"dataPoints": points}})
+        resource_metrics.append(
+            {
+                "resource": {"attributes": otlp_attributes({"service.name": job})},
+                "scopeMetrics": [
+                    {"scope": {"name": SCOPE_NAME}, "metrics": otlp_metrics}
+                ],
+            }
+        )
+    return json.dumps(
+        {"resourceMetrics": resource_metrics}, separators=(",", ":")
+    ).encode()
+
+
+def encode_remote_write_request(batch, timestamp):
+    """Encode a snappy-framed remote-write request of one sample per series in batch."""
+    timestamp_ms = int(timestamp * 1000)
+    return snappy_block(
+        encode_write_request(
+            [
+                (
+                    {"__name__": entry["name"], **labels},
+                    [(timestamp_ms, sample_value(entry, series_hash, timestamp))],
+                )
+                for entry, labels, series_hash in batch
+            ]
+        )
+    )
+
+
+def post(url, body, headers, timeout):
+    """POST a request body, raising OSError (including urllib.error.HTTPError) on failure."""
+    request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+def iter_batches(series, batch_size):
+    """Yield lists of at most batch_size items."""
+    batch = []
+    for item in series:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def send_round(plan, args, url, encode, headers, executor, timestamp):
+    """Send one sample of every series, returning (samples, failed requests, first error).
+
+    At most two requests per --concurrency worker are encoded and queued at once; the next
+    batch is only encoded once one of them completes, so memory stays bounded however many
+    series the round sends.
+    """
+    pending = {}
+    samples = failures = 0
+    error = None
+
+    def collect(done):
+        nonlocal samples, failures, error
+        for future in done:
+            count = pending.pop(future)
+            try:
+                future.result()
+                samples += count
+            except OSError as e:
+                failures += 1
+                error = error or e
+
+    for batch in iter_batches(
+        iter_series(plan, device_range(args), args.seed), args.batch_size
+    ):
+        if len(pending) >= 2 * args.concurrency:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            collect(done)
+        body = encode(batch, timestamp)
+        pending[executor.submit(post, url, body, headers, args.request_timeout)] = len(
+            batch
+        )
+    collect(concurrent.futures.wait(pending)[0])
+    return samples, failures, error
+
+
+def stream(plan, args, sleep=time.sleep, clock=time.time):
+    """Send a sample of every series each --interval, logging the achieved ingestion rate.
+
+    A round that takes longer than the interval means the endpoint (or this generator) can't
+    keep up at this fleet size; it is logged as a warning and the next round starts at once.
+
+    Returns:
+        int: The number of rounds in which every request succeeded.
+    """
+    if args.otlp_url:
+        url, encode, headers = args.otlp_url, encode_otlp_request, OTLP_HEADERS
+    else:
+        url, encode, headers = (
+            args.remote_write_url,
+            encode_remote_write_request,
+            REMOTE_WRITE_HEADERS,
+        )
+    interval = parse_promql_duration(args.interval)
+    deadline = clock() + parse_promql_duration(args.duration) if args.duration else None
+    ok_rounds = rounds = 0
+    with concurrent.futures.ThreadPoolExecutor(args.concurrency) as executor:
+        while deadline is None or clock() < deadline:
+            started = clock()
+            samples, failures, error = send_round(
+                plan, args, url, encode, headers, executor, started
+            )
+            elapsed = clock() - started
+            rounds += 1
+            if failures:
+                logging.error(
+                    "Round %d: %d requests failed, e.g. %s", rounds, failures, error
+                )
+            else:
+                ok_rounds += 1
+            logging.info(
+                "Round %d: sent %d samples in %.2fs (%.0f samples/s).",
+                rounds,
+                samples,
+                elapsed,
+                samples / elapsed if elapsed else 0,
+            )
+            if elapsed > interval:
+                logging.warning(
+                    "Round %d took %.2fs, longer than the %s interval; ingestion is falling behind.",
+                    rounds,
+                    elapsed,
+                    args.interval,
+                )
+                continue
+            sleep(interval - elapsed)
+    return ok_rounds
+
+
+def log_plan(plan, devices):
+    """Log the generated metrics and their series counts."""
+    for entry in plan:
+        labels = [entry["identity"]] if entry["identity"] else []
+        logging.info(
+            "%s{%s}: %d series per device",
+            entry["name"],
+            ", ".join(labels + list(entry["enums"]) + entry["attributes"]),
+            entry["series"],
+        )
+    per_device = sum(entry["series"] for entry in plan)
+    logging.info(
+        "%d metrics, %d series per device, %d series for %d devices.",
+        len(plan),
+        per_device,
+        per_device * devices,
+        devices,
+    )
+
+
+def run(args):
+    """Build the series plan and stream, backfill or log it.
+
+    Returns:
+        int: The process exit code.
+    """
+    try:
+        object_counts = parse_object_counts(args.object_counts)
+        interval = parse_promql_duration(args.interval)
+    except ValueError as e:
+        logging.error("Error: %s", e)
+        return 1
+    metrics = dashboard_metrics(
+        iter_dashboard_queries(args.dashboards_dir), args.metric_prefix
+    )
+    if not metrics:
+        logging.error(
+            "No %s* metrics found in the dashboards in '%s'.",
+            args.metric_prefix,
+            args.dashboards_dir,
+        )
+        return 1
+    plan = series_plan(metrics, args.objects, object_counts)
+    log_plan(plan, args.devices)
+
+    if args.openmetrics_file:
+        end = time.time()
+        start = math.ceil((end - parse_promql_duration(args.backfill)) / interval)
+        start *= interval
+        with open(args.openmetrics_file, "w") as out:
+            samples = write_openmetrics(
+                plan, device_range(args), start, end, interval, out, args.seed
+            )
+        logging.info(
+            "Wrote %d samples to '%s'. Import them with: promtool tsdb create-blocks-from openmetrics %s <data dir>",
+            samples,
+            args.openmetrics_file,
+            args.openmetrics_file,
+        )
+        return 0
+    if args.otlp_url or args.remote_write_url:
+        try:
+            stream(plan, args)
+        except KeyboardInterrupt:
+            logging.info("Stopped streaming.")
+    return 0
+
+
+def get_args():
+    """Set up the command-line argument parser."""
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic f5_* metrics shaped like the dashboard queries."
+    )
+    parser.add_argument(
+        "--dashboards-dir",
+        type=str,
+        default="./services/grafana/provisioning/dashboards",
+        help="Directory searched recursively for dashboards (default: ./services/grafana/provisioning/dashboards).",
+    )
+    parser.add_argument(
+        "--metric-prefix",
+        type=str,
+        default="f5_",
+        help="Only generate metrics with this prefix (default: f5_).",
+    )
+    parser.add_argument(
+        "--devices",
+        type=int,
+        default=10,
+        help="Number of synthetic devices (default: 10).",
+    )
+    parser.add_argument(
+        "--first-device",
+        type=int,
+        default=0,
+        help="Number of the first device, to split a fleet across several generators (default: 0).",
+    )
+    parser.add_argument(
+        "--objects",
+        type=int,
+        default=50,
+        help="Objects (virtual servers, pools, ...) of each kind per device (default: 50).",
+    )
+    parser.add_argument(
+        "--object-counts",
+        type=str,
+        default=None,
+        help="Per-label overrides of --objects, e.g. 'f5_pool_member_name=200,f5_rule_name=10'.",
+    )
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument(
+        "--otlp-url",
+        type=str,
+        default=None,
+        help="Stream to this OTLP/HTTP metrics endpoint, e.g. http://localhost:9090/api/v1/otlp/v1/metrics.",
+    )
+    output.add_argument(
+        "--remote-write-url",
+        type=str,
+        default=None,
+        help="Stream to this Prometheus remote-write endpoint, e.g. http://localhost:9090/api/v1/write.",
+    )
+    output.add_argument(
+        "--openmetrics-file",
+        type=str,
+        default=None,
+        help="Backfill --backfill of samples into this OpenMetrics file.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=str,
+        default="60s",
+        help="Time between the samples of a series (default: 60s).",
+    )
+    parser.add_argument(
+        "--duration",
+        type=str,
+        default=None,
+        help="Stop streaming after this long (default: run until interrupted).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=2000,
+        help="Series per OTLP / remote-write request (default: 2000).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Requests in flight at once (default: 4).",
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        default=30,
+        help="Seconds to wait for each request (default: 30).",
+    )
+    parser.add_argument(
+        "--backfill",
+        type=str,
+        default="24h",
+        help="Period backfilled into --openmetrics-file, ending now (default: 24h).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed for the per-series values (default: 0).",
+    )
+    return parser
+
+
+def main():
+    """Generate the synthetic metrics, exiting 1 on error."""
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    sys.exit(run(get_args().parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import io
+import itertools
+import json
+import struct
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+from synthetic_metrics import (
+    dashboard_metrics,
+    encode_otlp_request,
+    encode_remote_write_request,
+    encode_varint,
+    iter_series,
+    parse_object_counts,
+    sample_value,
+    send_round,
+    series_plan,
+    snappy_block,
+    stream,
+    write_openmetrics,
+)
+
+QUERIES = [
+    'sum by(job) (rate(f5_virtual_server_clientside_bytes_in_total{job=~"$device_name", f5_virtual_server_name=~"$vs"}[$__rate_interval]))',
+    'f5_virtual_server_availability_ratio{availability_state="offline"}',
+    'label_values(f5_virtual_server_info{job="$device_name"}, f5_pool_name)',
+    "label_values(f5_virtual_server_name)",
+    "f5_pool_member_count",
+    "count by(job, f5_pool_member_name) (f5_pool_member_bytes_in_total)",
+    "f5_virtual_server_clientside_bytes_in_total:rate5m",
+    "otelcol_process_uptime",
+]
+
+
+class TestSyntheticMetrics(unittest.TestCase):
+
+    def plan(self, objects=3):
+        return series_plan(
+            dashboard_metrics(QUERIES), objects, {"f5_pool_member_name": 2}
+        )
+
+    def test_dashboard_metrics(self):
+        self.assertEqual(
+            dashboard_metrics(QUERIES),
+            {
+                "f5_pool_member_bytes_in_total": ["f5_pool_member_name", "job"],
+                "f5_pool_member_count": [],
+                "f5_virtual_server_availability_ratio": ["availability_state"],
+                "f5_virtual_server_clientside_bytes_in_total": [
+                    "f5_virtual_server_name",
+                    "job",
+                ],
+                "f5_virtual_server_info": ["f5_pool_name", "job"],
+            },
+        )
+
+    def test_series_plan(self):
+        plan = {entry["name"]: entry for entry in self.plan()}
+
+        info = plan["f5_virtual_server_info"]
+        self.assertEqual(
+            (info["identity"], info["attributes"], info["series"]),
+            ("f5_virtual_server_name", ["f5_pool_name"], 3),
+        )
+        # Objects are found from the metric name when the query doesn't use its label.
+        self.assertEqual(
+            plan["f5_pool_member_count"]["identity"], "f5_pool_member_name"
+        )
+        self.assertEqual(plan["f5_pool_member_count"]["series"], 2)
+        self.assertEqual(plan["f5_virtual_server_availability_ratio"]["series"], 9)
+        self.assertTrue(plan["f5_pool_member_bytes_in_total"]["counter"])
+
+        series = list(iter_series(self.plan(), devices=range(2)))
+        self.assertEqual(len(series), 2 * sum(e["series"] for e in self.plan()))
+        self.assertEqual(len({(e["name"], str(l)) for e, l, _ in series}), len(series))
+        self.assertIn(
+            {
+                "job": "bigip/synthetic-1",
+                "f5_virtual_server_name": "/Common/virtual_server_2",
+                "f5_pool_name": "/Common/pool_2",
+            },
+            [labels for _, labels, _ in series],
+        )
+
+    def test_parse_object_counts(self):
+        self.assertEqual(parse_object_counts("a=1, b = 20"), {"a": 1, "b": 20})
+        self.assertEqual(parse_object_counts(None), {})
+        for bad in ["a", "a=x", "=3", "a=0"]:
+            with self.assertRaises(ValueError):
+                parse_object_counts(bad)
+
+    def test_sample_value(self):
+        counter = {"name": "f5_x_total", "counter": True}
+        ratio = {"name": "f5_x_ratio", "counter": False}
+        start = 1_800_000_000
+
+        self.assertLess(
+            sample_value(counter, 7, start), sample_value(counter, 7, start + 60)
+        )
+        self.assertEqual(
+            sample_value(counter, 7, start + 60), sample_value(counter, 7, start + 60)
+        )
+        for timestamp in range(start, start + 86400, 3600):
+            self.assertTrue(0 <= sample_value(ratio, 123, timestamp) <= 1)
+
+    def test_write_openmetrics(self):
+        plan = [e for e in self.plan() if e["name"].startswith("f5_pool_member")]
+        out = io.StringIO()
+
+        samples = write_openmetrics(
+            plan, range(2), 1_800_000_000, 1_800_000_120, 60, out
+        )
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(samples, 2 * 2 * 2 * 3)
+        self.assertEqual(lines[0], "# TYPE f5_pool_member_bytes_in counter")
+        self.assertEqual(lines[13], "# TYPE f5_pool_member_count gauge")
+        self.assertEqual(lines[-1], "# EOF")
+        self.assertRegex(
+            lines[1],
+            r'^f5_pool_member_bytes_in_total\{f5_pool_member_name="/Common/pool_member_0",'
+            r'job="bigip/synthetic-0"\} \d+\.0 1800000000\.000$',
+        )
+
+    def test_remote_write_encoding(self):
+        self.assertEqual(encode_varint(300), b"\xac\x02")
+        self.assertEqual(snappy_block(b"abc"), b"\x03\x08abc")
+        self.assertEqual(snappy_block(b"x" * 100)[:3], b"\x64\xf0\x63")
+
+        entry = {"name": "f5_x_ratio", "counter": False}
+        body = encode_remote_write_request([(entry, {"job": "a"}, 1)], 1_800_000_000)
+
+        self.assertIn(b"\x0a\x08__name__\x12\x0af5_x_ratio", body)
+        self.assertIn(
+            b"\x09" + struct.pack("<d", sample_value(entry, 1, 1_800_000_000)), body
+        )
+
+    def test_otlp_encoding(self):
+        batch = [
+            (e, labels, h)
+            for e, labels, h in iter_series(self.plan(objects=1), devices=range(2))
+            if e["name"] in ("f5_pool_member_bytes_in_total", "f5_virtual_server_info")
+        ]
+
+        request = json.loads(encode_otlp_request(batch, 1_800_000_000))
+
+        resources = request["resourceMetrics"]
+        self.assertEqual(len(resources), 2)
+        self.assertEqual(
+            resources[1]["resource"]["attributes"],
+            [{"key": "service.name", "value": {"stringValue": "bigip/synthetic-1"}}],
+        )
+        metrics = resources[0]["scopeMetrics"][0]["metrics"]
+        self.assertEqual(metrics[0]["name"], "f5_pool_member_bytes_in")
+        self.assertTrue(metrics[0]["sum"]["isMonotonic"])
+        self.assertEqual(len(metrics[0]["sum"]["dataPoints"]), 2)
+        self.assertEqual(
+            metrics[1]["gauge"]["dataPoints"][0]["timeUnixNano"], "1800000000000000000"
+        )
+
+    @patch("synthetic_metrics.post")
+    def test_stream_sends_batches(self, mock_post):
+        plan = self.plan()
+        args = MagicMock(
+            otlp_url="http://localhost:4318/v1/metrics",
+            remote_write_url=None,
+            interval="60s",
+            duration="15s",
+            devices=2,
+            first_device=5,
+            seed=0,
+            batch_size=10,
+            concurrency=2,
+            request_timeout=5,
+        )
+        sleep = MagicMock()
+
+        rounds = stream(plan, args, sleep=sleep, clock=itertools.count(0, 10).__next__)
+
+        total = 2 * sum(entry["series"] for entry in plan)
+        self.assertEqual(rounds, 1)
+        self.assertEqual(mock_post.call_count, -(-total // 10))
+        sleep.assert_called_once_with(50)
+        self.assertIn(b"bigip/synthetic-6", mock_post.call_args[0][1])
+
+    def test_send_round_bounds_encoded_requests(self):
+        args = MagicMock(devices=4, first_device=0, seed=0, batch_size=5, concurrency=2)
+        lock = threading.Lock()
+        counts = {"encoded": 0, "sent": 0, "most": 0}
+
+        def encode(batch, timestamp):
+            with lock:
+                counts["encoded"] += 1
+                counts["most"] = max(counts["most"], counts["encoded"] - counts["sent"])
+            return b"body"
+
+        def post(url, body, headers, timeout):
+            time.sleep(0.001)
+            with lock:
+                counts["sent"] += 1
+
+        with patch("synthetic_metrics.post", post), ThreadPoolExecutor(2) as executor:
+            samples, failures, _ = send_round(
+                self.plan(), args, "http://x", encode, {}, executor, 0
+            )
+
+        self.assertEqual(samples, 4 * sum(entry["series"] for entry in self.plan()))
+        self.assertEqual(failures, 0)
+        self.assertGreater(counts["encoded"], 10)
+        self.assertLessEqual(counts["most"], 2 * args.concurrency)
+
+
+if __name__ == "__main__":
+    unittest.main()